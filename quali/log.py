@@ -0,0 +1,26 @@
+import atexit
+import logging.handlers
+import queue
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """Put log records into the queue and emit them with the given handlers in the background thread
+
+    So slow handlers (file, console) never block the request that logs. Handlers are referenced from the
+    logging configuration as 'cfg://handlers.<name>', so this handler must be named after them alphabetically
+    to be configured when they are already created
+    """
+    def __init__(self, handlers, respect_handler_level=True):
+        """
+
+        :param handlers:
+        :param respect_handler_level:
+        """
+        super().__init__(queue.Queue(-1))
+        # items of the ConvertingList are resolved to the handlers only on access by index
+        handlers = [handlers[index] for index in range(len(handlers))]
+        self._listener = logging.handlers.QueueListener(self.queue,
+                                                        *handlers,
+                                                        respect_handler_level=respect_handler_level)
+        self._listener.start()
+        atexit.register(self._listener.stop)
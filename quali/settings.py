@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'simulator.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -141,6 +142,11 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        # slow operations are logged as JSON objects
+        'structured': {
+            'format': '{message}',
+            'style': '{',
+        },
     },
     'handlers': {
         'console': {
@@ -154,12 +160,31 @@ LOGGING = {
             'formatter': 'verbose'
 
         },
+        # writes to the console and file in the background thread, must be named after them alphabetically
+        'queue': {
+            'class': 'quali.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+        },
+        'slow_operations_file': {
+            'class': 'logging.FileHandler',
+            'filename': 'slow_operations.log',
+            'formatter': 'structured'
+        },
+        'slow_operations_queue': {
+            'class': 'quali.log.QueueListenerHandler',
+            'handlers': ['cfg://handlers.slow_operations_file'],
+        },
     },
     'loggers': {
         '': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'DEBUG',
         },
+        'simulator.slow_operations': {
+            'handlers': ['slow_operations_queue'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -171,6 +196,114 @@ REST_FRAMEWORK = {
     ]
 }
 
+# SNMP Simulator defaults, can be overridden in local_settings.py
+
+# runner of the local recordings: 'simulator.snmpsim_runner.SNMPSimOSCommandRunner' adds recording IPs to the
+# SNMPSIM_IFACE_NAME interface and requires root, 'simulator.snmpsim_runner.SNMPSimLoopbackRunner' serves recordings
+# on the loopback addresses (SNMPSIM_NETWORK within 127.0.0.0/8) under the current user
+SNMPSIM_RUNNER = "simulator.snmpsim_runner.SNMPSimOSCommandRunner"
+
+# maximal number of free IP addresses offered for the new recording
+SNMPSIM_FREE_IPS_CHOICES_LIMIT = 256
+
+# snmpsim daemon log is rotated when it reaches the size (k, m or g suffix), snmpsim keeps up to 30 rotated files;
+# log level (debug, info or error) and number of the last log lines shown on the recording page
+SNMPSIM_DAEMON_LOG_MAX_SIZE = "512k"
+SNMPSIM_DAEMON_LOG_LEVEL = "info"
+SNMPSIM_DAEMON_LOG_TAIL_LINES = 200
+
+# uploaded recordings are validated and sorted in chunks of the size (bytes, sorting takes several times more memory)
+# with the external merge sort, validation stops after the number of malformed lines
+SNMPSIM_RECORDING_SORT_CHUNK_SIZE = 16 * 1024 * 1024
+SNMPSIM_RECORDING_MAX_ERRORS = 20
+
+# maximal number of the clones created from one recording at once; clones share the recording file, except the
+# started clones with an overlay (sysName set to the clone name or template IP address replaced, both are optional),
+# which are served from a merged copy of the whole file in the endpoint folder of the snmpsim daemon (disk usage grows
+# by the recording file size per such clone)
+SNMPSIM_CLONE_MAX_COUNT = 1000
+
+# changelist long-poll for the changed recordings: maximal wait and interval between checks (seconds). Each open
+# changelist holds a WSGI worker (process or thread) for up to the wait, so the server must have more workers
+# than the changelists expected to be open at once
+SNMPSIM_STATUS_POLL_TIMEOUT = 20
+SNMPSIM_STATUS_POLL_INTERVAL = 1
+
+# capture of the recordings from the live devices, queued captures are run by 'manage.py run_recording_captures
+# --interval=N' one by one: number of subtrees walked in parallel, depth of the OID tree
+# split into subtrees (7 splits mib-2 into 1.3.6.1.2.1.X groups), GETBULK max-repetitions bounds and response time
+# they are adapted to (seconds)
+SNMPSIM_CAPTURE_WORKERS = 8
+SNMPSIM_CAPTURE_SPLIT_DEPTH = 7
+SNMPSIM_CAPTURE_INITIAL_REPETITIONS = 25
+SNMPSIM_CAPTURE_MAX_REPETITIONS = 256
+SNMPSIM_CAPTURE_TARGET_RESPONSE_TIME = 1
+SNMPSIM_CAPTURE_TIMEOUT = 2
+SNMPSIM_CAPTURE_RETRIES = 2
+
+# readiness of the started snmpsim daemon: probe ('snmp' GET request with the recording community, 'socket' bound
+# in /proc/net/udp or empty to not wait), deadline and interval between the probes (seconds)
+SNMPSIM_READINESS_PROBE = "snmp"
+SNMPSIM_READINESS_TIMEOUT = 10
+SNMPSIM_READINESS_INTERVAL = 0.1
+
+# simulator agents of the nodes ('manage.py run_snmpsim_agent'): token the UI and agents authorize requests with
+# (empty disables authorization, it's allowed only for the agents bound to the loopback address) and timeout
+# of the requests to the agents (seconds)
+SNMPSIM_AGENT_TOKEN = ""
+SNMPSIM_AGENT_TIMEOUT = 60
+
+# idle recordings ('manage.py reap_idle_recordings'): running recordings without SNMP requests for the TTL (seconds)
+# are stopped and marked as idle, requests are found in the snmpsim daemon logs, so the log level must not be 'error'
+SNMPSIM_IDLE_TTL = 7 * 24 * 60 * 60
+
+# response profiles of the recordings: responses are delayed and dropped by the Linux netem qdisc (sch_netem kernel
+# module), so SNMPSIM_IFACE_NAME gets the root HTB qdisc with the classes of the rate (e.g. '10gbit') that must not
+# limit the interface traffic; netem queue limit (packets) must hold the responses delayed at the peak request rate
+SNMPSIM_SHAPING_RATE = "10gbit"
+SNMPSIM_SHAPING_QUEUE_LIMIT = 100000
+# while any endpoint is shaped, all traffic of the interface passes the HTB qdisc (and its single lock), so the
+# interface of the recordings should be dedicated to them. Root qdisc configured by the operator (e.g. fq_codel or mq
+# with a handle) is replaced by the HTB one only if it's enabled, otherwise responses aren't shaped
+SNMPSIM_SHAPING_REPLACE_ROOT_QDISC = False
+# loopback interface is shaped only if it's enabled, as local connections of the host (database, simulator agents)
+# pass the HTB qdisc too, so responses of the recordings on 'lo' aren't shaped by default
+SNMPSIM_SHAPING_ALLOW_LOOPBACK = False
+
+# resource limits of the recordings: snmpsim daemons with the CPU or memory limit are started in the cgroups of their
+# endpoints under the cgroup folder ('cpu' and 'memory' v1 hierarchies or the v2 unified one), CPU limit is enforced
+# within the period (microseconds); without cgroups (empty folder) memory is capped by the address space rlimit and CPU
+# isn't limited. CPU usage shown on the recording page is measured within the interval (seconds)
+SNMPSIM_CGROUP_FOLDER = "/sys/fs/cgroup"
+SNMPSIM_CPU_LIMIT_PERIOD = 100000
+SNMPSIM_USAGE_INTERVAL = 0.5
+
+# traffic of the recordings ('manage.py collect_traffic'): SNMP requests found in the snmpsim daemon logs are counted
+# within the time buckets of the size (seconds) kept for the retention (seconds), recording page shows the traffic
+# of the last period (seconds) with the number of the most requested subtrees.
+# Requests are counted by the 'info' log level, on which snmpsim writes var-binds of each request and response (about
+# 400 bytes per request) on the data path, so 'error' level saves the daemon CPU and disk I/O at the cost of the traffic
+# and idle time. Daemon keeps 30 rotated logs of SNMPSIM_DAEMON_LOG_MAX_SIZE, requests rotated out of them between
+# the collections are lost, so the collection interval must be shorter than 30 logs take at the peak request rate
+SNMPSIM_TRAFFIC_BUCKET_SIZE = 60
+SNMPSIM_TRAFFIC_RETENTION = 7 * 24 * 60 * 60
+SNMPSIM_TRAFFIC_SUMMARY_PERIOD = 60 * 60
+SNMPSIM_TRAFFIC_TOP_SUBTREES = 10
+
+# on-demand recordings ('manage.py run_snmpsim_listener'): interval the listener binds endpoints of the new stopped
+# on-demand recordings with (seconds), number of the recordings started concurrently and timeout of the requests
+# received until the daemon is ready, they are forwarded to it concurrently within the timeout (seconds)
+SNMPSIM_ON_DEMAND_SYNC_INTERVAL = 10
+SNMPSIM_ON_DEMAND_WORKERS = 8
+SNMPSIM_ON_DEMAND_FORWARD_TIMEOUT = 5
+
+# profiling of the requests and runner phases: operations and SQL queries longer than the thresholds (seconds) are
+# written to the slow_operations.log, superuser can capture cProfile of a single request with the '?profile' query
+# parameter into the folder (empty disables the capture)
+SNMPSIM_SLOW_OPERATION_THRESHOLD = 1
+SNMPSIM_SLOW_QUERY_THRESHOLD = 0.1
+SNMPSIM_PROFILE_FOLDER = ""
+
 # exception will be raised in case local_settings.py missed
 try:
     from .local_settings import *  # noqa
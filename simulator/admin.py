@@ -1,15 +1,31 @@
+import datetime
 import logging
+import re
+import time
 
+from django.conf import settings
 from django.conf.urls import url
 from django.contrib import admin, messages
-from django.http import HttpResponseRedirect
+from django.contrib.admin.utils import display_for_value
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Q
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, JsonResponse
 from django.template.loader import render_to_string
+from django.template.defaultfilters import filesizeformat
+from django.template.response import TemplateResponse
 from django.urls import reverse
-
-from .forms import RecordingForm
-from .models import Recording
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from django.utils.timesince import timesince
+
+from .capture import start_recording_capture
+from .forms import CaptureRecordingForm, CloneRecordingForm, RecordingForm, ResponseProfileForm
+from . import profiling, search
+from .models import Node, Recording, RecordingCapture, get_status_version
+from .nodes import get_snmpsim_runner, start_per_node, stop_per_node
+from .resources import get_recording_usage
 from .snmp_handler import SNMPHandler
-from .snmpsim_runner import SNMPSimOSCommandRunner
+from .traffic import get_traffic_summary
 
 
 admin.site.site_header = "Quali Simulator"
@@ -19,10 +35,42 @@ admin.site.index_title = "Welcome to Quali Simulator"
 logger = logging.getLogger(__name__)
 
 
+class OIDsCountListFilter(admin.SimpleListFilter):
+    title = "OIDs"
+    parameter_name = "oids"
+    ranges = {
+        "lt1k": (None, 1000),
+        "1k-10k": (1000, 10000),
+        "10k-100k": (10000, 100000),
+        "gte100k": (100000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ("lt1k", "Less than 1k"),
+            ("1k-10k", "1k - 10k"),
+            ("10k-100k", "10k - 100k"),
+            ("gte100k", "100k and more"),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+
+        min_count, max_count = self.ranges[self.value()]
+        if min_count is not None:
+            queryset = queryset.filter(oids_count__gte=min_count)
+        if max_count is not None:
+            queryset = queryset.filter(oids_count__lt=max_count)
+
+        return queryset
+
+
 @admin.register(Recording)
 class RecordingAdmin(admin.ModelAdmin):
     form = RecordingForm
     change_form_template = "admin/recording_change_form.html"
+    change_list_template = "admin/recording_change_list.html"
 
     date_heirarchy = (
         "modified",
@@ -34,6 +82,12 @@ class RecordingAdmin(admin.ModelAdmin):
         "port",
         "snmp_read_community",
         "is_running",
+        "idle_time",
+        "time_to_ready",
+        "oids_count",
+        "interfaces_count",
+        "recording_file_size",
+        "node",
         "updated_at",
         "updated_by",
         "recording_actions",
@@ -49,22 +103,51 @@ class RecordingAdmin(admin.ModelAdmin):
     readonly_fields = (
         "sys_description",
         "is_running",
+        "is_idle_stopped",
+        "last_activity_at",
+        "idle_time",
+        "time_to_ready",
+        "oids_count",
+        "interfaces_count",
+        "recording_file_size",
+        "recording_subtrees",
+        "recording_traffic",
+        "resource_usage",
+        "daemon_log",
     )
 
     list_filter = (
         "is_running",
+        "is_on_demand",
+        "is_idle_stopped",
+        OIDsCountListFilter,
+        "node",
         "updated_at",
         "updated_by",
     )
 
-    def __init__(self, *args, **kwargs):
-        """
+    OID_SEARCH_TERM_RE = re.compile(r"^\.?[0-9]+(\.[0-9]+)+$")
+
+    def get_search_results(self, request, queryset, search_term):
+        """Find recordings by the fields and by their contents: OID subtree if the term is an OID or a value phrase
 
-        :param args:
-        :param kwargs:
+        :param request:
+        :param queryset:
+        :param search_term:
+        :return:
         """
-        super().__init__(*args, **kwargs)
-        self._snmpsim_runner = SNMPSimOSCommandRunner()
+        matched_queryset, use_distinct = super().get_search_results(request, queryset, search_term)
+
+        search_term = search_term.strip()
+        if not search_term:
+            return matched_queryset, use_distinct
+
+        if self.OID_SEARCH_TERM_RE.match(search_term):
+            recording_ids = search.find_recordings(oid=search_term)
+        else:
+            recording_ids = search.find_recordings(value=search_term)
+
+        return matched_queryset | queryset.filter(pk__in=recording_ids), use_distinct
 
     def recording_actions(self, obj):
         """
@@ -77,6 +160,184 @@ class RecordingAdmin(admin.ModelAdmin):
     recording_actions.short_description = 'Actions'
     recording_actions.allow_tags = True
 
+    def idle_time(self, obj):
+        """Time since the last SNMP request of the running recording, as of the last idle recordings check
+
+        :param obj:
+        :return:
+        """
+        if not obj.is_running or obj.last_activity_at is None:
+            return self.get_empty_value_display()
+
+        return timesince(obj.last_activity_at)
+
+    idle_time.short_description = 'Idle for'
+    idle_time.admin_order_field = 'last_activity_at'
+
+    def recording_file_size(self, obj):
+        """
+
+        :param obj:
+        :return:
+        """
+        if obj.file_size is None:
+            return self.get_empty_value_display()
+
+        return filesizeformat(obj.file_size)
+
+    recording_file_size.short_description = 'File size'
+    recording_file_size.admin_order_field = 'file_size'
+
+    def recording_subtrees(self, obj):
+        """Number of OIDs in the top-level MIB subtrees of the recording
+
+        :param obj:
+        :return:
+        """
+        return format_html_join("\n", "<div>{}: {}</div>",
+                                obj.subtrees.order_by("-oids_count").values_list("oid", "oids_count"))
+
+    recording_subtrees.short_description = 'Subtrees'
+
+    def recording_traffic(self, obj):
+        """SNMP requests of the recording within the last SNMPSIM_TRAFFIC_SUMMARY_PERIOD seconds
+
+        :param obj:
+        :return:
+        """
+        summary = get_traffic_summary(obj)
+        period = timesince(timezone.now() - datetime.timedelta(seconds=summary["period"]))
+        if not summary["requests"]["total"] and not summary["timeouts"]:
+            return f"No requests for the last {period}"
+
+        requests = format_html_join(", ", "{}: {} ({}/s)",
+                                    ((pdu_type.upper(), count, summary["requests_per_second"][pdu_type])
+                                     for pdu_type, count in summary["requests"].items() if count))
+        subtrees = format_html_join("\n", "<div>{}: {}</div>",
+                                    ((subtree["oid"], subtree["var_binds_count"])
+                                     for subtree in summary["top_subtrees"]))
+
+        return format_html("<div>Last {}</div><div>Requests {}</div><div>Errors: {}, timeouts: {}</div>"
+                           "<div>Top subtrees by var-binds:</div>{}",
+                           period, requests, summary["errors"], summary["timeouts"],
+                           subtrees)
+
+    recording_traffic.short_description = 'Traffic'
+
+    def resource_usage(self, obj):
+        """CPU and memory usage of the snmpsim daemon that serves the running recording against its limits
+
+        :param obj:
+        :return:
+        """
+        if not obj.is_running:
+            return self.get_empty_value_display()
+
+        try:
+            usage = get_recording_usage(obj)
+        except Exception:
+            logger.exception(f"Failed to get resource usage of the recording '{obj}' due to:")
+            return "Failed to get the usage. Please check logs for the details"
+
+        if usage is None or usage["cpu_usage"] is None:
+            return "snmpsim daemon is not running"
+
+        cpu_limit = f"of {usage['cpu_limit']}%" if usage["cpu_limit"] else "(unlimited)"
+        memory_limit = (f"of {filesizeformat(usage['memory_limit'])}" if usage["memory_limit"]
+                        else "(unlimited)")
+        shared = (format_html("<div>Shared by {} recordings of the endpoint</div>", len(usage["communities"]))
+                  if len(usage["communities"]) > 1 else "")
+
+        return format_html("<div>CPU: {}% {}</div><div>Memory: {} {}</div>{}",
+                           usage["cpu_usage"], cpu_limit, filesizeformat(usage["memory_usage"] or 0), memory_limit,
+                           shared)
+
+    resource_usage.short_description = 'Resource usage'
+
+    def daemon_log(self, obj):
+        """Last lines of the log of the snmpsim daemon that serves the recording endpoint
+
+        :param obj:
+        :return:
+        """
+        try:
+            log_lines = get_snmpsim_runner(obj.node).get_log(ip_address=obj.ip_address,
+                                                             port=obj.port,
+                                                             lines=settings.SNMPSIM_DAEMON_LOG_TAIL_LINES)
+        except Exception:
+            logger.exception(f"Failed to get snmpsim daemon log of the recording '{obj}' due to:")
+            return "Failed to get the log. Please check logs for the details"
+
+        return format_html('<pre style="max-height: 400px; overflow: auto;">{}</pre>', "".join(log_lines))
+
+    daemon_log.short_description = 'snmpsim daemon log'
+
+    def _message_user_or_json(self, request, message, level=messages.SUCCESS):
+        """Report result of the action in JSON to the AJAX request from the changelist, otherwise as admin message
+
+        :param request:
+        :param message:
+        :param level:
+        :return: JSON response or None
+        """
+        if request.is_ajax():
+            return JsonResponse({"message": message, "level": messages.DEFAULT_TAGS[level]})
+
+        self.message_user(request, message, level=level)
+
+    def changelist_view(self, request, extra_context=None):
+        """
+
+        :param request:
+        :param extra_context:
+        :return:
+        """
+        extra_context = {
+            **(extra_context or {}),
+            "status_version": Recording.objects.get_status_version(),
+        }
+
+        return super().changelist_view(request, extra_context)
+
+    @profiling.long_poll
+    def recordings_status(self, request):
+        """Long-poll for the recordings changed since the given status version
+
+        Waits up to SNMPSIM_STATUS_POLL_TIMEOUT seconds for the changes or deletion of the recordings shown
+        by the changelist ('ids' parameter), so it can update its rows in place instead of reloading the whole page
+
+        :param request:
+        :return:
+        """
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        try:
+            version = int(request.GET.get("since", 0))
+            shown_ids = {int(recording_id) for recording_id in request.GET.get("ids", "").split(",") if recording_id}
+        except ValueError:
+            return HttpResponseBadRequest("Status version and recording IDs must be integers")
+
+        deadline = time.monotonic() + settings.SNMPSIM_STATUS_POLL_TIMEOUT
+        while True:
+            recordings = list(Recording.objects.changed_since(version).only("id", "is_running", "updated_at"))
+            existing_ids = set(Recording.objects.filter(pk__in=shown_ids).values_list("pk", flat=True))
+            if recordings or existing_ids != shown_ids or time.monotonic() >= deadline:
+                break
+
+            time.sleep(settings.SNMPSIM_STATUS_POLL_INTERVAL)
+
+        return JsonResponse({
+            "version": max([version] + [get_status_version(recording.updated_at) for recording in recordings]),
+            "existing_ids": sorted(existing_ids),
+            "recordings": [{
+                "id": recording.pk,
+                "is_running": recording.is_running,
+                "is_running_html": display_for_value(recording.is_running, "", boolean=True),
+                "actions_html": self.recording_actions(recording),
+            } for recording in recordings],
+        })
+
     def get_urls(self):
         """
 
@@ -84,6 +345,26 @@ class RecordingAdmin(admin.ModelAdmin):
         """
         urls = super().get_urls()
         custom_urls = [
+            url(
+                r'^status/$',
+                self.admin_site.admin_view(self.recordings_status),
+                name='recording-status',
+            ),
+            url(
+                r'^capture/$',
+                self.admin_site.admin_view(self.capture_recording),
+                name='recording-capture',
+            ),
+            url(
+                r'^(?P<recording_id>.+)/clone/$',
+                self.admin_site.admin_view(self.clone_recording),
+                name='recording-clone',
+            ),
+            url(
+                r'^(?P<recording_id>.+)/response_profile/$',
+                self.admin_site.admin_view(self.change_response_profile),
+                name='recording-response-profile',
+            ),
             url(
                 r'^(?P<recording_id>.+)/start/$',
                 self.admin_site.admin_view(self.start_recording),
@@ -107,7 +388,10 @@ class RecordingAdmin(admin.ModelAdmin):
         fields = super().get_fields(request, obj)
 
         if obj is None:
-            fields.remove("sys_description")
+            for field in ("sys_description", "is_idle_stopped", "last_activity_at", "idle_time", "time_to_ready",
+                          "oids_count", "interfaces_count", "recording_file_size", "recording_subtrees",
+                          "recording_traffic", "resource_usage", "daemon_log"):
+                fields.remove(field)
 
         return fields
 
@@ -131,11 +415,13 @@ class RecordingAdmin(admin.ModelAdmin):
         :return:
         """
         try:
-            self._snmpsim_runner.stop(recording_file=obj.recording_file.path,
-                                      ip_address=obj.ip_address,
-                                      port=obj.port,
-                                      snmp_read_community=obj.snmp_read_community,
-                                      remove_sub_iface=Recording.objects.is_ip_address_unique(obj.ip_address))
+            with profiling.profile_operation("admin.stop_recording", recording=obj.pk):
+                get_snmpsim_runner(obj.node).stop(recording_file=obj.recording_file.path,
+                                                  ip_address=obj.ip_address,
+                                                  port=obj.port,
+                                                  snmp_read_community=obj.snmp_read_community,
+                                                  remove_sub_iface=Recording.objects.is_ip_address_unique(
+                                                      obj.ip_address))
         except Exception:
             logger.exception(f"Failed to stop recording '{obj}' due to:")
             self.message_user(request, f"Failed to stop recording: '{obj}'. Please check logs for the details",
@@ -150,18 +436,9 @@ class RecordingAdmin(admin.ModelAdmin):
         :param queryset:
         :return:
         """
-        failed_recordings = []
-        for recording in queryset:
-            try:
-                self._snmpsim_runner.stop(recording_file=recording.recording_file.path,
-                                          ip_address=recording.ip_address,
-                                          port=recording.port,
-                                          snmp_read_community=recording.snmp_read_community,
-                                          remove_sub_iface=Recording.objects.is_ip_address_unique(recording.ip_address))
-            except Exception:
-                logger.exception(f"Failed to stop recording {recording} due to:")
-                failed_recordings.append(recording)
-                continue
+        with profiling.profile_operation("admin.stop_recordings"):
+            results = stop_per_node(queryset.select_related("node"))
+        failed_recordings = [recording for recording, error in results if error is not None]
 
         if failed_recordings:
             self.message_user(request, f"Failed to stop next recordings: {failed_recordings}", level=messages.ERROR)
@@ -179,22 +456,27 @@ class RecordingAdmin(admin.ModelAdmin):
             old_recording = Recording.objects.get(pk=obj.pk)
 
             try:
-                self._snmpsim_runner.stop(recording_file=old_recording.recording_file.path,
-                                          ip_address=old_recording.ip_address,
-                                          port=old_recording.port,
-                                          snmp_read_community=old_recording.snmp_read_community,
-                                          remove_sub_iface=Recording.objects.is_ip_address_unique(
-                                              old_recording.ip_address))
+                with profiling.profile_operation("admin.stop_recording", recording=obj.pk):
+                    get_snmpsim_runner(old_recording.node).stop(
+                        recording_file=old_recording.recording_file.path,
+                        ip_address=old_recording.ip_address,
+                        port=old_recording.port,
+                        snmp_read_community=old_recording.snmp_read_community,
+                        remove_sub_iface=Recording.objects.is_ip_address_unique(old_recording.ip_address))
             except Exception:
                 logger.exception(f"Failed to stop old recording '{old_recording}' due to:")
             obj.is_running = False
 
         if "_start" in request.POST:
             try:
-                self._snmpsim_runner.start(recording_file=obj.recording_file.path,
-                                           ip_address=obj.ip_address,
-                                           port=obj.port,
-                                           snmp_read_community=obj.snmp_read_community)
+                with profiling.profile_operation("admin.start_recording", recording=obj.pk):
+                    obj.time_to_ready = get_snmpsim_runner(obj.node).start(recording_file=obj.recording_file.path,
+                                                                           ip_address=obj.ip_address,
+                                                                           port=obj.port,
+                                                                           snmp_read_community=obj.snmp_read_community,
+                                                                           overlay=obj.overlay,
+                                                                           response_profile=obj.response_profile,
+                                                                           resource_limits=obj.resource_limits)
             except Exception:
                 logger.exception(f"Failed to start recording '{obj}' due to:")
                 obj.is_running = False
@@ -210,7 +492,8 @@ class RecordingAdmin(admin.ModelAdmin):
                                                    port=obj.port,
                                                    logger=logger)
 
-                        obj.sys_description = snmp_handler.get_sys_desc()
+                        with profiling.profile_operation("snmp.get_sys_desc", recording=obj.pk):
+                            obj.sys_description = snmp_handler.get_sys_desc()
 
                     except Exception:
                         logger.exception(f"Failed to discover sysDescr of recording '{obj}' due to:")
@@ -234,10 +517,14 @@ class RecordingAdmin(admin.ModelAdmin):
         """
         if "_start" in request.POST:
             try:
-                self._snmpsim_runner.start(recording_file=obj.recording_file.path,
-                                           ip_address=obj.ip_address,
-                                           port=obj.port,
-                                           snmp_read_community=obj.snmp_read_community)
+                with profiling.profile_operation("admin.start_recording", recording=obj.pk):
+                    obj.time_to_ready = get_snmpsim_runner(obj.node).start(recording_file=obj.recording_file.path,
+                                                                           ip_address=obj.ip_address,
+                                                                           port=obj.port,
+                                                                           snmp_read_community=obj.snmp_read_community,
+                                                                           overlay=obj.overlay,
+                                                                           response_profile=obj.response_profile,
+                                                                           resource_limits=obj.resource_limits)
             except Exception:
                 logger.exception(f"Failed to start recording '{obj}' due to:")
                 obj.is_running = False
@@ -253,7 +540,8 @@ class RecordingAdmin(admin.ModelAdmin):
                                                    port=obj.port,
                                                    logger=logger)
 
-                        obj.sys_description = snmp_handler.get_sys_desc()
+                        with profiling.profile_operation("snmp.get_sys_desc", recording=obj.pk):
+                            obj.sys_description = snmp_handler.get_sys_desc()
 
                     except Exception:
                         logger.exception(f"Failed to discover sysDescr of recording '{obj}' due to:")
@@ -276,20 +564,28 @@ class RecordingAdmin(admin.ModelAdmin):
         """
         recording = self.get_object(request, recording_id)
         try:
-            self._snmpsim_runner.start(recording_file=recording.recording_file.path,
-                                       ip_address=recording.ip_address,
-                                       port=recording.port,
-                                       snmp_read_community=recording.snmp_read_community)
+            with profiling.profile_operation("admin.start_recording", recording=recording.pk):
+                time_to_ready = get_snmpsim_runner(recording.node).start(
+                    recording_file=recording.recording_file.path,
+                    ip_address=recording.ip_address,
+                    port=recording.port,
+                    snmp_read_community=recording.snmp_read_community,
+                    overlay=recording.overlay,
+                    response_profile=recording.response_profile,
+                    resource_limits=recording.resource_limits)
         except Exception:
             logger.exception(f"Failed to start recording '{recording}' due to:")
-            self.message_user(request, f"Failed to start recording: '{recording}'. Please check logs for the details",
-                              level=messages.ERROR)
+            message = f"Failed to start recording: '{recording}'. Please check logs for the details"
+            level = messages.ERROR
         else:
             recording.is_running = True
+            recording.time_to_ready = time_to_ready
             recording.save()
-            self.message_user(request, f"Recording '{recording}' started")
+            message = f"Recording '{recording}' started"
+            level = messages.SUCCESS
 
-        return HttpResponseRedirect(reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name))
+        return (self._message_user_or_json(request, message, level=level) or
+                HttpResponseRedirect(reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name)))
 
     def stop_recording(self, request, recording_id):
         """
@@ -300,66 +596,182 @@ class RecordingAdmin(admin.ModelAdmin):
         """
         recording = self.get_object(request, recording_id)
         try:
-            self._snmpsim_runner.stop(recording_file=recording.recording_file.path,
-                                      ip_address=recording.ip_address,
-                                      port=recording.port,
-                                      snmp_read_community=recording.snmp_read_community,
-                                      remove_sub_iface=Recording.objects.is_ip_address_unique(recording.ip_address))
+            with profiling.profile_operation("admin.stop_recording", recording=recording.pk):
+                get_snmpsim_runner(recording.node).stop(recording_file=recording.recording_file.path,
+                                                        ip_address=recording.ip_address,
+                                                        port=recording.port,
+                                                        snmp_read_community=recording.snmp_read_community,
+                                                        remove_sub_iface=Recording.objects.is_ip_address_unique(
+                                                            recording.ip_address))
         except Exception:
             logger.exception(f"Failed to stop recording '{recording}' due to:")
-            self.message_user(request, f"Failed to stop recording: '{recording}'. Please check logs for the details",
-                              level=messages.ERROR)
+            message = f"Failed to stop recording: '{recording}'. Please check logs for the details"
+            level = messages.ERROR
         else:
             recording.is_running = False
             recording.save()
-            self.message_user(request, f"Recording '{recording}' stopped")
+            message = f"Recording '{recording}' stopped"
+            level = messages.SUCCESS
 
-        return HttpResponseRedirect(reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name))
+        return (self._message_user_or_json(request, message, level=level) or
+                HttpResponseRedirect(reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name)))
 
-    def start_recordings(self, request, queryset):
+    def capture_recording(self, request):
+        """Capture new recording from the live device
+
+        :param request:
+        :return:
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        if request.method == "POST":
+            form = CaptureRecordingForm(request.POST)
+            if form.is_valid():
+                start_recording_capture(updated_by=request.user, **form.cleaned_data)
+                self.message_user(request, f"Capture of the device {form.cleaned_data['device_ip_address']} queued. "
+                                           f"Recording '{form.cleaned_data['name']}' will be added when it finishes, "
+                                           f"its state and errors are shown on the recording captures page")
+
+                return HttpResponseRedirect(
+                    reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name))
+        else:
+            form = CaptureRecordingForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Capture recording from device",
+            "opts": self.model._meta,
+            "form": form,
+            "media": self.media + form.media,
+        }
+
+        return TemplateResponse(request, "admin/recording_capture_form.html", context)
+
+    def clone_recording(self, request, recording_id):
+        """Clone recording onto the free IP addresses, clones share its recording file
+
+        :param request:
+        :param recording_id:
+        :return:
+        """
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        recording = self.get_object(request, recording_id)
+        if request.method == "POST":
+            form = CloneRecordingForm(request.POST)
+            if form.is_valid():
+                try:
+                    clones = Recording.objects.clone(source=recording, updated_by=request.user, **form.cleaned_data)
+                except ValueError as e:
+                    form.add_error(None, str(e))
+                else:
+                    self.message_user(request, f"Recording '{recording}' cloned into {len(clones)} recordings: "
+                                               f"{clones[0].ip_address} - {clones[-1].ip_address}")
+
+                    return HttpResponseRedirect(
+                        reverse("admin:simulator_recording_changelist", current_app=self.admin_site.name))
+        else:
+            form = CloneRecordingForm()
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Clone recording '{recording}'",
+            "opts": self.model._meta,
+            "original": recording,
+            "form": form,
+            "media": self.media + form.media,
+        }
+
+        return TemplateResponse(request, "admin/recording_clone_form.html", context)
+
+    def change_response_profile(self, request, recording_id):
+        """Change response profile of the recording, it is applied to the running recording without restart
+
+        :param request:
+        :param recording_id:
+        :return:
         """
+        recording = self.get_object(request, recording_id)
+        if not self.has_change_permission(request, recording):
+            raise PermissionDenied
+
+        if request.method == "POST":
+            form = ResponseProfileForm(request.POST, instance=recording)
+            if form.is_valid():
+                recording = form.save(commit=False)
+                recording.updated_by = request.user
+                try:
+                    if recording.is_running:
+                        with profiling.profile_operation("admin.set_response_profile", recording=recording.pk):
+                            get_snmpsim_runner(recording.node).set_response_profile(
+                                ip_address=recording.ip_address,
+                                port=recording.port,
+                                response_profile=recording.response_profile)
+                except Exception:
+                    logger.exception(f"Failed to apply response profile of recording '{recording}' due to:")
+                    form.add_error(None, "Failed to apply response profile. Please check logs for the details")
+                else:
+                    recording.save()
+                    self.message_user(request, f"Response profile of recording '{recording}' changed")
+
+                    return HttpResponseRedirect(
+                        reverse("admin:simulator_recording_change", args=(recording.pk,),
+                                current_app=self.admin_site.name))
+        else:
+            form = ResponseProfileForm(instance=recording)
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Response profile of recording '{recording}'",
+            "opts": self.model._meta,
+            "original": recording,
+            "form": form,
+            "media": self.media + form.media,
+        }
+
+        return TemplateResponse(request, "admin/recording_response_profile_form.html", context)
+
+    def start_recordings(self, request, queryset):
+        """Start recordings, recordings on the different nodes are started and waited for concurrently
 
         :param request:
         :param queryset:
         :return:
         """
+        with profiling.profile_operation("admin.start_recordings"):
+            results = start_per_node(queryset.select_related("node"))
+
         failed_recordings = []
-        for recording in queryset:
-            try:
-                self._snmpsim_runner.start(recording_file=recording.recording_file.path,
-                                           ip_address=recording.ip_address,
-                                           port=recording.port,
-                                           snmp_read_community=recording.snmp_read_community)
-            except Exception:
-                logger.exception(f"Failed to start recording {recording} due to:")
+        for recording, error, time_to_ready in results:
+            if error is not None:
                 failed_recordings.append(recording)
                 continue
 
             recording.is_running = True
+            recording.time_to_ready = time_to_ready
             recording.save()
 
         if failed_recordings:
-            self.message_user(request, f"Failed to start next recordings: {failed_recordings}", level=messages.ERROR)
-        else:
-            self.message_user(request, f"Selected recordings successfully started")
+            return self._message_user_or_json(request, f"Failed to start next recordings: {failed_recordings}",
+                                              level=messages.ERROR)
+
+        return self._message_user_or_json(request, f"Selected recordings successfully started")
 
     def stop_recordings(self, request, queryset):
-        """
+        """Stop recordings, recordings on the different nodes are stopped concurrently
 
         :param request:
         :param queryset:
         :return:
         """
+        with profiling.profile_operation("admin.stop_recordings"):
+            results = stop_per_node(queryset.select_related("node"))
+
         failed_recordings = []
-        for recording in queryset:
-            try:
-                self._snmpsim_runner.stop(recording_file=recording.recording_file.path,
-                                          ip_address=recording.ip_address,
-                                          port=recording.port,
-                                          snmp_read_community=recording.snmp_read_community,
-                                          remove_sub_iface=Recording.objects.is_ip_address_unique(recording.ip_address))
-            except Exception:
-                logger.exception(f"Failed to stop recording {recording} due to:")
+        for recording, error in results:
+            if error is not None:
                 failed_recordings.append(recording)
                 continue
 
@@ -367,10 +779,88 @@ class RecordingAdmin(admin.ModelAdmin):
             recording.save()
 
         if failed_recordings:
-            self.message_user(request, f"Failed to stop next recordings: {failed_recordings}", level=messages.ERROR)
-        else:
-            self.message_user(request, f"Selected recordings successfully stopped")
+            return self._message_user_or_json(request, f"Failed to stop next recordings: {failed_recordings}",
+                                              level=messages.ERROR)
+
+        return self._message_user_or_json(request, f"Selected recordings successfully stopped")
 
     actions = [start_recordings, stop_recordings]
     start_recordings.short_description = "Start selected recordings"
     stop_recordings.short_description = "Stop selected recordings"
+
+
+@admin.register(Node)
+class NodeAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "url",
+        "is_enabled",
+        "running_recordings",
+        "total_recordings",
+    )
+
+    search_fields = (
+        "name",
+        "url",
+        "comment",
+    )
+
+    list_filter = (
+        "is_enabled",
+    )
+
+    def get_queryset(self, request):
+        """
+
+        :param request:
+        :return:
+        """
+        return super().get_queryset(request).annotate(
+            running_recordings=Count("recordings", filter=Q(recordings__is_running=True)),
+            total_recordings=Count("recordings"))
+
+    def running_recordings(self, obj):
+        return obj.running_recordings
+
+    running_recordings.short_description = "Running recordings"
+    running_recordings.admin_order_field = "running_recordings"
+
+    def total_recordings(self, obj):
+        return obj.total_recordings
+
+    total_recordings.short_description = "Total recordings"
+    total_recordings.admin_order_field = "total_recordings"
+
+
+@admin.register(RecordingCapture)
+class RecordingCaptureAdmin(admin.ModelAdmin):
+    """Captures are queued from the recording capture form, so they are only viewed here"""
+    list_display = (
+        "name",
+        "device_ip_address",
+        "ip_address",
+        "status",
+        "recording",
+        "created_at",
+        "finished_at",
+        "updated_by",
+    )
+
+    search_fields = (
+        "name",
+        "device_ip_address",
+        "ip_address",
+        "error",
+    )
+
+    list_filter = (
+        "status",
+        "created_at",
+        "updated_by",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
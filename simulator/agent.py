@@ -0,0 +1,524 @@
+import collections
+import hmac
+import http.server
+import ipaddress
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+
+from . import profiling
+from .snmpsim_runner import SNMPSimRunner
+
+
+logger = logging.getLogger(__name__)
+
+
+class SNMPSimAgentError(Exception):
+    def __init__(self, status, message):
+        """
+
+        :param status: HTTP status of the agent response
+        :param message:
+        """
+        super().__init__(f"Simulator agent error {status}: {message}")
+        self.status = status
+
+
+def get_recording_name(recording_file):
+    """Get name the recording file is stored under on the agent
+
+    Recordings are uploaded into the unique directories, so the directory with the file name identifies the file
+
+    :param recording_file:
+    :return:
+    """
+    return f"{os.path.basename(os.path.dirname(recording_file))}/{os.path.basename(recording_file)}"
+
+
+class SNMPSimAgentRunner(SNMPSimRunner):
+    """Runs snmpsim recordings on the remote node through its simulator agent
+
+    Has the same interface as the local runner, recording file is uploaded to the agent on the first start
+    """
+    def __init__(self, url, token=None, timeout=None):
+        """
+
+        :param url: URL of the simulator agent
+        :param token: SNMPSIM_AGENT_TOKEN by default
+        :param timeout: SNMPSIM_AGENT_TIMEOUT by default
+        """
+        self._url = url.rstrip("/")
+        self._token = settings.SNMPSIM_AGENT_TOKEN if token is None else token
+        self._timeout = settings.SNMPSIM_AGENT_TIMEOUT if timeout is None else timeout
+
+    def _request(self, method, path, data=None, body=None, headers=None):
+        """
+
+        :param method:
+        :param path:
+        :param data: JSON payload of the request
+        :param body: raw body of the request (file object)
+        :param headers:
+        :return: parsed JSON response or None for the empty one
+        """
+        headers = dict(headers or {})
+        if self._token:
+            headers["Authorization"] = f"Token {self._token}"
+
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers["Content-Type"] = "application/json"
+
+        request = urllib.request.Request(f"{self._url}{path}", data=body, headers=headers, method=method)
+        try:
+            with profiling.profile_operation("agent.request", url=self._url, method=method, path=path), \
+                    urllib.request.urlopen(request, timeout=self._timeout) as response:
+                content = response.read()
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise SNMPSimAgentError(status=e.code, message=message) from e
+
+        if content:
+            return json.loads(content)
+
+    def _upload_recording_file(self, recording_file):
+        """
+
+        :param recording_file:
+        :return:
+        """
+        logger.info(f"Uploading recording '{recording_file}' to the simulator agent {self._url} ...")
+        with open(recording_file, "rb") as file:
+            self._request("PUT",
+                          f"/recordings/{urllib.parse.quote(get_recording_name(recording_file))}",
+                          body=file,
+                          headers={"Content-Length": str(os.path.getsize(recording_file)),
+                                   "Content-Type": "application/octet-stream"})
+
+    def start(self, recording_file, ip_address, port, snmp_read_community, wait_ready=True, overlay="",
+              response_profile=None, resource_limits=None):
+        """
+
+        :param recording_file:
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :param wait_ready:
+        :param overlay:
+        :param response_profile:
+        :param resource_limits:
+        :return: seconds from the start until the daemon is ready on the node or None
+        """
+        data = {
+            "recording_file": get_recording_name(recording_file),
+            "ip_address": ip_address,
+            "port": port,
+            "snmp_read_community": snmp_read_community,
+            "wait_ready": wait_ready,
+            "overlay": overlay,
+            "response_profile": response_profile,
+            "resource_limits": resource_limits,
+        }
+        try:
+            return self._request("POST", "/start", data=data)["time_to_ready"]
+        except SNMPSimAgentError as e:
+            if e.status != http.HTTPStatus.NOT_FOUND:
+                raise
+
+        self._upload_recording_file(recording_file)
+        return self._request("POST", "/start", data=data)["time_to_ready"]
+
+    def wait_ready(self, ip_address, port, snmp_read_community):
+        """
+
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :return: seconds the daemon was waited for or None if it isn't ready
+        """
+        return self._request("POST", "/wait_ready", data={
+            "ip_address": ip_address,
+            "port": port,
+            "snmp_read_community": snmp_read_community,
+        })["time_to_ready"]
+
+    def set_response_profile(self, ip_address, port, response_profile):
+        """
+
+        :param ip_address:
+        :param port:
+        :param response_profile:
+        :return:
+        """
+        self._request("POST", "/response_profile", data={
+            "ip_address": ip_address,
+            "port": port,
+            "response_profile": response_profile,
+        })
+
+    def stop(self, recording_file, ip_address, port, snmp_read_community, remove_sub_iface=False):
+        """
+
+        :param recording_file:
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :param remove_sub_iface:
+        :return:
+        """
+        self._request("POST", "/stop", data={
+            "recording_file": get_recording_name(recording_file),
+            "ip_address": ip_address,
+            "port": port,
+            "snmp_read_community": snmp_read_community,
+            "remove_sub_iface": remove_sub_iface,
+        })
+
+    def remove_recording_file(self, recording_file):
+        """Remove recording file uploaded to the agent, it's uploaded again by the next start
+
+        :param recording_file:
+        :return:
+        """
+        logger.info(f"Removing recording '{recording_file}' from the simulator agent {self._url} ...")
+        try:
+            self._request("DELETE", f"/recordings/{urllib.parse.quote(get_recording_name(recording_file))}")
+        except SNMPSimAgentError as e:
+            if e.status != http.HTTPStatus.NOT_FOUND:
+                raise
+
+    def get_log(self, ip_address, port, lines):
+        """
+
+        :param ip_address:
+        :param port:
+        :param lines:
+        :return:
+        """
+        query = urllib.parse.urlencode({"ip_address": ip_address, "port": port, "lines": lines})
+        return self._request("GET", f"/log?{query}")["lines"]
+
+    def get_status(self):
+        """
+
+        :return:
+        """
+        return self._request("GET", "/status")
+
+    def get_activity(self):
+        """
+
+        :return:
+        """
+        return self._request("GET", "/activity")
+
+    def get_traffic(self, bucket_size):
+        """
+
+        :param bucket_size:
+        :return:
+        """
+        query = urllib.parse.urlencode({"bucket_size": bucket_size})
+        return self._request("GET", f"/traffic?{query}")
+
+    def get_usage(self, interval, ip_address=None, port=None):
+        """
+
+        :param interval:
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        query = {"interval": interval}
+        if ip_address is not None:
+            query.update({"ip_address": ip_address, "port": port})
+        return self._request("GET", f"/usage?{urllib.parse.urlencode(query)}")
+
+    def stop_all(self):
+        """
+
+        :return:
+        """
+        self._request("POST", "/stop_all")
+
+
+class SNMPSimAgentRequestHandler(http.server.BaseHTTPRequestHandler):
+    """JSON API of the simulator agent over the local runner"""
+    server_version = "SNMPSimAgent"
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, data=None):
+        """
+
+        :param status:
+        :param data:
+        :return:
+        """
+        body = b"" if data is None else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        """
+
+        :return:
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _is_authorized(self):
+        """
+
+        :return:
+        """
+        if not self.server.token:
+            return True
+
+        return hmac.compare_digest(self.headers.get("Authorization", ""), f"Token {self.server.token}")
+
+    def _get_recording_file(self, name):
+        """Get path of the recording file in the agent recordings folder
+
+        :param name: '<directory>/<file name>' of the recording
+        :return:
+        """
+        parts = name.split("/")
+        if len(parts) != 2 or any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"Invalid recording name '{name}'")
+
+        return os.path.join(self.server.recordings_folder, *parts)
+
+    def _handle(self, method):
+        """
+
+        :param method:
+        :return:
+        """
+        if not self._is_authorized():
+            return self._send_json(http.HTTPStatus.UNAUTHORIZED, {"error": "Invalid token"})
+
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            if method == "GET" and url.path == "/status":
+                return self._send_json(http.HTTPStatus.OK, self.server.runner.get_status())
+
+            if method == "GET" and url.path == "/activity":
+                return self._send_json(http.HTTPStatus.OK, self.server.runner.get_activity())
+
+            if method == "GET" and url.path == "/traffic":
+                query = dict(urllib.parse.parse_qsl(url.query))
+                return self._send_json(http.HTTPStatus.OK,
+                                       self.server.runner.get_traffic(bucket_size=int(query["bucket_size"])))
+
+            if method == "GET" and url.path == "/usage":
+                query = dict(urllib.parse.parse_qsl(url.query))
+                port = int(query["port"]) if "port" in query else None
+                return self._send_json(http.HTTPStatus.OK,
+                                       self.server.runner.get_usage(interval=float(query["interval"]),
+                                                                    ip_address=query.get("ip_address"),
+                                                                    port=port))
+
+            if method == "GET" and url.path == "/log":
+                query = dict(urllib.parse.parse_qsl(url.query))
+                lines = self.server.runner.get_log(ip_address=query["ip_address"],
+                                                   port=int(query["port"]),
+                                                   lines=int(query["lines"]))
+                return self._send_json(http.HTTPStatus.OK, {"lines": lines})
+
+            if method == "PUT" and url.path.startswith("/recordings/"):
+                self._upload_recording_file(urllib.parse.unquote(url.path[len("/recordings/"):]))
+                return self._send_json(http.HTTPStatus.NO_CONTENT)
+
+            if method == "DELETE" and url.path.startswith("/recordings/"):
+                self._remove_recording_file(urllib.parse.unquote(url.path[len("/recordings/"):]))
+                return self._send_json(http.HTTPStatus.NO_CONTENT)
+
+            if method == "POST" and url.path == "/start":
+                return self._send_json(http.HTTPStatus.OK, {"time_to_ready": self._start(**self._read_json())})
+
+            if method == "POST" and url.path == "/wait_ready":
+                return self._send_json(http.HTTPStatus.OK,
+                                       {"time_to_ready": self.server.runner.wait_ready(**self._read_json())})
+
+            if method == "POST" and url.path == "/response_profile":
+                self._set_response_profile(**self._read_json())
+                return self._send_json(http.HTTPStatus.NO_CONTENT)
+
+            if method == "POST" and url.path == "/stop":
+                self._stop(**self._read_json())
+                return self._send_json(http.HTTPStatus.NO_CONTENT)
+
+            if method == "POST" and url.path == "/stop_all":
+                self.server.runner.stop_all()
+                return self._send_json(http.HTTPStatus.NO_CONTENT)
+
+        except FileNotFoundError as e:
+            return self._send_json(http.HTTPStatus.NOT_FOUND, {"error": str(e)})
+        except (KeyError, TypeError, ValueError) as e:
+            return self._send_json(http.HTTPStatus.BAD_REQUEST, {"error": f"Invalid request: {e}"})
+        except Exception as e:
+            logger.exception(f"Failed to handle request '{method} {url.path}' due to:")
+            return self._send_json(http.HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+        return self._send_json(http.HTTPStatus.NOT_FOUND, {"error": f"Unknown request '{method} {url.path}'"})
+
+    def _upload_recording_file(self, name):
+        """
+
+        :param name:
+        :return:
+        """
+        recording_file = self._get_recording_file(name)
+        os.makedirs(os.path.dirname(recording_file), exist_ok=True)
+
+        length = int(self.headers["Content-Length"])
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(recording_file), delete=False) as file:
+            while length > 0:
+                chunk = self.rfile.read(min(length, 64 * 1024))
+                if not chunk:
+                    raise ValueError("Recording file upload is incomplete")
+                file.write(chunk)
+                length -= len(chunk)
+
+        os.replace(file.name, recording_file)
+
+    def _remove_recording_file(self, name):
+        """Remove uploaded recording file with its directory
+
+        Endpoints that still serve the recording keep the open file, only the next start of them fails
+
+        :param name:
+        :return:
+        """
+        recording_file = self._get_recording_file(name)
+        os.remove(recording_file)
+        try:
+            os.rmdir(os.path.dirname(recording_file))
+        except OSError:
+            pass
+
+    def _start(self, recording_file, ip_address, port, snmp_read_community, wait_ready=True, overlay="",
+               response_profile=None, resource_limits=None):
+        """
+
+        :param recording_file:
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :param wait_ready:
+        :param overlay:
+        :param response_profile:
+        :param resource_limits:
+        :return: time to ready of the daemon
+        """
+        recording_file = self._get_recording_file(recording_file)
+        if not os.path.exists(recording_file):
+            raise FileNotFoundError(f"Recording file '{recording_file}' is not uploaded")
+
+        with self.server.get_endpoint_lock(ip_address=ip_address, port=port):
+            return self.server.runner.start(recording_file=recording_file,
+                                            ip_address=ip_address,
+                                            port=port,
+                                            snmp_read_community=snmp_read_community,
+                                            wait_ready=wait_ready,
+                                            overlay=overlay,
+                                            response_profile=response_profile,
+                                            resource_limits=resource_limits)
+
+    def _set_response_profile(self, ip_address, port, response_profile):
+        """
+
+        :param ip_address:
+        :param port:
+        :param response_profile:
+        :return:
+        """
+        with self.server.get_endpoint_lock(ip_address=ip_address, port=port):
+            self.server.runner.set_response_profile(ip_address=ip_address,
+                                                    port=port,
+                                                    response_profile=response_profile)
+
+    def _stop(self, recording_file, ip_address, port, snmp_read_community, remove_sub_iface=False):
+        """
+
+        :param recording_file:
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :param remove_sub_iface:
+        :return:
+        """
+        with self.server.get_endpoint_lock(ip_address=ip_address, port=port):
+            self.server.runner.stop(recording_file=self._get_recording_file(recording_file),
+                                    ip_address=ip_address,
+                                    port=port,
+                                    snmp_read_community=snmp_read_community,
+                                    remove_sub_iface=remove_sub_iface)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class SNMPSimAgentServer(http.server.ThreadingHTTPServer):
+    """Simulator agent that exposes the local runner operations over HTTP
+
+    Requests for the different endpoints are handled concurrently, requests for the same endpoint one by one,
+    as they restart the same snmpsim daemon
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, runner, recordings_folder, token):
+        """
+
+        :param server_address:
+        :param runner: local runner
+        :param recordings_folder: folder the recordings are uploaded into
+        :param token: token the requests must be authorized with, requests are not authorized if it is empty,
+            which is allowed only for the agent bound to the loopback address
+        :raises ValueError: if the agent without the token isn't bound to the loopback address
+        """
+        super().__init__(server_address, SNMPSimAgentRequestHandler)
+        if not token and not ipaddress.ip_address(self.server_address[0]).is_loopback:
+            self.server_close()
+            raise ValueError(f"Simulator agent on {self.server_address[0]} accepts requests from the other hosts, "
+                             f"so SNMPSIM_AGENT_TOKEN must be set")
+
+        self.runner = runner
+        self.recordings_folder = recordings_folder
+        self.token = token
+        self._endpoint_locks = collections.defaultdict(threading.Lock)
+        self._endpoint_locks_lock = threading.Lock()
+
+    def get_endpoint_lock(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        with self._endpoint_locks_lock:
+            return self._endpoint_locks[(ip_address, int(port))]
@@ -1,22 +1,248 @@
+import datetime
 import logging
-from rest_framework import serializers, viewsets, response, decorators, permissions, exceptions, status
-from .models import Recording
-from .snmpsim_runner import SNMPSimOSCommandRunner
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers, viewsets, response, decorators, permissions, exceptions, status, filters
+from . import profiling, search, snmprec
+from .capture import start_recording_capture
+from .models import Node, Recording, RecordingCapture, RecordingSubtree, RecordingTraffic, RecordingTrafficSubtree
+from .nodes import get_snmpsim_runner
+from .resources import get_recording_usage
+from .traffic import get_traffic_summary
 
 logger = logging.getLogger(__name__)
 
 
 # Serializers define the API representation.
+class RecordingSubtreeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordingSubtree
+        fields = ['oid', 'oids_count']
+
+
+class RecordingTrafficSubtreeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordingTrafficSubtree
+        fields = ['oid', 'var_binds_count']
+
+
+class RecordingTrafficSerializer(serializers.ModelSerializer):
+    subtrees = RecordingTrafficSubtreeSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = RecordingTraffic
+        fields = ['started_at', 'get_requests', 'get_next_requests', 'get_bulk_requests', 'set_requests', 'errors',
+                  'timeouts', 'subtrees']
+
+
 class RecordingSerializer(serializers.HyperlinkedModelSerializer):
+    subtrees = RecordingSubtreeSerializer(many=True, read_only=True)
+    idle_time = serializers.SerializerMethodField()
+
     class Meta:
         model = Recording
-        fields = ['id', 'name', 'ip_address', 'port', 'snmp_read_community', 'recording_file', 'is_running']
+        fields = ['id', 'name', 'ip_address', 'port', 'snmp_read_community', 'recording_file', 'overlay',
+                  'is_on_demand', 'response_delay', 'response_jitter', 'jitter_distribution', 'drop_rate',
+                  'max_var_binds', 'cpu_limit', 'memory_limit', 'is_running', 'is_idle_stopped', 'last_activity_at',
+                  'idle_time', 'time_to_ready', 'oids_count', 'file_size', 'interfaces_count', 'subtrees', 'node']
+
+    def get_idle_time(self, obj):
+        """Seconds since the last SNMP request of the running recording
+
+        :param obj:
+        :return:
+        """
+        if not obj.is_running or obj.last_activity_at is None:
+            return None
+
+        return (timezone.now() - obj.last_activity_at).total_seconds()
+
+    def validate_recording_file(self, value):
+        try:
+            return snmprec.sort_uploaded_recording(value)
+        except snmprec.SnmprecError as e:
+            raise serializers.ValidationError([f"Line {line_number}: {message}"
+                                               for line_number, message in e.errors])
+
+    def validate_overlay(self, value):
+        try:
+            snmprec.parse_overlay(value)
+        except snmprec.SnmprecError as e:
+            raise serializers.ValidationError([f"Line {line_number}: {message}"
+                                               for line_number, message in e.errors])
+
+        return value
+
+
+class NodeSerializer(serializers.HyperlinkedModelSerializer):
+    class Meta:
+        model = Node
+        fields = ['id', 'name', 'url', 'is_enabled', 'comment']
+
+
+class RecordingCaptureSerializer(serializers.ModelSerializer):
+    device_ip_address = serializers.IPAddressField()
+    device_port = serializers.IntegerField(default=161, min_value=1, max_value=65535)
+    device_snmp_read_community = serializers.CharField(default="public", max_length=255)
+
+    class Meta:
+        model = Recording
+        fields = ['name', 'ip_address', 'port', 'snmp_read_community', 'comment',
+                  'device_ip_address', 'device_port', 'device_snmp_read_community']
+
+
+class RecordingCaptureStatusSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordingCapture
+        fields = ['id', 'name', 'ip_address', 'port', 'snmp_read_community', 'comment', 'device_ip_address',
+                  'device_port', 'device_snmp_read_community', 'status', 'error', 'recording', 'created_at',
+                  'started_at', 'finished_at']
+
+
+class RecordingCloneSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1)
+    name_pattern = serializers.CharField(default='{name}-{index}', max_length=255)
+    template_ip_address = serializers.IPAddressField(protocol='IPv4', required=False)
+    set_sys_name = serializers.BooleanField(default=False)
+
+    def validate_count(self, value):
+        if value > settings.SNMPSIM_CLONE_MAX_COUNT:
+            raise serializers.ValidationError(f'Ensure this value is less than or equal to '
+                                              f'{settings.SNMPSIM_CLONE_MAX_COUNT}.')
+        return value
+
+    def validate_name_pattern(self, value):
+        try:
+            value.format(name='', index=0, ip_address='')
+        except (KeyError, IndexError, ValueError) as e:
+            raise serializers.ValidationError(f'Invalid name pattern: {e}')
+        return value
 
 
 # ViewSets define the view behavior.
 class RecordingViewSet(viewsets.ModelViewSet):
-    queryset = Recording.objects.all()
+    queryset = Recording.objects.prefetch_related('subtrees')
     serializer_class = RecordingSerializer
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['id', 'name', 'ip_address', 'oids_count', 'file_size', 'interfaces_count', 'last_activity_at',
+                       'updated_at']
+    # query parameters filtering recordings by their statistics
+    range_filters = {
+        'min_oids': 'oids_count__gte',
+        'max_oids': 'oids_count__lte',
+        'min_file_size': 'file_size__gte',
+        'max_file_size': 'file_size__lte',
+        'min_interfaces': 'interfaces_count__gte',
+        'max_interfaces': 'interfaces_count__lte',
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for param, lookup in self.range_filters.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+
+            try:
+                queryset = queryset.filter(**{lookup: int(value)})
+            except ValueError:
+                raise exceptions.ValidationError({param: 'Must be an integer'})
+
+        subtree = self.request.query_params.get('subtree')
+        if subtree:
+            queryset = queryset.filter(subtrees__oid=subtree)
+
+        return queryset
+
+    def perform_update(self, serializer):
+        old_response_profile = serializer.instance.response_profile
+        recording: Recording = serializer.save()
+        if not recording.is_running or recording.response_profile == old_response_profile:
+            return
+
+        # response profile is applied to the running recording without restart
+        try:
+            with profiling.profile_operation("api.set_response_profile", recording=recording.pk):
+                get_snmpsim_runner(recording.node).set_response_profile(ip_address=recording.ip_address,
+                                                                        port=recording.port,
+                                                                        response_profile=recording.response_profile)
+        except Exception:
+            logger.exception(f"Failed to apply response profile of recording '{recording}' due to:")
+            raise exceptions.APIException(f'Failed to apply response profile of recording {recording}')
+
+    @decorators.action(methods=['get'], detail=False, permission_classes=[permissions.IsAuthenticated])
+    def search(self, request):
+        oid = request.query_params.get('oid')
+        value = request.query_params.get('value')
+        if not oid and not value:
+            return response.Response({'error': 'OID subtree or value must be specified'},
+                                     status=status.HTTP_400_BAD_REQUEST)
+
+        recordings = self.filter_queryset(self.get_queryset()).filter(
+            pk__in=search.find_recordings(oid=oid, value=value))
+        serializer = self.get_serializer(recordings, many=True)
+
+        return response.Response(serializer.data)
+
+    @decorators.action(methods=['get'], detail=True, permission_classes=[permissions.IsAuthenticated])
+    def traffic(self, request, pk=None):
+        recording: Recording = self.get_object()
+        try:
+            period = int(request.query_params.get('period', settings.SNMPSIM_TRAFFIC_SUMMARY_PERIOD))
+        except ValueError:
+            raise exceptions.ValidationError({'period': 'Must be an integer'})
+        if period <= 0:
+            raise exceptions.ValidationError({'period': 'Must be a positive number of seconds'})
+
+        summary = get_traffic_summary(recording, period=period)
+        buckets = (recording.traffic.filter(started_at__gte=timezone.now() - datetime.timedelta(seconds=period))
+                   .prefetch_related('subtrees').order_by('started_at'))
+
+        return response.Response({**summary, 'buckets': RecordingTrafficSerializer(buckets, many=True).data})
+
+    @decorators.action(methods=['get'], detail=True, permission_classes=[permissions.IsAuthenticated])
+    def usage(self, request, pk=None):
+        recording: Recording = self.get_object()
+        if not recording.is_running:
+            return response.Response({'error': f'Recording {recording} is not running'},
+                                     status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            usage = get_recording_usage(recording)
+        except Exception:
+            logger.exception(f"Failed to get resource usage of the recording '{recording}' due to:")
+            return response.Response({'error': f'Failed to get resource usage of recording {recording}'},
+                                     status=status.HTTP_502_BAD_GATEWAY)
+
+        if usage is None:
+            return response.Response({'error': f'snmpsim daemon of recording {recording} is not running'},
+                                     status=status.HTTP_404_NOT_FOUND)
+
+        return response.Response(usage)
+
+    @decorators.action(methods=['post'], detail=False, permission_classes=[permissions.IsAuthenticated],
+                       serializer_class=RecordingCaptureSerializer)
+    def capture(self, request):
+        serializer = RecordingCaptureSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        capture = start_recording_capture(updated_by=request.user, **serializer.validated_data)
+
+        return response.Response(RecordingCaptureStatusSerializer(capture).data, status=status.HTTP_202_ACCEPTED)
+
+    @decorators.action(methods=['post'], detail=True, permission_classes=[permissions.IsAuthenticated],
+                       serializer_class=RecordingCloneSerializer)
+    def clone(self, request, pk=None):
+        recording: Recording = self.get_object()
+        serializer = RecordingCloneSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            clones = Recording.objects.clone(source=recording, updated_by=request.user, **serializer.validated_data)
+        except ValueError as e:
+            return response.Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return response.Response(RecordingSerializer(clones, many=True, context={'request': request}).data,
+                                 status=status.HTTP_201_CREATED)
 
     @decorators.action(methods=['get'], detail=True, permission_classes=[permissions.IsAuthenticated])
     def start(self, request, pk=None):
@@ -27,16 +253,22 @@ class RecordingViewSet(viewsets.ModelViewSet):
                                      status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            SNMPSimOSCommandRunner().start(recording_file=recording.recording_file.path,
-                                           ip_address=recording.ip_address,
-                                           port=recording.port,
-                                           snmp_read_community=recording.snmp_read_community)
+            with profiling.profile_operation("api.start_recording", recording=recording.pk):
+                time_to_ready = get_snmpsim_runner(recording.node).start(
+                    recording_file=recording.recording_file.path,
+                    ip_address=recording.ip_address,
+                    port=recording.port,
+                    snmp_read_community=recording.snmp_read_community,
+                    overlay=recording.overlay,
+                    response_profile=recording.response_profile,
+                    resource_limits=recording.resource_limits)
         except Exception:
             logger.exception(f"Failed to start recording '{recording}' due to:")
             return response.Response({'error': f'Failed to start recording {recording}'},
                                      status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         else:
             recording.is_running = True
+            recording.time_to_ready = time_to_ready
             recording.save()
             return response.Response("", status=status.HTTP_204_NO_CONTENT)
 
@@ -49,11 +281,13 @@ class RecordingViewSet(viewsets.ModelViewSet):
                                      status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            SNMPSimOSCommandRunner().stop(recording_file=recording.recording_file.path,
-                                          ip_address=recording.ip_address,
-                                          port=recording.port,
-                                          snmp_read_community=recording.snmp_read_community,
-                                          remove_sub_iface=Recording.objects.is_ip_address_unique(recording.ip_address))
+            with profiling.profile_operation("api.stop_recording", recording=recording.pk):
+                get_snmpsim_runner(recording.node).stop(recording_file=recording.recording_file.path,
+                                                        ip_address=recording.ip_address,
+                                                        port=recording.port,
+                                                        snmp_read_community=recording.snmp_read_community,
+                                                        remove_sub_iface=Recording.objects.is_ip_address_unique(
+                                                            recording.ip_address))
         except Exception:
             logger.exception(f"Failed to stop recording '{recording}' due to:")
             return response.Response({'error': f'Failed to stop recording {recording}'},
@@ -62,3 +296,23 @@ class RecordingViewSet(viewsets.ModelViewSet):
             recording.is_running = False
             recording.save()
             return response.Response("", status=status.HTTP_204_NO_CONTENT)
+
+
+class NodeViewSet(viewsets.ModelViewSet):
+    queryset = Node.objects.all()
+    serializer_class = NodeSerializer
+
+    @decorators.action(methods=['get'], detail=True, permission_classes=[permissions.IsAuthenticated])
+    def status(self, request, pk=None):
+        node: Node = self.get_object()
+        try:
+            return response.Response(get_snmpsim_runner(node).get_status())
+        except Exception:
+            logger.exception(f"Failed to get status of the node '{node}' due to:")
+            return response.Response({'error': f'Failed to get status of the node {node}'},
+                                     status=status.HTTP_502_BAD_GATEWAY)
+
+
+class RecordingCaptureViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = RecordingCapture.objects.order_by('-pk')
+    serializer_class = RecordingCaptureStatusSerializer
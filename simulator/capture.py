@@ -0,0 +1,156 @@
+import logging
+import os
+import shutil
+
+from django.utils import timezone
+
+from .models import Recording, RecordingCapture, upload_to
+
+
+logger = logging.getLogger(__name__)
+
+SYS_DESCR_OID = "1.3.6.1.2.1.1.1.0"
+
+
+def _get_sys_desc(recording_file):
+    """Find sysDescr value in the sorted .snmprec file, it is located at the beginning of the mib-2 tree
+
+    :param recording_file:
+    :return:
+    """
+    sys_descr_prefix = f"{SYS_DESCR_OID}|4|"
+    with open(recording_file) as file:
+        for line in file:
+            if line.startswith(sys_descr_prefix):
+                return line[len(sys_descr_prefix):].rstrip("\n")
+
+            if line.startswith("1.3.6.1.2.1.") and not line.startswith("1.3.6.1.2.1.1."):
+                return ""
+
+    return ""
+
+
+def capture_recording(name, device_ip_address, device_port, device_snmp_read_community, ip_address, port,
+                      snmp_read_community, comment="", updated_by=None, file_name=None):
+    """Capture MIB tree of the live device and create new recording from it
+
+    :param name:
+    :param device_ip_address:
+    :param device_port:
+    :param device_snmp_read_community:
+    :param ip_address:
+    :param port:
+    :param snmp_read_community:
+    :param comment:
+    :param updated_by:
+    :param file_name: name of the recording file in the storage, new one if not set
+    :return:
+    """
+    # pysnmp high-level API is loaded only by the capture
+    from .snmp_recorder import SNMPRecorder
+
+    storage = Recording._meta.get_field("recording_file").storage
+    file_name = file_name or upload_to(None, f"{device_ip_address}.capture.snmprec")
+    recording_file = storage.path(file_name)
+    os.makedirs(os.path.dirname(recording_file), exist_ok=True)
+
+    try:
+        SNMPRecorder(ip_address=device_ip_address,
+                     snmp_read_community=device_snmp_read_community,
+                     port=device_port,
+                     logger=logger).record(output_file=recording_file)
+    except Exception:
+        shutil.rmtree(os.path.dirname(recording_file), ignore_errors=True)
+        raise
+
+    return Recording.objects.create(name=name,
+                                    ip_address=ip_address,
+                                    port=port,
+                                    snmp_read_community=snmp_read_community,
+                                    recording_file=file_name,
+                                    sys_description=_get_sys_desc(recording_file),
+                                    comment=comment,
+                                    updated_by=updated_by)
+
+
+def start_recording_capture(**kwargs):
+    """Queue capture of the recording, it is run by 'manage.py run_recording_captures', so HTTP request is not
+    blocked for the whole walk and the walk isn't lost with the web server worker
+
+    :param kwargs: arguments of the 'capture_recording' function
+    :return:
+    """
+    return RecordingCapture.objects.create(**kwargs)
+
+
+def run_capture(capture):
+    """Run the pending capture, its state and error are stored on it
+
+    :param capture:
+    :return: True if the capture is run by this call, False if it was taken by the other runner
+    """
+    file_name = upload_to(None, f"{capture.device_ip_address}.capture.snmprec")
+    if not RecordingCapture.objects.filter(pk=capture.pk, status="pending").update(status="running",
+                                                                                   recording_file=file_name,
+                                                                                   started_at=timezone.now()):
+        return False
+
+    logger.info(f"Capturing recording '{capture}' ...")
+    try:
+        recording = capture_recording(name=capture.name,
+                                      device_ip_address=capture.device_ip_address,
+                                      device_port=capture.device_port,
+                                      device_snmp_read_community=capture.device_snmp_read_community,
+                                      ip_address=capture.ip_address,
+                                      port=capture.port,
+                                      snmp_read_community=capture.snmp_read_community,
+                                      comment=capture.comment,
+                                      updated_by=capture.updated_by,
+                                      file_name=file_name)
+    except Exception as e:
+        logger.exception(f"Failed to capture recording from the device {capture.device_ip_address} due to:")
+        RecordingCapture.objects.filter(pk=capture.pk).update(status="failed",
+                                                              error=str(e) or e.__class__.__name__,
+                                                              finished_at=timezone.now())
+    else:
+        logger.info(f"Recording '{recording}' captured from the device {capture.device_ip_address}")
+        RecordingCapture.objects.filter(pk=capture.pk).update(status="done",
+                                                              recording=recording,
+                                                              finished_at=timezone.now())
+
+    return True
+
+
+def fail_interrupted_captures():
+    """Mark captures left running by the stopped runner as failed and remove their partial files
+
+    Only one runner should run, as captures of the other runners are seen as interrupted
+
+    :return: list of the interrupted captures
+    """
+    storage = Recording._meta.get_field("recording_file").storage
+    captures = list(RecordingCapture.objects.filter(status="running"))
+    for capture in captures:
+        if capture.recording_file:
+            shutil.rmtree(os.path.dirname(storage.path(capture.recording_file)), ignore_errors=True)
+
+        RecordingCapture.objects.filter(pk=capture.pk).update(status="failed",
+                                                              error="Capture was interrupted by the stop "
+                                                                    "of its runner",
+                                                              finished_at=timezone.now())
+
+    return captures
+
+
+def run_pending_captures():
+    """Run pending captures one by one in the order they were queued
+
+    :return: list of the captures run
+    """
+    captures = []
+    for capture in RecordingCapture.objects.filter(status="pending").select_related("updated_by").order_by("pk"):
+        if run_capture(capture):
+            capture.refresh_from_db()
+            captures.append(capture)
+
+    return captures
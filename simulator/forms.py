@@ -1,12 +1,10 @@
 from django.conf import settings
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 from easy_select2 import apply_select2
-import ipaddress
 
-from .models import Recording
-
-
-snmpsim_network = ipaddress.ip_network(settings.SNMPSIM_NETWORK)
+from . import network, snmprec
+from .models import RESOURCE_LIMITS_FIELDS, RESPONSE_PROFILE_FIELDS, Recording
 
 
 class RecordingForm(forms.ModelForm):
@@ -17,6 +15,10 @@ class RecordingForm(forms.ModelForm):
                   "port",
                   "snmp_read_community",
                   "recording_file",
+                  "overlay",
+                  "is_on_demand",
+                  *RESPONSE_PROFILE_FIELDS,
+                  *RESOURCE_LIMITS_FIELDS,
                   "autodiscover_sys_desc",
                   "sys_description",
                   "comment")
@@ -43,9 +45,92 @@ class RecordingForm(forms.ModelForm):
     def _get_recordings_ips(self):
         """Find free IPs addresses for the new recording
 
+        Only first SNMPSIM_FREE_IPS_CHOICES_LIMIT free addresses are offered, so large IPv4 networks
+        and IPv6 prefixes don't end up in the select widget as a whole
+
         :return:
         """
-        used_ips = Recording.objects.values_list("ip_address", flat=True)
-        free_ips = [ip_addr for ip_addr in map(str, snmpsim_network.hosts()) if ip_addr not in used_ips]
+        used_ips = Recording.objects.order_by("ip_address").values_list("ip_address", flat=True).distinct()
+        free_ips = network.get_free_ip_addresses(used_ip_addresses=used_ips,
+                                                 limit=settings.SNMPSIM_FREE_IPS_CHOICES_LIMIT)
 
         return free_ips, used_ips
+
+    def clean_recording_file(self):
+        """Validate uploaded recording and sort it in the OID order, as snmpsim requires for GETNEXT/GETBULK
+
+        :return:
+        """
+        recording_file = self.cleaned_data["recording_file"]
+        if not isinstance(recording_file, UploadedFile):
+            return recording_file
+
+        try:
+            return snmprec.sort_uploaded_recording(recording_file)
+        except snmprec.SnmprecError as e:
+            raise forms.ValidationError([f"Line {line_number}: {message}" for line_number, message in e.errors])
+
+    def clean_overlay(self):
+        """
+
+        :return:
+        """
+        overlay = self.cleaned_data["overlay"]
+        try:
+            snmprec.parse_overlay(overlay)
+        except snmprec.SnmprecError as e:
+            raise forms.ValidationError([f"Line {line_number}: {message}" for line_number, message in e.errors])
+
+        return overlay
+
+
+class ResponseProfileForm(forms.ModelForm):
+    class Meta:
+        model = Recording
+        fields = RESPONSE_PROFILE_FIELDS
+
+
+class CloneRecordingForm(forms.Form):
+    count = forms.IntegerField(min_value=1, max_value=settings.SNMPSIM_CLONE_MAX_COUNT,
+                               help_text="Clones are placed on the first free IP addresses")
+    name_pattern = forms.CharField(initial="{name}-{index}", max_length=255,
+                                   help_text="Name of the clones with the {name} of the recording, "
+                                             "{index} and {ip_address} of the clone")
+    template_ip_address = forms.GenericIPAddressField(protocol="IPv4", required=False, label="Template IP address",
+                                                      help_text="IP address in the recording file (e.g. of the "
+                                                                "device it was captured from) replaced by the clone "
+                                                                "IP address")
+    set_sys_name = forms.BooleanField(required=False, label="Set sysName",
+                                      help_text="Set sysName of the clones to their names. Clones with a changed "
+                                                "sysName or template IP address are served from a copy of the "
+                                                "recording file each")
+
+    def clean_name_pattern(self):
+        """
+
+        :return:
+        """
+        name_pattern = self.cleaned_data["name_pattern"]
+        try:
+            name_pattern.format(name="", index=0, ip_address="")
+        except (KeyError, IndexError, ValueError) as e:
+            raise forms.ValidationError(f"Invalid name pattern: {e}")
+
+        return name_pattern
+
+
+class CaptureRecordingForm(RecordingForm):
+    device_ip_address = forms.GenericIPAddressField(label="Device IP address")
+    device_port = forms.IntegerField(label="Device port", initial=161, min_value=1, max_value=65535)
+    device_snmp_read_community = forms.CharField(label="Device SNMP read community", initial="public",
+                                                 max_length=255)
+
+    class Meta(RecordingForm.Meta):
+        fields = ("device_ip_address",
+                  "device_port",
+                  "device_snmp_read_community",
+                  "name",
+                  "ip_address",
+                  "port",
+                  "snmp_read_community",
+                  "comment")
@@ -0,0 +1,114 @@
+import concurrent.futures
+import datetime
+import logging
+
+from django.utils import timezone
+
+from .models import Recording
+from .nodes import get_snmpsim_runner, stop_per_node
+
+
+logger = logging.getLogger(__name__)
+
+
+def _get_node_activity(node):
+    """
+
+    :param node: node or None for the local host
+    :return: dict of (IP, port, community) -> (POSIX timestamp of the last request or None, POSIX timestamp
+        the daemon logs begin at or None) or None if the activity isn't known
+    """
+    try:
+        activity = get_snmpsim_runner(node).get_activity()
+    except Exception:
+        logger.exception(f"Failed to get activity of the recordings on the node '{node or 'local host'}' due to:")
+        return
+
+    return {(recording["ip_address"], int(recording["port"]), recording["snmp_read_community"]):
+            (recording["last_activity"], recording.get("logged_since")) for recording in activity["recordings"]}
+
+
+def update_activity(recordings):
+    """Update time of the last SNMP request of the running recordings from their snmpsim daemons
+
+    Recordings without known requests are counted as active since the first check. Activity is unknown if the node
+    doesn't answer or the daemon logs begin after the last known activity, as the later requests could be rotated
+    out of them
+
+    :param recordings:
+    :return: set of the IDs of the recordings with the unknown activity
+    """
+    nodes = {recording.node_id: recording.node for recording in recordings}
+    if not nodes:
+        return set()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        activity = dict(zip(nodes, executor.map(_get_node_activity, nodes.values())))
+
+    now = timezone.now()
+    unknown_activity = set()
+    for recording in recordings:
+        if activity[recording.node_id] is None:
+            unknown_activity.add(recording.pk)
+            continue
+
+        # recording that the daemon doesn't serve has no requests
+        last_activity, logged_since = activity[recording.node_id].get((recording.ip_address,
+                                                                       recording.port,
+                                                                       recording.snmp_read_community), (None, 0))
+        if last_activity is not None:
+            last_activity = datetime.datetime.fromtimestamp(last_activity, tz=datetime.timezone.utc)
+        elif recording.last_activity_at is None:
+            last_activity = now
+        elif logged_since is None or logged_since > recording.last_activity_at.timestamp():
+            unknown_activity.add(recording.pk)
+            continue
+
+        if last_activity is None or (recording.last_activity_at is not None and
+                                     last_activity <= recording.last_activity_at):
+            continue
+
+        recording.last_activity_at = last_activity
+        # status version isn't changed, as activity isn't shown by the changelist live update
+        Recording.objects.filter(pk=recording.pk).update(last_activity_at=last_activity)
+
+    return unknown_activity
+
+
+def reap_idle_recordings(ttl, dry_run=False):
+    """Stop running recordings without SNMP requests for the TTL and mark them as stopped as idle
+
+    :param ttl: seconds
+    :param dry_run: only find idle recordings
+    :return: list of the idle recordings
+    """
+    recordings = list(Recording.objects.filter(is_running=True).select_related("node"))
+    unknown_activity = update_activity(recordings)
+
+    deadline = timezone.now() - datetime.timedelta(seconds=ttl)
+    idle_recordings = []
+    for recording in recordings:
+        if recording.last_activity_at is not None and recording.last_activity_at >= deadline:
+            continue
+
+        if recording.pk in unknown_activity or recording.last_activity_at is None:
+            logger.info(f"Recording '{recording}' isn't stopped, as its activity since "
+                        f"{recording.last_activity_at or 'the start'} isn't known")
+            continue
+
+        idle_recordings.append(recording)
+    if dry_run:
+        return idle_recordings
+
+    stopped_recordings = []
+    for recording, error in stop_per_node(idle_recordings):
+        if error is not None:
+            continue
+
+        logger.info(f"Recording '{recording}' is stopped as idle since {recording.last_activity_at}")
+        recording.is_running = False
+        recording.is_idle_stopped = True
+        recording.save()
+        stopped_recordings.append(recording)
+
+    return stopped_recordings
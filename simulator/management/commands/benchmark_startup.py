@@ -0,0 +1,38 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.startup import benchmark_startup
+
+
+class Command(BaseCommand):
+    help = ("Measure import time and time to the first request of the WSGI worker and startup of the management "
+            "commands, each run in the fresh interpreter")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/login/", help="Path of the first request to the WSGI application")
+        parser.add_argument("--command", dest="commands", action="append",
+                            default=None, help="Management command to measure, can be repeated "
+                                               "(run_snmpsim_agent and collect_traffic by default)")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of runs of each measurement")
+        parser.add_argument("--json", action="store_true", help="Print results in JSON, e.g. to track them over time")
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark_startup(base_dir=settings.BASE_DIR,
+                                        wsgi_path=options["path"],
+                                        commands=options["commands"] or ["run_snmpsim_agent", "collect_traffic"],
+                                        repeat=options["repeat"])
+        except (KeyError, ValueError) as e:
+            raise CommandError(f"Failed to measure startup: {e}")
+
+        if options["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        for scenario, phases in results.items():
+            self.stdout.write(f"{scenario}:")
+            for phase, times in phases.items():
+                self.stdout.write(f"  {phase:<14} min {times['min'] * 1000:8.1f} ms  "
+                                  f"median {times['median'] * 1000:8.1f} ms  max {times['max'] * 1000:8.1f} ms")
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from simulator.traffic import collect_traffic, delete_old_traffic
+
+
+class Command(BaseCommand):
+    help = "Collect SNMP requests of the recordings from the snmpsim daemon logs into the traffic time buckets"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bucket-size", type=int, default=settings.SNMPSIM_TRAFFIC_BUCKET_SIZE,
+                            help="Seconds the requests are counted by")
+        parser.add_argument("--retention", type=int, default=settings.SNMPSIM_TRAFFIC_RETENTION,
+                            help="Seconds the traffic buckets are kept for")
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Collect traffic every number of seconds, only once if 0")
+
+    def handle(self, *args, **options):
+        while True:
+            for recording, requests_count in collect_traffic(bucket_size=options["bucket_size"]).items():
+                self.stdout.write(f"Collected {requests_count} requests of the recording '{recording}'")
+
+            deleted = delete_old_traffic(retention=options["retention"])
+            if deleted:
+                self.stdout.write(f"Deleted {deleted} traffic buckets older than {options['retention']} seconds")
+
+            if not options["interval"]:
+                break
+
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
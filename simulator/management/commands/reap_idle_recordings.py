@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from simulator.idle import reap_idle_recordings
+
+
+class Command(BaseCommand):
+    help = "Stop running recordings without SNMP requests for the idle TTL, so their memory is reclaimed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ttl", type=int, default=settings.SNMPSIM_IDLE_TTL,
+                            help="Seconds without SNMP requests the recording is stopped after")
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Check recordings every number of seconds, only once if 0")
+        parser.add_argument("--dry-run", action="store_true", help="Only show idle recordings")
+
+    def handle(self, *args, **options):
+        while True:
+            for recording in reap_idle_recordings(ttl=options["ttl"], dry_run=options["dry_run"]):
+                self.stdout.write(f"{'Idle' if options['dry_run'] else 'Stopped'} recording '{recording}', "
+                                  f"last activity {recording.last_activity_at}")
+
+            if not options["interval"]:
+                break
+
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
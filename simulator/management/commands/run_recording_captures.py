@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from simulator.capture import fail_interrupted_captures, run_pending_captures
+
+
+class Command(BaseCommand):
+    help = "Capture recordings queued from the admin and API by walking the live devices"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=int, default=0,
+                            help="Check for the queued captures every number of seconds, only once if 0")
+
+    def handle(self, *args, **options):
+        for capture in fail_interrupted_captures():
+            self.stdout.write(f"Capture of the recording '{capture}' was interrupted, it is marked as failed")
+
+        while True:
+            for capture in run_pending_captures():
+                if capture.status == "done":
+                    self.stdout.write(f"Captured recording '{capture.recording}'")
+                else:
+                    self.stdout.write(f"Failed to capture recording '{capture}': {capture.error}")
+
+            if not options["interval"]:
+                break
+
+            try:
+                time.sleep(options["interval"])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,44 @@
+import logging
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.agent import SNMPSimAgentServer
+from simulator.nodes import get_local_snmpsim_runner_class
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Run simulator agent that starts and stops snmpsim daemons of this node on requests of the UI"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1", help="Address the agent listens on")
+        parser.add_argument("--port", type=int, default=8161, help="Port the agent listens on")
+        parser.add_argument("--daemon-folder", default=settings.SNMPSIM_DAEMON_FOLDER,
+                            help="Folder for the endpoints data, logs and PID files of the snmpsim daemons")
+        parser.add_argument("--recordings-folder",
+                            help="Folder the recordings are uploaded into, '<daemon folder>/recordings' by default")
+
+    def handle(self, *args, **options):
+        recordings_folder = options["recordings_folder"] or os.path.join(options["daemon_folder"], "recordings")
+        os.makedirs(recordings_folder, exist_ok=True)
+
+        try:
+            server = SNMPSimAgentServer(server_address=(options["host"], options["port"]),
+                                        runner=get_local_snmpsim_runner_class()(
+                                            daemon_folder=options["daemon_folder"]),
+                                        recordings_folder=recordings_folder,
+                                        token=settings.SNMPSIM_AGENT_TOKEN)
+        except ValueError as e:
+            raise CommandError(e)
+
+        logger.info(f"Simulator agent is listening on {options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,33 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from simulator.nodes import get_local_snmpsim_runner_class
+from simulator.on_demand import SNMPSimOnDemandListener, is_endpoint_handover_supported
+
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Listen on the endpoints of the stopped on-demand recordings and start them on the first SNMP request"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sync-interval", type=int,
+                            help="Seconds between checks for the new stopped on-demand recordings")
+
+    def handle(self, *args, **options):
+        if not is_endpoint_handover_supported():
+            raise CommandError("UDP datagrams aren't delivered to the last socket bound to the endpoint with "
+                               "SO_REUSEADDR, so the started snmpsim daemons can't take over the endpoints")
+
+        listener = SNMPSimOnDemandListener(runner=get_local_snmpsim_runner_class()(),
+                                           sync_interval=options["sync_interval"])
+
+        logger.info("On-demand listener is started")
+        try:
+            listener.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.6 on 2026-10-19 10:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0007_recording_autodiscover_sys_desc'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recording',
+            name='snmp_read_community',
+            field=models.CharField(default='public', max_length=255, validators=[django.core.validators.RegexValidator('^[^/]+$', "SNMP community can't contain '/' symbol")]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='recording',
+            unique_together={('ip_address', 'port', 'snmp_read_community')},
+        ),
+    ]
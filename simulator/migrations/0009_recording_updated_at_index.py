@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-19 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0008_recording_community_multiplexing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recording',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.6 on 2026-10-19 11:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0009_recording_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Node',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('url', models.URLField(help_text='URL of the simulator agent, e.g. http://10.0.0.5:8161', unique=True)),
+                ('is_enabled', models.BooleanField(default=True, help_text='New recordings are placed only on enabled nodes')),
+                ('comment', models.TextField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='node',
+            field=models.ForeignKey(blank=True, help_text='Node that runs the recording, the local host if empty. New recordings are placed on the least loaded node if it is not set', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='recordings', to='simulator.Node'),
+        ),
+    ]
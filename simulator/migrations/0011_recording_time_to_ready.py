@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-19 11:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0010_node'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='time_to_ready',
+            field=models.FloatField(blank=True, editable=False, help_text='Seconds from the last start until the snmpsim daemon answered', null=True, verbose_name='Time to ready (s)'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 2.2.6 on 2026-10-19 11:47
+
+import collections
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# statistics are collected as simulator.snmprec did when the migration was created, so later changes of the module
+# don't change the migration
+STATISTICS_SUBTREE_ARCS = 7
+IF_INDEX_OID = b'1.3.6.1.2.1.2.2.1.1.'
+
+
+def get_subtree(oid):
+    return b'.'.join(oid.split(b'.', STATISTICS_SUBTREE_ARCS)[:STATISTICS_SUBTREE_ARCS]).decode()
+
+
+def get_recording_statistics(recording_file):
+    oids_count = file_size = interfaces_count = 0
+    subtrees = collections.Counter()
+
+    for line in recording_file:
+        file_size += len(line)
+        if not line.strip() or line.startswith(b'#'):
+            continue
+
+        oid = line.split(b'|', 1)[0]
+        oids_count += 1
+        subtrees[get_subtree(oid)] += 1
+        if oid.startswith(IF_INDEX_OID):
+            interfaces_count += 1
+
+    return {
+        'oids_count': oids_count,
+        'file_size': file_size,
+        'interfaces_count': interfaces_count,
+        'subtrees': subtrees,
+    }
+
+
+def collect_recordings_statistics(apps, schema_editor):
+    Recording = apps.get_model('simulator', 'Recording')
+    RecordingSubtree = apps.get_model('simulator', 'RecordingSubtree')
+
+    for recording in Recording.objects.all():
+        try:
+            with open(recording.recording_file.path, 'rb') as file:
+                statistics = get_recording_statistics(file)
+        except (OSError, ValueError):
+            continue
+
+        recording.oids_count = statistics['oids_count']
+        recording.file_size = statistics['file_size']
+        recording.interfaces_count = statistics['interfaces_count']
+        recording.save(update_fields=['oids_count', 'file_size', 'interfaces_count'])
+        RecordingSubtree.objects.bulk_create([RecordingSubtree(recording=recording, oid=oid, oids_count=oids_count)
+                                              for oid, oids_count in statistics['subtrees'].items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0011_recording_time_to_ready'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='interfaces_count',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, help_text='Number of the ifIndex entries', null=True, verbose_name='Interfaces'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='oids_count',
+            field=models.PositiveIntegerField(blank=True, db_index=True, editable=False, null=True, verbose_name='OIDs'),
+        ),
+        migrations.CreateModel(
+            name='RecordingSubtree',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('oid', models.CharField(db_index=True, max_length=255, verbose_name='OID')),
+                ('oids_count', models.PositiveIntegerField(verbose_name='OIDs')),
+                ('recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subtrees', to='simulator.Recording')),
+            ],
+            options={
+                'unique_together': {('recording', 'oid')},
+            },
+        ),
+        migrations.RunPython(collect_recordings_statistics, migrations.RunPython.noop),
+    ]
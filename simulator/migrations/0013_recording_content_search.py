@@ -0,0 +1,81 @@
+import itertools
+
+from django.db import migrations
+
+
+# content index is created and filled as simulator.search did when the migration was created, so later changes
+# of the module don't change the migration
+CONTENT_TABLE = 'simulator_recording_content'
+ROWID_SHIFT = 32
+INSERT_BATCH_SIZE = 10000
+
+
+def decode_value(type_tag, value):
+    if type_tag.split(b':', 1)[0].endswith(b'x'):
+        try:
+            value = bytes.fromhex(value.decode())
+        except ValueError:
+            return ''
+
+        if not value.isascii() or not value.decode().isprintable():
+            return ''
+
+    return value.decode(errors='replace')
+
+
+def iter_content_rows(recording_id, recording_file):
+    for line_number, line in enumerate(recording_file):
+        line = line.rstrip(b'\r\n')
+        parts = line.split(b'|', 2)
+        if len(parts) != 3 or line.startswith(b'#'):
+            continue
+
+        oid, type_tag, value = parts
+        yield (recording_id << ROWID_SHIFT) | line_number, oid.decode(), decode_value(type_tag, value)
+
+
+def create_content_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTENT_TABLE} "
+                          f"USING fts5(oid, value, tokenize=\"unicode61 tokenchars '.'\")")
+
+    # file shared by several recordings (clones) is indexed once, under one of them
+    Recording = apps.get_model('simulator', 'Recording')
+    indexed_files = set()
+    with schema_editor.connection.cursor() as cursor:
+        for recording in Recording.objects.order_by('pk'):
+            if recording.recording_file.name in indexed_files:
+                continue
+
+            try:
+                with open(recording.recording_file.path, 'rb') as file:
+                    rows = iter_content_rows(recording_id=recording.pk, recording_file=file)
+                    while True:
+                        batch = list(itertools.islice(rows, INSERT_BATCH_SIZE))
+                        if not batch:
+                            break
+
+                        cursor.executemany(f"INSERT INTO {CONTENT_TABLE} (rowid, oid, value) VALUES (%s, %s, %s)",
+                                           batch)
+            except (OSError, ValueError):
+                continue
+
+            indexed_files.add(recording.recording_file.name)
+
+
+def drop_content_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {CONTENT_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0012_recording_statistics'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_content_index, drop_content_index),
+    ]
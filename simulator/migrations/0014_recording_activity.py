@@ -0,0 +1,23 @@
+# Generated by Django 2.2.6 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0013_recording_content_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='is_idle_stopped',
+            field=models.BooleanField(default=False, editable=False, help_text='Recording was stopped after it had no SNMP requests for the idle TTL, it can be started again', verbose_name='Stopped as idle'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Time of the last SNMP request or start of the recording', null=True, verbose_name='Last activity'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0014_recording_activity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='is_on_demand',
+            field=models.BooleanField(default=False, help_text='Stopped recording of the local host is started by the on-demand listener on the first SNMP request to its endpoint', verbose_name='Start on demand'),
+        ),
+    ]
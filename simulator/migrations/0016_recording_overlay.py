@@ -0,0 +1,18 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0015_recording_is_on_demand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='overlay',
+            field=models.TextField(blank=True, help_text="Records in the .snmprec format 'OID|TAG|VALUE' that replace the records of the file with the same OIDs or are added to it, e.g. sysName of the clone"),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0016_recording_overlay'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordingTraffic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('get_requests', models.PositiveIntegerField(default=0, verbose_name='GET')),
+                ('get_next_requests', models.PositiveIntegerField(default=0, verbose_name='GETNEXT')),
+                ('get_bulk_requests', models.PositiveIntegerField(default=0, verbose_name='GETBULK')),
+                ('set_requests', models.PositiveIntegerField(default=0, verbose_name='SET')),
+                ('errors', models.PositiveIntegerField(default=0, help_text='Requests answered with noSuchObject or noSuchInstance')),
+                ('timeouts', models.PositiveIntegerField(default=0, help_text="Requests the snmpsim daemon didn't answer")),
+                ('recording', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traffic', to='simulator.Recording')),
+            ],
+            options={
+                'unique_together': {('recording', 'started_at')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RecordingTrafficSubtree',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('oid', models.CharField(max_length=255, verbose_name='OID')),
+                ('var_binds_count', models.PositiveIntegerField(default=0, verbose_name='Var-binds')),
+                ('traffic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subtrees', to='simulator.RecordingTraffic')),
+            ],
+            options={
+                'unique_together': {('traffic', 'oid')},
+            },
+        ),
+    ]
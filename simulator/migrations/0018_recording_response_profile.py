@@ -0,0 +1,39 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:13
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0017_recording_traffic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='drop_rate',
+            field=models.FloatField(default=0, help_text='Percentage of the dropped responses', validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)], verbose_name='Drop rate (%)'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='jitter_distribution',
+            field=models.CharField(choices=[('uniform', 'Uniform'), ('normal', 'Normal'), ('pareto', 'Pareto'), ('paretonormal', 'Pareto-normal')], default='uniform', max_length=16),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='max_var_binds',
+            field=models.PositiveIntegerField(blank=True, help_text='GETBULK responses are truncated to the number of var-binds, 64 if empty', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='GETBULK max var-binds'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='response_delay',
+            field=models.PositiveIntegerField(default=0, help_text='Fixed delay of each response', verbose_name='Response delay (ms)'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='response_jitter',
+            field=models.PositiveIntegerField(default=0, help_text='Random deviation of the response delay', verbose_name='Response jitter (ms)'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:17
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('simulator', '0018_recording_response_profile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recording',
+            name='cpu_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Share of one CPU the snmpsim daemon of the recording endpoint can use, e.g. 200 for two CPUs, unlimited if empty. Applied on the next start', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='CPU limit (%)'),
+        ),
+        migrations.AddField(
+            model_name='recording',
+            name='memory_limit',
+            field=models.PositiveIntegerField(blank=True, help_text='Memory the snmpsim daemon of the recording endpoint can use, unlimited if empty. Applied on the next start', null=True, validators=[django.core.validators.MinValueValidator(1)], verbose_name='Memory limit (MB)'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.6 on 2026-10-19 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('simulator', '0019_recording_resource_limits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecordingCapture',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_ip_address', models.GenericIPAddressField(verbose_name='Device IP address')),
+                ('device_port', models.PositiveIntegerField(default=161)),
+                ('device_snmp_read_community', models.CharField(default='public', max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('port', models.PositiveIntegerField(default=161)),
+                ('snmp_read_community', models.CharField(default='public', max_length=255)),
+                ('comment', models.TextField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16)),
+                ('error', models.TextField(blank=True)),
+                ('recording_file', models.CharField(blank=True, help_text='File the MIB tree is written into while the capture is running', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('recording', models.ForeignKey(blank=True, help_text='Recording created by the capture', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='captures', to='simulator.Recording')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
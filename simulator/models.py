@@ -1,10 +1,38 @@
+import datetime
+import ipaddress
+import logging
 import os
 import shutil
 import uuid
 
 from django.conf import settings
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator, RegexValidator
+from django.db import models, transaction
 from django.dispatch import receiver
+from django.utils import timezone
+
+from . import network, search, snmprec
+from .nodes import get_snmpsim_runner
+
+
+logger = logging.getLogger(__name__)
+
+# jitter distributions of the Linux netem queueing discipline
+JITTER_DISTRIBUTIONS = (
+    ("uniform", "Uniform"),
+    ("normal", "Normal"),
+    ("pareto", "Pareto"),
+    ("paretonormal", "Pareto-normal"),
+)
+# states of the recording capture run by 'manage.py run_recording_captures'
+CAPTURE_STATUSES = (
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("done", "Done"),
+    ("failed", "Failed"),
+)
+RESPONSE_PROFILE_FIELDS = ("response_delay", "response_jitter", "jitter_distribution", "drop_rate", "max_var_binds")
+RESOURCE_LIMITS_FIELDS = ("cpu_limit", "memory_limit")
 
 
 def upload_to(instance, filename):
@@ -17,39 +45,359 @@ def upload_to(instance, filename):
     return f"recordings/{uuid.uuid4().hex}/{filename}"
 
 
+STATUS_VERSION_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def get_status_version(updated_at):
+    """Convert modification time of the recording into the status version (microseconds since epoch)
+
+    :param updated_at:
+    :return:
+    """
+    if updated_at is None:
+        return 0
+
+    return (updated_at - STATUS_VERSION_EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class NodeManager(models.Manager):
+    def get_least_loaded(self):
+        """Get enabled node with the least running recordings, ties are resolved by the total number of recordings
+
+        :return: node or None if there are no enabled nodes
+        """
+        return (self.filter(is_enabled=True)
+                .annotate(running_recordings=models.Count("recordings", filter=models.Q(recordings__is_running=True)),
+                          total_recordings=models.Count("recordings"))
+                .order_by("running_recordings", "total_recordings", "pk")
+                .first())
+
+
+class Node(models.Model):
+    """Host with the simulator agent ('manage.py run_snmpsim_agent') that runs snmpsim daemons"""
+    name = models.CharField(max_length=255, unique=True)
+    url = models.URLField(unique=True, help_text="URL of the simulator agent, e.g. http://10.0.0.5:8161")
+    is_enabled = models.BooleanField(default=True, help_text="New recordings are placed only on enabled nodes")
+    comment = models.TextField(max_length=255, blank=True)
+
+    objects = NodeManager()
+
+    def __str__(self):
+        return self.name
+
+
 class RecordingManager(models.Manager):
     def is_ip_address_unique(self, ip_address):
         return self.filter(ip_address=ip_address).count() == 1
 
+    def get_status_version(self):
+        """Get status version of the most recently changed recording
+
+        :return:
+        """
+        return get_status_version(self.aggregate(updated_at=models.Max("updated_at"))["updated_at"])
+
+    def changed_since(self, version):
+        """
+
+        :param version:
+        :return:
+        """
+        return self.filter(updated_at__gt=STATUS_VERSION_EPOCH + datetime.timedelta(microseconds=version))
+
+    def clone(self, source, count, name_pattern="{name}-{index}", template_ip_address=None, set_sys_name=False,
+              updated_by=None):
+        """Create recordings on the free IP addresses that share the file of the source recording
+
+        Differences of each clone are kept in its overlay: sysName is set to the clone name and records with
+        the template IP address value (e.g. ipAdEntAddr of the device the recording was captured from)
+        are set to the clone IP address. Clone with the overlay is served from a merged copy of the file,
+        so by default clones don't have one and are served from the shared file itself
+
+        :param source:
+        :param count:
+        :param name_pattern: format of the clone names with the 'name' of the source, 'index' and 'ip_address'
+        :param template_ip_address: IPv4 address in the file replaced by the clone IP address
+        :param set_sys_name: set sysName of the clones to their names
+        :param updated_by:
+        :return: list of the clones
+        :raises ValueError: if there are not enough free IP addresses
+        """
+        ip_address_records = []
+        if template_ip_address:
+            with open(source.recording_file.path, "rb") as file:
+                ip_address_records = snmprec.find_ip_address_records(file, template_ip_address)
+
+        subtrees = list(source.subtrees.values_list("oid", "oids_count"))
+        clones = []
+        with transaction.atomic():
+            used_ip_addresses = self.values_list("ip_address", flat=True).distinct()
+            ip_addresses = network.get_free_ip_addresses(used_ip_addresses=used_ip_addresses, limit=count)
+            if len(ip_addresses) < count:
+                raise ValueError(f"Only {len(ip_addresses)} free IP addresses left for {count} clones")
+
+            for index, ip_address in enumerate(ip_addresses, start=1):
+                name = name_pattern.format(name=source.name, index=index, ip_address=ip_address)
+                overlay = [f"{snmprec.SYS_NAME_OID}|4|{name}"] if set_sys_name else []
+                if ipaddress.ip_address(ip_address).version == 4:
+                    overlay.extend(f"{oid}|{type_tag}|{ip_address}" for oid, type_tag in ip_address_records)
+
+                clone = self.model(name=name,
+                                   ip_address=ip_address,
+                                   port=source.port,
+                                   snmp_read_community=source.snmp_read_community,
+                                   recording_file=source.recording_file.name,
+                                   overlay="\n".join([source.overlay, *overlay]).strip(),
+                                   is_on_demand=source.is_on_demand,
+                                   **source.response_profile,
+                                   **source.resource_limits,
+                                   autodiscover_sys_desc=source.autodiscover_sys_desc,
+                                   sys_description=source.sys_description,
+                                   comment=source.comment,
+                                   updated_by=updated_by,
+                                   oids_count=source.oids_count,
+                                   file_size=source.file_size,
+                                   interfaces_count=source.interfaces_count,
+                                   node=source.node)
+                clone.save()
+                clones.append(clone)
+
+            RecordingSubtree.objects.bulk_create([RecordingSubtree(recording=clone, oid=oid, oids_count=oids_count)
+                                                  for clone in clones for oid, oids_count in subtrees])
+
+        return clones
+
 
 class Recording(models.Model):
     name = models.CharField(max_length=255)
     ip_address = models.GenericIPAddressField()
     port = models.PositiveIntegerField(default=161)
-    snmp_read_community = models.CharField(default="public", max_length=255)
+    snmp_read_community = models.CharField(default="public", max_length=255,
+                                           validators=[RegexValidator(r"^[^/]+$",
+                                                                      "SNMP community can't contain '/' symbol")])
     is_running = models.BooleanField(default=False)
     recording_file = models.FileField(upload_to=upload_to)
     autodiscover_sys_desc = models.BooleanField(default=True, verbose_name="Autodiscover sysDescr")
     sys_description = models.TextField(max_length=255, blank=True)
     comment = models.TextField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     updated_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    oids_count = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True,
+                                             verbose_name="OIDs")
+    file_size = models.BigIntegerField(null=True, blank=True, editable=False, db_index=True)
+    interfaces_count = models.PositiveIntegerField(null=True, blank=True, editable=False, db_index=True,
+                                                   verbose_name="Interfaces",
+                                                   help_text="Number of the ifIndex entries")
+    time_to_ready = models.FloatField(null=True, blank=True, editable=False, verbose_name="Time to ready (s)",
+                                      help_text="Seconds from the last start until the snmpsim daemon answered")
+    overlay = models.TextField(blank=True,
+                               help_text="Records in the .snmprec format 'OID|TAG|VALUE' that replace the records "
+                                         "of the file with the same OIDs or are added to it, e.g. sysName of the clone")
+    is_on_demand = models.BooleanField(default=False, verbose_name="Start on demand",
+                                       help_text="Stopped recording of the local host is started by the on-demand "
+                                                 "listener on the first SNMP request to its endpoint")
+    response_delay = models.PositiveIntegerField(default=0, verbose_name="Response delay (ms)",
+                                                 help_text="Fixed delay of each response")
+    response_jitter = models.PositiveIntegerField(default=0, verbose_name="Response jitter (ms)",
+                                                  help_text="Random deviation of the response delay")
+    jitter_distribution = models.CharField(max_length=16, choices=JITTER_DISTRIBUTIONS, default="uniform")
+    drop_rate = models.FloatField(default=0, validators=[MinValueValidator(0), MaxValueValidator(100)],
+                                  verbose_name="Drop rate (%)", help_text="Percentage of the dropped responses")
+    max_var_binds = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)],
+                                                verbose_name="GETBULK max var-binds",
+                                                help_text="GETBULK responses are truncated to the number of "
+                                                          "var-binds, 64 if empty")
+    cpu_limit = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)],
+                                            verbose_name="CPU limit (%)",
+                                            help_text="Share of one CPU the snmpsim daemon of the recording endpoint "
+                                                      "can use, e.g. 200 for two CPUs, unlimited if empty. "
+                                                      "Applied on the next start")
+    memory_limit = models.PositiveIntegerField(null=True, blank=True, validators=[MinValueValidator(1)],
+                                               verbose_name="Memory limit (MB)",
+                                               help_text="Memory the snmpsim daemon of the recording endpoint can use, "
+                                                         "unlimited if empty. Applied on the next start")
+    last_activity_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="Last activity",
+                                            help_text="Time of the last SNMP request or start of the recording")
+    is_idle_stopped = models.BooleanField(default=False, editable=False, verbose_name="Stopped as idle",
+                                          help_text="Recording was stopped after it had no SNMP requests for "
+                                                    "the idle TTL, it can be started again")
+    node = models.ForeignKey(Node, null=True, blank=True, on_delete=models.PROTECT, related_name="recordings",
+                             help_text="Node that runs the recording, the local host if empty. "
+                                       "New recordings are placed on the least loaded node if it is not set")
 
     objects = RecordingManager()
 
     class Meta:
-        unique_together = ('ip_address', 'port')
+        # recordings on the same IP:port endpoint are served by one snmpsim daemon and selected by the community
+        unique_together = ('ip_address', 'port', 'snmp_read_community')
 
     def __str__(self):
         return f"{self.name} IP: {self.ip_address}"
 
+    @property
+    def response_profile(self):
+        """Delay, jitter, drops and GETBULK truncation of the responses applied to the recording endpoint
+
+        :return:
+        """
+        return {field: getattr(self, field) for field in RESPONSE_PROFILE_FIELDS}
+
+    @property
+    def resource_limits(self):
+        """CPU share and memory cap of the snmpsim daemon that serves the recording endpoint
+
+        :return:
+        """
+        return {field: getattr(self, field) for field in RESOURCE_LIMITS_FIELDS}
+
+
+class RecordingSubtree(models.Model):
+    """Number of OIDs of the recording in the top-level MIB subtree, e.g. 1.3.6.1.2.1.2 or 1.3.6.1.4.1.9"""
+    recording = models.ForeignKey(Recording, on_delete=models.CASCADE, related_name="subtrees")
+    oid = models.CharField(max_length=255, db_index=True, verbose_name="OID")
+    oids_count = models.PositiveIntegerField(verbose_name="OIDs")
+
+    class Meta:
+        unique_together = ('recording', 'oid')
+
+    def __str__(self):
+        return self.oid
+
+
+class RecordingTraffic(models.Model):
+    """SNMP requests to the recording within the time bucket, collected from the snmpsim daemon logs"""
+    recording = models.ForeignKey(Recording, on_delete=models.CASCADE, related_name="traffic")
+    started_at = models.DateTimeField(db_index=True)
+    get_requests = models.PositiveIntegerField(default=0, verbose_name="GET")
+    get_next_requests = models.PositiveIntegerField(default=0, verbose_name="GETNEXT")
+    get_bulk_requests = models.PositiveIntegerField(default=0, verbose_name="GETBULK")
+    set_requests = models.PositiveIntegerField(default=0, verbose_name="SET")
+    errors = models.PositiveIntegerField(default=0, help_text="Requests answered with noSuchObject or noSuchInstance")
+    timeouts = models.PositiveIntegerField(default=0, help_text="Requests the snmpsim daemon didn't answer")
+
+    class Meta:
+        unique_together = ('recording', 'started_at')
+
+    def __str__(self):
+        return f"{self.recording} at {self.started_at}"
+
+
+class RecordingTrafficSubtree(models.Model):
+    """Number of the requested var-binds in the top-level MIB subtree within the traffic time bucket"""
+    traffic = models.ForeignKey(RecordingTraffic, on_delete=models.CASCADE, related_name="subtrees")
+    oid = models.CharField(max_length=255, verbose_name="OID")
+    var_binds_count = models.PositiveIntegerField(default=0, verbose_name="Var-binds")
+
+    class Meta:
+        unique_together = ('traffic', 'oid')
+
+    def __str__(self):
+        return self.oid
+
+
+class RecordingCapture(models.Model):
+    """Capture of the new recording from the live device, it is queued and run by 'manage.py run_recording_captures'"""
+    device_ip_address = models.GenericIPAddressField(verbose_name="Device IP address")
+    device_port = models.PositiveIntegerField(default=161)
+    device_snmp_read_community = models.CharField(default="public", max_length=255)
+    name = models.CharField(max_length=255)
+    ip_address = models.GenericIPAddressField()
+    port = models.PositiveIntegerField(default=161)
+    snmp_read_community = models.CharField(default="public", max_length=255)
+    comment = models.TextField(max_length=255, blank=True)
+    status = models.CharField(max_length=16, choices=CAPTURE_STATUSES, default="pending", db_index=True)
+    error = models.TextField(blank=True)
+    recording_file = models.CharField(max_length=255, blank=True,
+                                      help_text="File the MIB tree is written into while the capture is running")
+    recording = models.ForeignKey(Recording, null=True, blank=True, on_delete=models.SET_NULL,
+                                  related_name="captures", help_text="Recording created by the capture")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    updated_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+
+    def __str__(self):
+        return f"{self.name} from {self.device_ip_address}"
+
 
 #todo: move start/stop script logic here??
 @receiver(models.signals.post_delete, sender=Recording)
 def auto_delete_file_on_delete(sender, instance, **kwargs):
-    """Deletes file from filesystem when corresponding `Recording` object is deleted."""
-    shutil.rmtree(os.path.dirname(instance.recording_file.path), ignore_errors=True)
+    """Deletes file from filesystem, its copy uploaded to the node and its contents from the search index
+    when `Recording` object is deleted.
+
+    Shared file is kept for the other recordings with its search index contents."""
+    other_recording = sender.objects.filter(recording_file=instance.recording_file.name).first()
+    if other_recording is None:
+        shutil.rmtree(os.path.dirname(instance.recording_file.path), ignore_errors=True)
+        search.remove_recording(instance.pk)
+    else:
+        search.move_recording(instance.pk, other_recording.pk)
+
+    if instance.node_id is not None and not sender.objects.filter(recording_file=instance.recording_file.name,
+                                                                  node_id=instance.node_id).exists():
+        try:
+            get_snmpsim_runner(instance.node).remove_recording_file(instance.recording_file.path)
+        except Exception:
+            logger.exception(f"Failed to remove recording file of '{instance}' from the node '{instance.node}' due to:")
+
+
+@receiver(models.signals.pre_save, sender=Recording)
+def auto_place_on_node(sender, instance, **kwargs):
+    """Places new `Recording` object on the least loaded node if node is not chosen explicitly."""
+    if instance.pk is None and instance.node_id is None:
+        instance.node = Node.objects.get_least_loaded()
+
+
+@receiver(models.signals.pre_save, sender=Recording)
+def auto_reset_activity_on_start(sender, instance, **kwargs):
+    """Resets idle time of `Recording` object when it is started, as the start counts as its activity."""
+    if not instance.is_running:
+        return
+
+    if instance.pk is not None and sender.objects.filter(pk=instance.pk, is_running=True).exists():
+        return
+
+    instance.last_activity_at = timezone.now()
+    instance.is_idle_stopped = False
+
+
+@receiver(models.signals.pre_save, sender=Recording)
+def auto_update_statistics_on_change(sender, instance, **kwargs):
+    """Collects statistics of the new file of `Recording` object, so they are never read from the file at query time."""
+    if not instance.recording_file:
+        return
+
+    if instance.recording_file._committed:
+        if instance.oids_count is not None:
+            return
+
+        with open(instance.recording_file.path, "rb") as file:
+            statistics = snmprec.get_recording_statistics(file)
+    else:
+        # new file isn't saved into the storage yet, it is read from the beginning once again when it is saved
+        statistics = snmprec.get_recording_statistics(instance.recording_file.file)
+
+    instance.oids_count = statistics["oids_count"]
+    instance.file_size = statistics["file_size"]
+    instance.interfaces_count = statistics["interfaces_count"]
+    instance._subtrees = statistics["subtrees"]
+
+
+@receiver(models.signals.post_save, sender=Recording)
+def auto_index_file_on_change(sender, instance, **kwargs):
+    """Replaces subtrees and search index contents of `Recording` object with the ones of its new file."""
+    subtrees = instance.__dict__.pop("_subtrees", None)
+    if subtrees is None:
+        return
+
+    instance.subtrees.all().delete()
+    RecordingSubtree.objects.bulk_create([RecordingSubtree(recording=instance, oid=oid, oids_count=oids_count)
+                                          for oid, oids_count in subtrees.items()])
+
+    with open(instance.recording_file.path, "rb") as file:
+        search.index_recording(recording_id=instance.pk, recording_file=file)
 
 
 @receiver(models.signals.pre_save, sender=Recording)
@@ -63,5 +411,12 @@ def auto_delete_old_file_on_change(sender, instance, **kwargs):
     except sender.DoesNotExist:
         return False
 
-    if instance.recording_file != old_file:
+    if instance.recording_file == old_file:
+        return
+
+    other_recording = sender.objects.filter(recording_file=old_file.name).exclude(pk=instance.pk).first()
+    if other_recording is None:
         shutil.rmtree(os.path.dirname(old_file.path), ignore_errors=True)
+    else:
+        # search index contents of the shared file are kept, as the new file is indexed under this recording
+        search.move_recording(instance.pk, other_recording.pk)
@@ -0,0 +1,92 @@
+import functools
+import ipaddress
+import itertools
+
+from django.conf import settings
+
+
+@functools.lru_cache(maxsize=None)
+def get_snmpsim_networks():
+    """Get IPv4 networks and IPv6 prefixes configured for the simulated devices
+
+    SNMPSIM_NETWORK setting can be a single network or a list of networks, e.g. ["10.0.0.0/16", "fd00:73::/64"]
+
+    :return:
+    """
+    networks = settings.SNMPSIM_NETWORK
+    if isinstance(networks, str):
+        networks = [networks]
+
+    return tuple(ipaddress.ip_network(network, strict=False) for network in networks)
+
+
+def get_ip_address_network(ip_address):
+    """Find configured network that contains the given IP address
+
+    :param ip_address:
+    :return: network or None if IP address is outside of all configured networks
+    """
+    ip_address = ipaddress.ip_address(ip_address)
+    for network in get_snmpsim_networks():
+        if ip_address in network:
+            return network
+
+
+def get_ip_address_prefix_length(ip_address):
+    """Get prefix length of the network that contains the given IP address
+
+    :param ip_address:
+    :return:
+    """
+    network = get_ip_address_network(ip_address)
+    if network is None:
+        return ipaddress.ip_address(ip_address).max_prefixlen
+
+    return network.prefixlen
+
+
+def get_ip_address_index(ip_address):
+    """Get unique number of the IPv4 address across all configured IPv4 networks
+
+    :param ip_address:
+    :return: number or None if IP address is not IPv4 one or it is outside of all configured networks
+    """
+    ip_address = ipaddress.ip_address(ip_address)
+    if ip_address.version != 4:
+        return
+
+    offset = 0
+    for network in get_snmpsim_networks():
+        if network.version != 4:
+            continue
+
+        if ip_address in network:
+            return offset + int(ip_address) - int(network.network_address)
+
+        offset += network.num_addresses
+
+
+def iter_free_ip_addresses(used_ip_addresses):
+    """Lazily iterate over IP addresses of the configured networks that are not used yet
+
+    Works with huge IPv6 prefixes as hosts are never materialized at once
+
+    :param used_ip_addresses:
+    :return:
+    """
+    used_ip_addresses = {str(ipaddress.ip_address(ip_address)) for ip_address in used_ip_addresses}
+    for network in get_snmpsim_networks():
+        for ip_address in network.hosts():
+            ip_address = str(ip_address)
+            if ip_address not in used_ip_addresses:
+                yield ip_address
+
+
+def get_free_ip_addresses(used_ip_addresses, limit):
+    """
+
+    :param used_ip_addresses:
+    :param limit:
+    :return:
+    """
+    return list(itertools.islice(iter_free_ip_addresses(used_ip_addresses), limit))
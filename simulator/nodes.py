@@ -0,0 +1,187 @@
+import collections
+import concurrent.futures
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils.module_loading import import_string
+
+from . import profiling
+from .agent import SNMPSimAgentRunner
+from .snmpsim_runner import SNMPSimNotReadyError
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_local_snmpsim_runner_class():
+    """Get class of the runner selected by SNMPSIM_RUNNER for the recordings of this host
+
+    :return:
+    """
+    return import_string(settings.SNMPSIM_RUNNER)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_local_snmpsim_runner():
+    """
+
+    :return:
+    """
+    return get_local_snmpsim_runner_class()()
+
+
+def get_snmpsim_runner(node):
+    """Get runner for the recordings of the node
+
+    :param node: node or None for the local host
+    :return:
+    """
+    if node is None:
+        return _get_local_snmpsim_runner()
+
+    return SNMPSimAgentRunner(url=node.url)
+
+
+def _run_on_node(runner, operation, recordings):
+    """Run operation for the recordings of one node one by one, daemons on the same node share its interface
+
+    :param runner:
+    :param operation:
+    :param recordings:
+    :return: list of (recording, exception or None)
+    """
+    results = []
+    for recording in recordings:
+        try:
+            operation(runner, recording)
+        except Exception as e:
+            logger.exception(f"Failed to run '{operation.__name__}' for the recording '{recording}' due to:")
+            results.append((recording, e))
+        else:
+            results.append((recording, None))
+
+    return results
+
+
+def run_per_node(recordings, operation):
+    """Run operation for the recordings, different nodes are processed concurrently
+
+    :param recordings:
+    :param operation: function(runner, recording), it must not use the database as it runs in the worker thread
+    :return: list of (recording, exception or None) in order the operations finished
+    """
+    recordings_by_node = collections.defaultdict(list)
+    nodes = {}
+    for recording in recordings:
+        recordings_by_node[recording.node_id].append(recording)
+        nodes[recording.node_id] = recording.node
+
+    if not recordings_by_node:
+        return []
+
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(recordings_by_node)) as executor:
+        futures = [executor.submit(profiling.propagate(_run_on_node),
+                                   runner=get_snmpsim_runner(nodes[node_id]),
+                                   operation=operation,
+                                   recordings=node_recordings)
+                   for node_id, node_recordings in recordings_by_node.items()]
+
+        for future in concurrent.futures.as_completed(futures):
+            results.extend(future.result())
+
+    return results
+
+
+def _wait_ready(recording, start_time):
+    """
+
+    :param recording:
+    :param start_time:
+    :return: (exception or None, seconds from the start until the recording daemon is ready or None)
+    """
+    try:
+        if get_snmpsim_runner(recording.node).wait_ready(ip_address=recording.ip_address,
+                                                         port=recording.port,
+                                                         snmp_read_community=recording.snmp_read_community) is None:
+            return SNMPSimNotReadyError(f"Recording '{recording}' doesn't answer on "
+                                        f"{recording.ip_address}:{recording.port} in "
+                                        f"{settings.SNMPSIM_READINESS_TIMEOUT} seconds"), None
+    except Exception as e:
+        logger.exception(f"Failed to wait for readiness of the recording '{recording}' due to:")
+        return e, None
+
+    return None, time.monotonic() - start_time
+
+
+def start_per_node(recordings):
+    """Start recordings on their nodes, then wait for readiness of all started recordings concurrently
+
+    Recordings on the same endpoint restart its daemon, so readiness is checked only when all of them are started
+
+    :param recordings:
+    :return: list of (recording, exception or None, seconds from the start until the recording is ready or None),
+        recording that isn't ready has the SNMPSimNotReadyError, it is stopped then
+    """
+    start_times = {}
+
+    def start_recording(runner, recording):
+        start_times[recording.pk] = time.monotonic()
+        runner.start(recording_file=recording.recording_file.path,
+                     ip_address=recording.ip_address,
+                     port=recording.port,
+                     snmp_read_community=recording.snmp_read_community,
+                     wait_ready=False,
+                     overlay=recording.overlay,
+                     response_profile=recording.response_profile,
+                     resource_limits=recording.resource_limits)
+
+    results = run_per_node(recordings, start_recording)
+    started_recordings = [recording for recording, error in results if error is None]
+    if not started_recordings or not settings.SNMPSIM_READINESS_PROBE:
+        return [(recording, error, None) for recording, error in results]
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(started_recordings)) as executor:
+        ready_results = dict(zip(started_recordings,
+                                 executor.map(profiling.propagate(
+                                     lambda recording: _wait_ready(recording, start_times[recording.pk])),
+                                     started_recordings)))
+
+    not_ready_recordings = [recording for recording, (error, _) in ready_results.items()
+                            if isinstance(error, SNMPSimNotReadyError)]
+    if not_ready_recordings:
+        for recording, error in stop_per_node(not_ready_recordings):
+            if error is not None:
+                logger.error(f"Failed to stop recording '{recording}' that isn't ready due to: {error}")
+
+    return [(recording, error, None) if error is not None else (recording, *ready_results[recording])
+            for recording, error in results]
+
+
+def stop_per_node(recordings):
+    """Stop recordings on their nodes, different nodes are processed concurrently
+
+    Sub interface is removed only with the last recording on the IP address, it is checked before
+    the operations are run, as they run in the worker threads without the database
+
+    :param recordings:
+    :return: list of (recording, exception or None)
+    """
+    from .models import Recording
+
+    unique_ip_addresses = set(Recording.objects.values("ip_address")
+                              .annotate(recordings_count=Count("id"))
+                              .filter(recordings_count=1)
+                              .values_list("ip_address", flat=True))
+
+    def stop_recording(runner, recording):
+        runner.stop(recording_file=recording.recording_file.path,
+                    ip_address=recording.ip_address,
+                    port=recording.port,
+                    snmp_read_community=recording.snmp_read_community,
+                    remove_sub_iface=recording.ip_address in unique_ip_addresses)
+
+    return run_per_node(recordings, stop_recording)
@@ -0,0 +1,312 @@
+import concurrent.futures
+import ipaddress
+import logging
+import queue
+import selectors
+import socket
+import time
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Recording
+
+
+logger = logging.getLogger(__name__)
+
+MAX_DATAGRAM_SIZE = 65535
+HANDOVER_CHECK_TIMEOUT = 1
+
+
+def is_endpoint_handover_supported():
+    """Check that the system delivers UDP datagrams to the last socket bound to the endpoint with SO_REUSEADDR
+    (as Linux does), the listener relies on it to hand its endpoints over to the started daemons
+
+    :return:
+    """
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(3)]
+    try:
+        listener_socket, daemon_socket, client_socket = sockets
+        for sock in (listener_socket, daemon_socket):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.settimeout(HANDOVER_CHECK_TIMEOUT)
+        listener_socket.bind(("127.0.0.1", 0))
+        daemon_socket.bind(listener_socket.getsockname())
+
+        client_socket.sendto(b"handover", listener_socket.getsockname())
+        try:
+            return daemon_socket.recv(MAX_DATAGRAM_SIZE) == b"handover"
+        except socket.timeout:
+            return False
+    except OSError:
+        logger.exception("Failed to check the endpoint handover due to:")
+        return False
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+class SNMPSimOnDemandListener:
+    """Holds UDP endpoints of the stopped on-demand recordings and starts them on the first request
+
+    Endpoint sockets are bound with SO_REUSEADDR like the snmpsim ones, so the daemon binds the endpoint
+    while the listener still holds it and, as the last bound socket, receives all further requests.
+    Requests the listener received until the daemon is ready are forwarded to it and the responses are sent
+    back from the listener socket, so for the clients they come from the endpoint. Then the endpoint is released
+    and it is bound again only when its recordings are stopped
+    """
+    def __init__(self, runner, sync_interval=None, workers=None, forward_timeout=None):
+        """
+
+        :param runner: local runner
+        :param sync_interval: SNMPSIM_ON_DEMAND_SYNC_INTERVAL by default
+        :param workers: SNMPSIM_ON_DEMAND_WORKERS by default
+        :param forward_timeout: SNMPSIM_ON_DEMAND_FORWARD_TIMEOUT by default
+        """
+        self._runner = runner
+        self._sync_interval = settings.SNMPSIM_ON_DEMAND_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self._forward_timeout = (settings.SNMPSIM_ON_DEMAND_FORWARD_TIMEOUT if forward_timeout is None
+                                 else forward_timeout)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=settings.SNMPSIM_ON_DEMAND_WORKERS if workers is None else workers)
+        self._selector = selectors.DefaultSelector()
+        self._sockets = {}
+        # endpoints whose recordings are being started and ones that are started, they are released by the main loop
+        self._activating_endpoints = set()
+        self._activated_endpoints = queue.Queue()
+
+    def _get_dormant_endpoints(self):
+        """Get endpoints of the stopped on-demand recordings, endpoints with running recordings belong to the daemons
+
+        :return: set of (IP, port)
+        """
+        running_endpoints = set(Recording.objects.filter(is_running=True).values_list("ip_address", "port"))
+        dormant_endpoints = set(Recording.objects.filter(is_on_demand=True, is_running=False, node__isnull=True)
+                                .values_list("ip_address", "port"))
+
+        return dormant_endpoints - running_endpoints
+
+    def _bind(self, endpoint):
+        """
+
+        :param endpoint: (IP, port)
+        :return:
+        """
+        ip_address, port = endpoint
+        self._runner.prepare_ip_address(ip_address)
+
+        family = socket.AF_INET6 if ipaddress.ip_address(ip_address).version == 6 else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(endpoint)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+
+        self._sockets[endpoint] = sock
+        self._selector.register(sock, selectors.EVENT_READ, endpoint)
+        logger.info(f"Listening for the first request on {ip_address}:{port}")
+
+    def _release(self, endpoint):
+        """
+
+        :param endpoint: (IP, port)
+        :return:
+        """
+        sock = self._sockets.pop(endpoint)
+        try:
+            self._selector.unregister(sock)
+        except KeyError:
+            pass
+
+        sock.close()
+
+    def sync(self):
+        """Bind endpoints of the new stopped on-demand recordings and release ones of the started or deleted
+
+        :return:
+        """
+        dormant_endpoints = self._get_dormant_endpoints()
+        for endpoint in set(self._sockets) - dormant_endpoints - self._activating_endpoints:
+            self._release(endpoint)
+
+        for endpoint in dormant_endpoints - set(self._sockets):
+            try:
+                self._bind(endpoint)
+            except Exception:
+                logger.exception(f"Failed to listen on the endpoint {endpoint[0]}:{endpoint[1]} due to:")
+
+    def _receive_requests(self, sock):
+        """Read all requests waiting in the endpoint socket
+
+        :param sock:
+        :return: list of (request, client address)
+        """
+        requests = []
+        while True:
+            try:
+                requests.append(sock.recvfrom(MAX_DATAGRAM_SIZE))
+            except (BlockingIOError, InterruptedError):
+                return requests
+
+    def _forward_requests(self, endpoint, sock, requests):
+        """Forward requests to the started daemon and send its responses to the clients from the endpoint socket
+
+        Requests are forwarded concurrently, each one from its own socket, so the responses are matched to the clients
+        and the whole burst is answered or dropped within the single forward timeout
+
+        :param endpoint: (IP, port)
+        :param sock: endpoint socket
+        :param requests: list of (request, client address)
+        :return:
+        """
+        deadline = time.monotonic() + self._forward_timeout
+        pending_requests = {}
+        with selectors.DefaultSelector() as selector:
+            try:
+                for request, client_address in requests:
+                    forward_socket = socket.socket(sock.family, socket.SOCK_DGRAM)
+                    pending_requests[forward_socket] = (request, client_address)
+                    forward_socket.setblocking(False)
+                    forward_socket.connect(endpoint)
+                    selector.register(forward_socket, selectors.EVENT_READ)
+
+                next_send_time = time.monotonic()
+                while pending_requests and time.monotonic() < deadline:
+                    # requests are resent until the daemon answers, as it isn't bound yet if readiness isn't probed
+                    # by SNMP
+                    if time.monotonic() >= next_send_time:
+                        for forward_socket, (request, _) in pending_requests.items():
+                            try:
+                                forward_socket.send(request)
+                            except OSError:
+                                pass
+                        next_send_time = time.monotonic() + settings.SNMPSIM_READINESS_INTERVAL
+
+                    timeout = max(0, min(next_send_time, deadline) - time.monotonic())
+                    for key, _ in selector.select(timeout=timeout):
+                        try:
+                            response = key.fileobj.recv(MAX_DATAGRAM_SIZE)
+                        except OSError:
+                            # port is unreachable until the daemon binds it
+                            continue
+
+                        _, client_address = pending_requests.pop(key.fileobj)
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                        sock.sendto(response, client_address)
+            finally:
+                for forward_socket in pending_requests:
+                    forward_socket.close()
+
+        if pending_requests:
+            logger.warning(f"{len(pending_requests)} requests from the clients to {endpoint[0]}:{endpoint[1]} "
+                           f"weren't answered by the started snmpsim daemon")
+
+    def _activate(self, endpoint, sock):
+        """Start stopped on-demand recordings of the endpoint and forward requests received until they are ready
+
+        :param endpoint: (IP, port)
+        :param sock: endpoint socket
+        :return:
+        """
+        ip_address, port = endpoint
+        try:
+            requests = self._receive_requests(sock)
+            recordings = list(Recording.objects.filter(ip_address=ip_address,
+                                                       port=port,
+                                                       is_on_demand=True,
+                                                       is_running=False,
+                                                       node__isnull=True))
+            logger.info(f"Starting on-demand recordings {recordings} on the first request to {ip_address}:{port}")
+
+            started_recordings = []
+            try:
+                for index, recording in enumerate(recordings, start=1):
+                    # daemon is restarted for each recording of the endpoint, so only the last start is waited for,
+                    # recordings are marked running only when it's ready
+                    recording.time_to_ready = self._runner.start(recording_file=recording.recording_file.path,
+                                                                 ip_address=recording.ip_address,
+                                                                 port=recording.port,
+                                                                 snmp_read_community=recording.snmp_read_community,
+                                                                 wait_ready=index == len(recordings),
+                                                                 overlay=recording.overlay,
+                                                                 response_profile=recording.response_profile,
+                                                                 resource_limits=recording.resource_limits)
+                    started_recordings.append(recording)
+            except Exception:
+                # recordings shown as stopped aren't left running, so the endpoint is bound by the listener again
+                self._stop(started_recordings)
+                raise
+
+            for recording in recordings:
+                recording.is_running = True
+                recording.save()
+
+            requests.extend(self._receive_requests(sock))
+            self._forward_requests(endpoint, sock, requests)
+        except Exception:
+            logger.exception(f"Failed to start on-demand recordings on {ip_address}:{port} due to:")
+        finally:
+            connection.close()
+            self._activated_endpoints.put(endpoint)
+
+    def _stop(self, recordings):
+        """
+
+        :param recordings:
+        :return:
+        """
+        for recording in recordings:
+            try:
+                self._runner.stop(recording_file=recording.recording_file.path,
+                                  ip_address=recording.ip_address,
+                                  port=recording.port,
+                                  snmp_read_community=recording.snmp_read_community)
+            except Exception:
+                logger.exception(f"Failed to stop on-demand recording '{recording}' due to:")
+
+    def _handle_activated_endpoints(self):
+        """Release endpoints of the started recordings, endpoints that failed to start are bound again by the sync
+
+        :return:
+        """
+        while True:
+            try:
+                endpoint = self._activated_endpoints.get_nowait()
+            except queue.Empty:
+                return
+
+            self._activating_endpoints.discard(endpoint)
+            self._release(endpoint)
+
+    def serve_forever(self):
+        """
+
+        :return:
+        """
+        next_sync_time = time.monotonic()
+        while True:
+            if time.monotonic() >= next_sync_time:
+                self.sync()
+                next_sync_time = time.monotonic() + self._sync_interval
+
+            for key, events in self._selector.select(timeout=min(1, max(0, next_sync_time - time.monotonic()))):
+                endpoint = key.data
+                self._selector.unregister(key.fileobj)
+                self._activating_endpoints.add(endpoint)
+                self._executor.submit(self._activate, endpoint, key.fileobj)
+
+            self._handle_activated_endpoints()
+
+    def close(self):
+        """
+
+        :return:
+        """
+        self._executor.shutdown()
+        for endpoint in list(self._sockets):
+            self._release(endpoint)
+        self._selector.close()
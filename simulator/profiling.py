@@ -0,0 +1,290 @@
+import contextlib
+import cProfile
+import datetime
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+# structured log of the operations and SQL queries longer than the thresholds, JSON object per line
+slow_operations_logger = logging.getLogger("simulator.slow_operations")
+
+PROFILE_QUERY_PARAM = "profile"
+# characters that aren't allowed in the Server-Timing metric and profile file names
+UNSAFE_NAME_CHARACTERS_RE = re.compile(r"[^\w-]+")
+
+_local = threading.local()
+
+
+class RequestProfile:
+    """Number and total duration of the operations and SQL queries of one request
+
+    Operations of the worker threads started by the request are added too, so it is updated under the lock
+    """
+    def __init__(self, name):
+        """
+
+        :param name: e.g. 'POST /admin/simulator/recording/1/start/'
+        """
+        self.name = name
+        self.operations = {}
+        self.sql_queries = 0
+        self.sql_duration = 0.0
+        self._lock = threading.Lock()
+
+    def add_operation(self, name, duration):
+        """
+
+        :param name:
+        :param duration:
+        :return:
+        """
+        with self._lock:
+            count, total_duration = self.operations.get(name, (0, 0.0))
+            self.operations[name] = (count + 1, total_duration + duration)
+
+    def add_query(self, duration):
+        """
+
+        :param duration:
+        :return:
+        """
+        with self._lock:
+            self.sql_queries += 1
+            self.sql_duration += duration
+
+    def get_summary(self):
+        """
+
+        :return: dict with the operations and SQL queries counts and durations
+        """
+        with self._lock:
+            return {
+                "operations": {name: {"count": count, "duration": round(duration, 4)}
+                               for name, (count, duration) in self.operations.items()},
+                "sql_queries": self.sql_queries,
+                "sql_duration": round(self.sql_duration, 4),
+            }
+
+    def get_server_timing(self, duration):
+        """Format durations for the Server-Timing header shown by the browser developer tools
+
+        :param duration: total duration of the request
+        :return:
+        """
+        with self._lock:
+            metrics = [f"total;dur={duration * 1000:.1f}", f"sql;dur={self.sql_duration * 1000:.1f}"]
+            metrics.extend(f"{UNSAFE_NAME_CHARACTERS_RE.sub('-', name)};dur={total_duration * 1000:.1f}"
+                           for name, (count, total_duration) in self.operations.items())
+
+        return ", ".join(metrics)
+
+
+def get_current_profile():
+    """
+
+    :return: profile of the request handled by the current thread or None
+    """
+    return getattr(_local, "profile", None)
+
+
+@contextlib.contextmanager
+def activate(profile):
+    """Collect operations of the current thread into the profile
+
+    :param profile:
+    :return:
+    """
+    previous_profile = get_current_profile()
+    _local.profile = profile
+    try:
+        yield profile
+    finally:
+        _local.profile = previous_profile
+
+
+def propagate(function):
+    """Wrap function submitted to the worker thread, so its operations are added to the profile of the caller
+
+    :param function:
+    :return:
+    """
+    profile = get_current_profile()
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with activate(profile):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def long_poll(view):
+    """Mark the view that waits for the changes, so its requests aren't logged as the slow ones
+
+    Slow SQL queries and operations of the view are still logged
+
+    :param view:
+    :return:
+    """
+    view.long_poll = True
+    return view
+
+
+def log_slow_operation(operation, duration, **details):
+    """
+
+    :param operation:
+    :param duration:
+    :param details: additional fields of the log record, e.g. the recording or SQL
+    :return:
+    """
+    profile = get_current_profile()
+    record = {
+        "time": datetime.datetime.now().isoformat(),
+        "operation": operation,
+        "duration": round(duration, 4),
+        "request": profile.name if profile is not None else None,
+        **details,
+    }
+    slow_operations_logger.warning(json.dumps(record, default=str))
+
+
+@contextlib.contextmanager
+def profile_operation(name, **details):
+    """Time the operation, it is added to the profile of the current request and logged if it is slow
+
+    Can be used as the decorator as well
+
+    :param name: e.g. 'runner.start_endpoint'
+    :param details: fields of the slow operation log record
+    :return:
+    """
+    start_time = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        details["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - start_time
+        profile = get_current_profile()
+        if profile is not None:
+            profile.add_operation(name, duration)
+
+        if duration >= settings.SNMPSIM_SLOW_OPERATION_THRESHOLD:
+            log_slow_operation(name, duration, **details)
+
+
+def _profile_query(execute, sql, params, many, context):
+    """Database execute wrapper that times SQL queries of the request
+
+    :param execute:
+    :param sql:
+    :param params:
+    :param many:
+    :param context:
+    :return:
+    """
+    start_time = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start_time
+        profile = get_current_profile()
+        if profile is not None:
+            profile.add_query(duration)
+
+        if duration >= settings.SNMPSIM_SLOW_QUERY_THRESHOLD:
+            log_slow_operation("sql", duration, sql=sql, many=many)
+
+
+class ProfilingMiddleware:
+    """Profile each request: durations of the operations and SQL queries are returned in the Server-Timing header,
+    slow requests are written to the slow operations log with their profile
+
+    Superuser can capture cProfile statistics of a single request with the '?profile' query parameter, they are saved
+    into the SNMPSIM_PROFILE_FOLDER. Must follow the AuthenticationMiddleware
+    """
+    def __init__(self, get_response):
+        """
+
+        :param get_response:
+        """
+        self.get_response = get_response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        """
+
+        :param request:
+        :param view_func:
+        :param view_args:
+        :param view_kwargs:
+        :return:
+        """
+        request.is_long_poll = getattr(view_func, "long_poll", False)
+
+    def _get_profiler(self, request):
+        """
+
+        :param request:
+        :return: profiler if cProfile capture is requested and allowed or None
+        """
+        if PROFILE_QUERY_PARAM not in request.GET:
+            return
+
+        # the parameter is removed, so it isn't taken for the admin changelist filter
+        request.GET = request.GET.copy()
+        del request.GET[PROFILE_QUERY_PARAM]
+
+        if not settings.SNMPSIM_PROFILE_FOLDER or not request.user.is_superuser:
+            logger.warning(f"cProfile capture of the request '{request.method} {request.path}' is not allowed")
+            return
+
+        return cProfile.Profile()
+
+    def _save_profiler_stats(self, profiler, request):
+        """
+
+        :param profiler:
+        :param request:
+        :return: name of the file with the statistics
+        """
+        os.makedirs(settings.SNMPSIM_PROFILE_FOLDER, exist_ok=True)
+        file_name = (f"{datetime.datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}"
+                     f"{UNSAFE_NAME_CHARACTERS_RE.sub('-', request.path).rstrip('-')}.prof")
+        profiler.dump_stats(os.path.join(settings.SNMPSIM_PROFILE_FOLDER, file_name))
+        logger.info(f"cProfile statistics of the request '{request.method} {request.path}' are saved "
+                    f"into '{file_name}'")
+
+        return file_name
+
+    def __call__(self, request):
+        profile = RequestProfile(f"{request.method} {request.path}")
+        profiler = self._get_profiler(request)
+
+        start_time = time.perf_counter()
+        with activate(profile), connection.execute_wrapper(_profile_query):
+            if profiler is not None:
+                response = profiler.runcall(self.get_response, request)
+            else:
+                response = self.get_response(request)
+        duration = time.perf_counter() - start_time
+
+        response["Server-Timing"] = profile.get_server_timing(duration)
+        if profiler is not None:
+            response["X-Profile-File"] = self._save_profiler_stats(profiler, request)
+
+        if duration >= settings.SNMPSIM_SLOW_OPERATION_THRESHOLD and not getattr(request, "is_long_poll", False):
+            log_slow_operation("request", duration, request=profile.name, status=response.status_code,
+                               **profile.get_summary())
+
+        return response
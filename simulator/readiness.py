@@ -0,0 +1,84 @@
+import ipaddress
+import socket
+
+
+SYS_DESCR_OID = "1.3.6.1.2.1.1.1.0"
+PROC_NET_UDP_FILES = {
+    4: "/proc/net/udp",
+    6: "/proc/net/udp6",
+}
+
+
+def _encode_get_request(snmp_read_community, oid):
+    """
+
+    :param snmp_read_community:
+    :param oid:
+    :return: SNMPv2c GET request message
+    """
+    # pysnmp is imported by the first SNMP probe, runner is imported by every process that starts recordings
+    from pyasn1.codec.ber import encoder
+    from pysnmp.proto import api
+
+    protocol = api.protoModules[api.protoVersion2c]
+    pdu = protocol.GetRequestPDU()
+    protocol.apiPDU.setDefaults(pdu)
+    protocol.apiPDU.setVarBinds(pdu, [(oid, protocol.Null(""))])
+
+    message = protocol.Message()
+    protocol.apiMessage.setDefaults(message)
+    protocol.apiMessage.setCommunity(message, snmp_read_community)
+    protocol.apiMessage.setPDU(message, pdu)
+
+    return encoder.encode(message)
+
+
+def is_snmp_agent_ready(ip_address, port, snmp_read_community, timeout):
+    """Check that SNMP agent answers GET request for sysDescr with the given community
+
+    Request is sent over the plain connected socket: any response, even an error one, means the agent is ready,
+    while the closed port is reported by ICMP immediately instead of the timeout
+
+    :param ip_address:
+    :param port:
+    :param snmp_read_community:
+    :param timeout:
+    :return:
+    """
+    family = socket.AF_INET6 if ipaddress.ip_address(ip_address).version == 6 else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect((ip_address, int(port)))
+            sock.send(_encode_get_request(snmp_read_community, SYS_DESCR_OID))
+            return bool(sock.recv(65535))
+        except OSError:
+            return False
+
+
+def _format_proc_net_address(ip_address, port):
+    """Format address as it is shown in the /proc/net/udp(6), i.e. 127.0.0.1:161 as '0100007F:00A1'
+
+    Address is printed by the 32-bit words in the host (little-endian) byte order
+
+    :param ip_address:
+    :param port:
+    :return:
+    """
+    packed = ipaddress.ip_address(ip_address).packed
+    words = [packed[index:index + 4][::-1].hex().upper() for index in range(0, len(packed), 4)]
+
+    return f"{''.join(words)}:{port:04X}"
+
+
+def is_udp_socket_bound(ip_address, port):
+    """Check that some process bound UDP socket to the IP:port, wildcard binds are not taken into account
+
+    :param ip_address:
+    :param port:
+    :return:
+    """
+    local_address = _format_proc_net_address(ip_address, int(port))
+    with open(PROC_NET_UDP_FILES[ipaddress.ip_address(ip_address).version]) as file:
+        next(file)
+        return any(line.split(None, 2)[1] == local_address for line in file)
@@ -0,0 +1,23 @@
+from django.conf import settings
+
+from .nodes import get_snmpsim_runner
+
+
+def get_recording_usage(recording, interval=None):
+    """Get CPU and memory usage of the snmpsim daemon that serves the recording against its resource limits
+
+    Daemon serves all recordings of the endpoint, so the usage and limits are shared by them
+
+    :param recording:
+    :param interval: seconds CPU usage is measured within, SNMPSIM_USAGE_INTERVAL by default
+    :return: dict with the CPU usage and limit (% of one CPU), memory usage and limit (bytes) and communities
+        of the endpoint or None if the daemon doesn't serve the recording
+    """
+    interval = interval or settings.SNMPSIM_USAGE_INTERVAL
+    usage = get_snmpsim_runner(recording.node).get_usage(interval=interval,
+                                                         ip_address=recording.ip_address,
+                                                         port=recording.port)
+    for endpoint in usage["endpoints"]:
+        if (endpoint["ip_address"] == recording.ip_address and int(endpoint["port"]) == recording.port and
+                recording.snmp_read_community in endpoint["communities"]):
+            return endpoint
@@ -0,0 +1,178 @@
+import itertools
+
+from django.db import connection, transaction
+
+from . import snmprec
+
+
+# SQLite FTS5 table with OIDs and values of all recordings, row ID of each record is '<recording ID> << 32 | <line>',
+# so records of the recording are found and removed by the row ID range without an extra index.
+# Dots are the token characters, so each OID is a single token and its subtree is found by the token prefix.
+# File shared by several recordings (clones) is indexed once, under one of them
+CONTENT_TABLE = "simulator_recording_content"
+ROWID_SHIFT = 32
+INSERT_BATCH_SIZE = 10000
+# OIDs up to the number of arcs are found by the statistics subtrees, deeper ones by the content index
+SUBTREE_SEARCH_MAX_ARCS = snmprec.STATISTICS_SUBTREE_ARCS
+
+
+def is_supported():
+    """
+
+    :return:
+    """
+    return connection.vendor == "sqlite"
+
+
+def create_content_table(schema_editor):
+    """
+
+    :param schema_editor:
+    :return:
+    """
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {CONTENT_TABLE} "
+                              f"USING fts5(oid, value, tokenize=\"unicode61 tokenchars '.'\")")
+
+
+def drop_content_table(schema_editor):
+    """
+
+    :param schema_editor:
+    :return:
+    """
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute(f"DROP TABLE IF EXISTS {CONTENT_TABLE}")
+
+
+def _decode_value(type_tag, value):
+    """Get searchable text of the .snmprec value, non-printable hex encoded values aren't searchable
+
+    :param type_tag:
+    :param value:
+    :return:
+    """
+    if type_tag.split(b":", 1)[0].endswith(b"x"):
+        try:
+            value = bytes.fromhex(value.decode())
+        except ValueError:
+            return ""
+
+        if not value.isascii() or not value.decode().isprintable():
+            return ""
+
+    return value.decode(errors="replace")
+
+
+def _iter_content_rows(recording_id, recording_file):
+    """
+
+    :param recording_id:
+    :param recording_file: binary file object
+    :return: iterator of (row ID, OID, value)
+    """
+    for line_number, line in enumerate(recording_file):
+        line = line.rstrip(b"\r\n")
+        parts = line.split(b"|", 2)
+        if len(parts) != 3 or line.startswith(b"#"):
+            continue
+
+        oid, type_tag, value = parts
+        yield (recording_id << ROWID_SHIFT) | line_number, oid.decode(), _decode_value(type_tag, value)
+
+
+def remove_recording(recording_id):
+    """
+
+    :param recording_id:
+    :return:
+    """
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {CONTENT_TABLE} WHERE rowid BETWEEN %s AND %s",
+                       [recording_id << ROWID_SHIFT, ((recording_id + 1) << ROWID_SHIFT) - 1])
+
+
+def move_recording(recording_id, new_recording_id):
+    """Move indexed contents of the recording to the other one that shares its file
+
+    :param recording_id:
+    :param new_recording_id:
+    :return:
+    """
+    if not is_supported():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"UPDATE {CONTENT_TABLE} SET rowid = %s | (rowid & %s) WHERE rowid BETWEEN %s AND %s",
+                       [new_recording_id << ROWID_SHIFT, (1 << ROWID_SHIFT) - 1,
+                        recording_id << ROWID_SHIFT, ((recording_id + 1) << ROWID_SHIFT) - 1])
+
+
+def index_recording(recording_id, recording_file):
+    """Replace indexed contents of the recording with the records of its file
+
+    :param recording_id:
+    :param recording_file: binary file object
+    :return:
+    """
+    if not is_supported():
+        return
+
+    rows = _iter_content_rows(recording_id=recording_id, recording_file=recording_file)
+    with transaction.atomic(), connection.cursor() as cursor:
+        remove_recording(recording_id)
+        while True:
+            batch = list(itertools.islice(rows, INSERT_BATCH_SIZE))
+            if not batch:
+                break
+
+            cursor.executemany(f"INSERT INTO {CONTENT_TABLE} (rowid, oid, value) VALUES (%s, %s, %s)", batch)
+
+
+def _quote_phrase(text):
+    """
+
+    :param text:
+    :return: FTS5 phrase of the text
+    """
+    return '"{}"'.format(text.replace('"', '""'))
+
+
+def find_recordings(oid=None, value=None):
+    """Find IDs of the recordings with the OIDs in the subtree and/or the values containing the phrase
+
+    :param oid: OID of the subtree
+    :param value: phrase, e.g. the firmware version
+    :return: set of the recording IDs
+    """
+    from .models import Recording, RecordingSubtree
+
+    oid = (oid or "").strip().strip(".")
+    value = (value or "").strip()
+    if not oid and not value:
+        return set()
+
+    if oid and not value and len(oid.split(".")) <= SUBTREE_SEARCH_MAX_ARCS:
+        subtrees = RecordingSubtree.objects.filter(oid=oid) | RecordingSubtree.objects.filter(oid__gte=f"{oid}.",
+                                                                                            oid__lt=f"{oid}/")
+        return set(subtrees.values_list("recording_id", flat=True).distinct())
+
+    if not is_supported():
+        return set()
+
+    queries = []
+    if oid:
+        queries.append(f"oid : ({_quote_phrase(oid)} OR {_quote_phrase(oid + '.')}*)")
+    if value:
+        queries.append(f"value : {_quote_phrase(value)}")
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT rowid >> {ROWID_SHIFT} FROM {CONTENT_TABLE} WHERE {CONTENT_TABLE} MATCH %s",
+                       [" AND ".join(queries)])
+        recording_ids = [recording_id for recording_id, in cursor.fetchall()]
+
+    recording_files = Recording.objects.filter(pk__in=recording_ids).values("recording_file")
+    return set(Recording.objects.filter(recording_file__in=recording_files).values_list("pk", flat=True))
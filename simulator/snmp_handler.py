@@ -1,9 +1,9 @@
-from cloudshell.snmp.cloudshell_snmp import Snmp
-from cloudshell.snmp.core.domain.snmp_oid import SnmpMibObject
-from cloudshell.snmp.snmp_parameters import SNMPReadParameters
-
-
 class SNMPHandler:
+    """sysDescr discovery of the started recordings
+
+    cloudshell-snmp with the whole pysnmp stack is imported on the first use, so the admin and management
+    commands that never query recordings don't load it
+    """
     def __init__(self, ip_address, snmp_read_community, port, logger):
         """
 
@@ -11,6 +11,8 @@ class SNMPHandler:
         :param snmp_read_community:
         :param port:
         """
+        from cloudshell.snmp.snmp_parameters import SNMPReadParameters
+
         self._snmp_params = SNMPReadParameters(ip=ip_address, snmp_community=snmp_read_community, port=port)
         self._logger = logger
 
@@ -19,5 +21,8 @@ class SNMPHandler:
 
         :return:
         """
+        from cloudshell.snmp.cloudshell_snmp import Snmp
+        from cloudshell.snmp.core.domain.snmp_oid import SnmpMibObject
+
         with Snmp().get_snmp_service(snmp_parameters=self._snmp_params, logger=self._logger) as snmp_service:
             return snmp_service.get_property(SnmpMibObject("SNMPv2-MIB", "sysDescr", "0")).safe_value
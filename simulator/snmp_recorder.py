@@ -0,0 +1,285 @@
+import concurrent.futures
+import ipaddress
+import os
+import shutil
+import string
+import tempfile
+import time
+
+from django.conf import settings
+from pysnmp.hlapi import (CommunityData, ContextData, ObjectIdentity, ObjectType, SnmpEngine, Udp6TransportTarget,
+                          UdpTransportTarget, bulkCmd)
+from pysnmp.proto import rfc1902, rfc1905
+
+
+class SNMPRecordingError(Exception):
+    pass
+
+
+class SNMPRecorder:
+    """Capture MIB tree of the live device into the .snmprec file
+
+    The whole tree is split into subtrees that are walked in parallel with GETBULK requests,
+    each subtree is streamed into its own temporary file and files are concatenated in the OID order,
+    so the whole tree is never held in memory
+    """
+    MAX_SUB_IDENTIFIER = 2 ** 32 - 1
+    PRINTABLE_CHARS = set(string.printable.encode()) - set(b"\t\n\r\x0b\x0c")
+
+    SNMPREC_TYPE_TAGS = {
+        rfc1902.Integer32.tagSet: "2",
+        rfc1902.OctetString.tagSet: "4",
+        rfc1902.ObjectIdentifier.tagSet: "6",
+        rfc1902.IpAddress.tagSet: "64",
+        rfc1902.Counter32.tagSet: "65",
+        rfc1902.Gauge32.tagSet: "66",
+        rfc1902.TimeTicks.tagSet: "67",
+        rfc1902.Opaque.tagSet: "68",
+        rfc1902.Counter64.tagSet: "70",
+    }
+
+    def __init__(self, ip_address, snmp_read_community, port, logger):
+        """
+
+        :param ip_address:
+        :param snmp_read_community:
+        :param port:
+        :param logger:
+        """
+        self._ip_address = ip_address
+        self._snmp_read_community = snmp_read_community
+        self._port = port
+        self._logger = logger
+
+    def _get_transport_target(self):
+        """
+
+        :return:
+        """
+        transport_target_class = UdpTransportTarget
+        if ipaddress.ip_address(self._ip_address).version == 6:
+            transport_target_class = Udp6TransportTarget
+
+        return transport_target_class((self._ip_address, self._port),
+                                      timeout=settings.SNMPSIM_CAPTURE_TIMEOUT,
+                                      retries=settings.SNMPSIM_CAPTURE_RETRIES)
+
+    def _get_bulk(self, snmp_engine, oid, max_repetitions):
+        """Send single GETBULK request and get all variables that follow the given OID
+
+        :param snmp_engine:
+        :param oid:
+        :param max_repetitions:
+        :return: list of (OID tuple, value) or None if request failed
+        """
+        var_binds = []
+        for error_indication, error_status, error_index, row in bulkCmd(snmp_engine,
+                                                                        CommunityData(self._snmp_read_community),
+                                                                        self._get_transport_target(),
+                                                                        ContextData(),
+                                                                        0,
+                                                                        max_repetitions,
+                                                                        ObjectType(ObjectIdentity(oid)),
+                                                                        lookupMib=False,
+                                                                        maxCalls=1):
+            if error_indication or error_status:
+                self._logger.debug(f"GETBULK request for '{oid}' with max-repetitions {max_repetitions} failed: "
+                                   f"{error_indication or error_status.prettyPrint()}")
+                return
+
+            for name, value in row:
+                if isinstance(value, (rfc1905.EndOfMibView, rfc1905.NoSuchObject, rfc1905.NoSuchInstance)):
+                    return var_binds
+
+                var_binds.append((tuple(name), value))
+
+        return var_binds
+
+    def _get_next(self, snmp_engine, oid):
+        """
+
+        :param snmp_engine:
+        :param oid:
+        :return: (OID tuple, value) or None if there are no more variables
+        """
+        var_binds = self._get_bulk(snmp_engine=snmp_engine, oid=oid, max_repetitions=1)
+        if var_binds is None:
+            raise SNMPRecordingError(f"Failed to get next variable after OID '{oid}' from {self._ip_address}")
+
+        if var_binds:
+            return var_binds[0]
+
+    def _format_oid(self, oid):
+        """
+
+        :param oid:
+        :return:
+        """
+        return ".".join(map(str, oid))
+
+    def _format_record(self, oid, value):
+        """Format variable as a .snmprec line 'OID|TYPE|VALUE', non-printable values are stored hex encoded
+
+        :param oid:
+        :param value:
+        :return:
+        """
+        try:
+            type_tag = self.SNMPREC_TYPE_TAGS[value.tagSet]
+        except KeyError:
+            raise SNMPRecordingError(f"Unsupported type '{type(value).__name__}' of the OID '{self._format_oid(oid)}'")
+
+        if type_tag == "64":
+            value = ".".join(map(str, value.asNumbers()))
+        elif type_tag == "6":
+            value = self._format_oid(value.asTuple())
+        elif type_tag in ("4", "68"):
+            octets = value.asOctets()
+            if type_tag == "68" or not set(octets) <= self.PRINTABLE_CHARS:
+                type_tag = f"{type_tag}x"
+                value = octets.hex()
+            else:
+                value = octets.decode()
+        else:
+            value = int(value)
+
+        return f"{self._format_oid(oid)}|{type_tag}|{value}\n"
+
+    def _get_next_subtree_oid(self, oid):
+        """Get OID that follows all variables of the subtree
+
+        :param oid:
+        :return:
+        """
+        if len(oid) == 1:
+            # first two arcs are encoded together, so the top level arc can't be followed by the max sub-identifier
+            return oid[0] + 1, 0
+
+        return oid + (self.MAX_SUB_IDENTIFIER,)
+
+    def _discover_subtrees(self, snmp_engine, oid, depth):
+        """Find populated subtrees under the OID by skipping from one child subtree to the next one
+
+        One GETNEXT request is sent per child subtree, so discovery is cheap comparing to the walk itself
+
+        :param snmp_engine:
+        :param oid:
+        :param depth: number of arcs in OIDs of the subtrees the tree is split into
+        :return: sorted list of (subtree OID, value), value is set only if subtree is a single variable
+        """
+        subtrees = []
+        next_oid = oid
+        if len(next_oid) < 2:
+            # OID can't be shorter than two arcs
+            next_oid = (oid + (0, 0))[:2]
+
+        while True:
+            var_bind = self._get_next(snmp_engine=snmp_engine, oid=next_oid)
+            if var_bind is None or var_bind[0][:len(oid)] != oid or var_bind[0] <= next_oid:
+                break
+
+            child_oid = var_bind[0][:len(oid) + 1]
+            if var_bind[0] == child_oid:
+                subtrees.append(var_bind)
+            elif len(child_oid) < depth:
+                subtrees.extend(self._discover_subtrees(snmp_engine=snmp_engine, oid=child_oid, depth=depth))
+            else:
+                subtrees.append((child_oid, None))
+
+            next_oid = self._get_next_subtree_oid(child_oid)
+
+        return subtrees
+
+    def _walk_subtree(self, oid, output_file):
+        """Walk subtree with GETBULK requests and stream its variables into the file
+
+        max-repetitions is adapted to the device: it is doubled while responses are fast and halved
+        on slow responses, timeouts and tooBig errors
+
+        :param oid:
+        :param output_file:
+        :return: number of captured variables
+        """
+        snmp_engine = SnmpEngine()
+        max_repetitions = settings.SNMPSIM_CAPTURE_INITIAL_REPETITIONS
+        records_count = 0
+        next_oid = oid
+
+        with open(output_file, "w") as file:
+            while True:
+                request_time = time.monotonic()
+                var_binds = self._get_bulk(snmp_engine=snmp_engine, oid=next_oid, max_repetitions=max_repetitions)
+                request_time = time.monotonic() - request_time
+
+                if not var_binds:
+                    if var_binds is not None:
+                        return records_count
+
+                    if max_repetitions == 1:
+                        raise SNMPRecordingError(f"Failed to walk subtree '{self._format_oid(oid)}' "
+                                                 f"of {self._ip_address} after OID '{self._format_oid(next_oid)}'")
+                    max_repetitions = max(max_repetitions // 2, 1)
+                    continue
+
+                for var_oid, value in var_binds:
+                    if var_oid[:len(oid)] != oid:
+                        return records_count
+
+                    if var_oid <= next_oid:
+                        self._logger.warning(f"Device {self._ip_address} returned non-increasing OID "
+                                             f"'{self._format_oid(var_oid)}', stopping walk of the subtree "
+                                             f"'{self._format_oid(oid)}'")
+                        return records_count
+
+                    file.write(self._format_record(var_oid, value))
+                    records_count += 1
+                    next_oid = var_oid
+
+                if request_time > settings.SNMPSIM_CAPTURE_TARGET_RESPONSE_TIME:
+                    max_repetitions = max(max_repetitions // 2, 1)
+                elif request_time < settings.SNMPSIM_CAPTURE_TARGET_RESPONSE_TIME / 4:
+                    max_repetitions = min(max_repetitions * 2, settings.SNMPSIM_CAPTURE_MAX_REPETITIONS)
+
+    def record(self, output_file):
+        """Capture the whole MIB tree of the device into the sorted .snmprec file
+
+        :param output_file:
+        :return: number of captured variables
+        """
+        self._logger.info(f"Discovering MIB subtrees of the device {self._ip_address}:{self._port} ...")
+        snmp_engine = SnmpEngine()
+        subtrees = self._discover_subtrees(snmp_engine=snmp_engine,
+                                           oid=(),
+                                           depth=settings.SNMPSIM_CAPTURE_SPLIT_DEPTH)
+
+        self._logger.info(f"Walking {len(subtrees)} MIB subtrees of the device {self._ip_address}:{self._port} ...")
+        records_count = 0
+        start_time = time.monotonic()
+
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(output_file)) as temp_dir:
+            subtree_files = []
+            with concurrent.futures.ThreadPoolExecutor(max_workers=settings.SNMPSIM_CAPTURE_WORKERS) as executor:
+                futures = []
+                for index, (oid, value) in enumerate(subtrees):
+                    subtree_file = os.path.join(temp_dir, f"{index}.snmprec")
+                    subtree_files.append(subtree_file)
+
+                    if value is not None:
+                        with open(subtree_file, "w") as file:
+                            file.write(self._format_record(oid, value))
+                        records_count += 1
+                    else:
+                        futures.append(executor.submit(self._walk_subtree, oid=oid, output_file=subtree_file))
+
+                for future in futures:
+                    records_count += future.result()
+
+            with open(output_file, "wb") as output:
+                for subtree_file in subtree_files:
+                    with open(subtree_file, "rb") as file:
+                        shutil.copyfileobj(file, output)
+
+        self._logger.info(f"Captured {records_count} variables of the device {self._ip_address}:{self._port} "
+                          f"in {time.monotonic() - start_time:.1f} seconds")
+
+        return records_count
@@ -0,0 +1,359 @@
+import collections
+import heapq
+import ipaddress
+import itertools
+import operator
+import re
+import struct
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+
+
+class SnmprecError(Exception):
+    def __init__(self, errors):
+        """
+
+        :param errors: list of (line number, message)
+        """
+        super().__init__("\n".join(f"Line {line_number}: {message}" for line_number, message in errors))
+        self.errors = errors
+
+
+OID_RE = re.compile(rb"^[0-2](\.(0|[1-9][0-9]*))+$")
+# type tag with the optional value encoding ('x' - hex, 'e' - escaped) and variation module, e.g. '4x', '2:numeric'
+TYPE_TAG_RE = re.compile(rb"^(?P<tag>[0-9]+)(?P<encoding>[xe]?)(:(?P<variation>[\w-]+))?$")
+HEX_RE = re.compile(rb"^([0-9a-fA-F]{2})*$")
+
+MAX_SUB_IDENTIFIER = 2 ** 32 - 1
+INTEGER_RANGES = {
+    b"2": (-2 ** 31, 2 ** 31 - 1),
+    b"65": (0, 2 ** 32 - 1),
+    b"66": (0, 2 ** 32 - 1),
+    b"67": (0, 2 ** 32 - 1),
+    b"70": (0, 2 ** 64 - 1),
+}
+OCTET_STRING_TAGS = {b"4", b"68"}
+# statistics are collected by the subtrees of the number of arcs, 7 splits the tree into 1.3.6.1.2.1.X MIB-2 groups
+# and 1.3.6.1.4.1.X enterprises
+STATISTICS_SUBTREE_ARCS = 7
+IF_INDEX_OID = b"1.3.6.1.2.1.2.2.1.1."
+SYS_NAME_OID = "1.3.6.1.2.1.1.5.0"
+IP_ADDRESS_TAG = b"64"
+EMPTY_VALUE_TAGS = {b"5", b"128", b"129", b"130"}
+
+
+def get_oid_key(oid):
+    """Encode OID so the encoded OIDs are compared in the OID order and take little memory
+
+    :param oid: dotted OID bytes
+    :return:
+    """
+    arcs = oid.split(b".")
+    return struct.pack(f">{len(arcs)}I", *map(int, arcs))
+
+
+def get_subtree(oid):
+    """
+
+    :param oid: dotted OID bytes
+    :return: OID of the statistics subtree the OID belongs to
+    """
+    return b".".join(oid.split(b".", STATISTICS_SUBTREE_ARCS)[:STATISTICS_SUBTREE_ARCS]).decode()
+
+
+def get_line_key(line):
+    """
+
+    :param line: .snmprec line
+    :return:
+    """
+    return get_oid_key(line.split(b"|", 1)[0])
+
+
+def _validate_value(tag, encoding, value):
+    """
+
+    :param tag:
+    :param encoding:
+    :param value:
+    :return: error message or None
+    """
+    if encoding == b"x":
+        if tag not in OCTET_STRING_TAGS and tag != b"64":
+            return f"hex encoding isn't supported by the type '{tag.decode()}'"
+
+        if not HEX_RE.match(value):
+            return f"invalid hex value '{value.decode(errors='replace')}'"
+
+        if tag == b"64" and len(value) != 8:
+            return f"invalid IP address '{value.decode()}'"
+
+    elif tag in INTEGER_RANGES:
+        try:
+            number = int(value)
+        except ValueError:
+            return f"invalid integer value '{value.decode(errors='replace')}'"
+
+        min_value, max_value = INTEGER_RANGES[tag]
+        if not min_value <= number <= max_value:
+            return f"value {number} is out of range of the type '{tag.decode()}'"
+
+    elif tag == b"64":
+        try:
+            ipaddress.IPv4Address(value.decode())
+        except (UnicodeDecodeError, ValueError):
+            return f"invalid IP address '{value.decode(errors='replace')}'"
+
+    elif tag == b"6":
+        if not OID_RE.match(value):
+            return f"invalid OID value '{value.decode(errors='replace')}'"
+
+    elif tag in EMPTY_VALUE_TAGS:
+        if value:
+            return f"value of the type '{tag.decode()}' must be empty"
+
+    elif tag not in OCTET_STRING_TAGS:
+        return f"unknown type '{tag.decode()}'"
+
+
+def parse_line(line):
+    """Validate OID, type tag and value of the .snmprec line 'OID|TAG|VALUE'
+
+    Values of the variation modules ('TAG:module') are checked by the modules themselves, so they aren't validated
+
+    :param line: line without the line break
+    :return: OID key of the line
+    :raises ValueError: with the description of the malformed line
+    """
+    parts = line.split(b"|", 2)
+    if len(parts) != 3:
+        raise ValueError("line must be in the 'OID|TYPE|VALUE' format")
+
+    oid, type_tag, value = parts
+    if not OID_RE.match(oid):
+        raise ValueError(f"invalid OID '{oid.decode(errors='replace')}'")
+
+    try:
+        oid_key = get_oid_key(oid)
+    except struct.error:
+        raise ValueError(f"OID '{oid.decode()}' sub-identifier is out of range")
+
+    match = TYPE_TAG_RE.match(type_tag)
+    if not match:
+        raise ValueError(f"invalid type '{type_tag.decode(errors='replace')}'")
+
+    if not match.group("variation"):
+        error = _validate_value(tag=match.group("tag"), encoding=match.group("encoding"), value=value)
+        if error is not None:
+            raise ValueError(error)
+
+    return oid_key
+
+
+def _write_chunk(chunk, chunks_dir):
+    """
+
+    :param chunk: list of (OID key, line)
+    :param chunks_dir:
+    :return: path of the file with the sorted chunk
+    """
+    chunk.sort(key=operator.itemgetter(0))
+    with tempfile.NamedTemporaryFile(dir=chunks_dir, suffix=".snmprec", delete=False) as file:
+        file.writelines(line for key, line in chunk)
+
+    return file.name
+
+
+def sort_recording_file(input_file, output_file, chunk_size, max_errors, temp_dir=None):
+    """Validate lines of the .snmprec file and sort them in the OID order with the external merge sort
+
+    Lines are read in chunks of about 'chunk_size' bytes, each chunk is sorted in memory and stored into the temporary
+    file, then all chunks are merged, so memory use doesn't depend on the file size.
+    Empty and comment ('#') lines are dropped, only the last line of the duplicated OIDs is kept
+
+    :param input_file: binary file object
+    :param output_file: binary file object
+    :param chunk_size:
+    :param max_errors: number of malformed lines collected before the validation stops
+    :param temp_dir: directory for the sorted chunks, the default temporary directory if not set
+    :return: (number of written records, number of dropped duplicates)
+    """
+    errors = []
+    with tempfile.TemporaryDirectory(dir=temp_dir) as chunks_dir:
+        chunk_files = []
+        chunk = []
+        chunk_length = 0
+
+        for line_number, line in enumerate(input_file, start=1):
+            line = line.rstrip(b"\r\n")
+            if not line.strip() or line.startswith(b"#"):
+                continue
+
+            try:
+                oid_key = parse_line(line)
+            except ValueError as e:
+                errors.append((line_number, str(e)))
+                if len(errors) >= max_errors:
+                    break
+                continue
+
+            if errors:
+                continue
+
+            chunk.append((oid_key, line + b"\n"))
+            chunk_length += len(line)
+            if chunk_length >= chunk_size:
+                chunk_files.append(_write_chunk(chunk, chunks_dir))
+                chunk = []
+                chunk_length = 0
+
+        if errors:
+            raise SnmprecError(errors)
+
+        chunk.sort(key=operator.itemgetter(0))
+        files = [open(chunk_file, "rb") for chunk_file in chunk_files]
+        try:
+            records_count = duplicates_count = 0
+            # merge is stable, so the lines of the same OID follow in the order of the original file
+            merged_lines = heapq.merge(*[((get_line_key(line), line) for line in file) for file in files], chunk,
+                                       key=operator.itemgetter(0))
+            for key, lines in itertools.groupby(merged_lines, key=operator.itemgetter(0)):
+                lines = list(lines)
+                output_file.write(lines[-1][1])
+                records_count += 1
+                duplicates_count += len(lines) - 1
+        finally:
+            for file in files:
+                file.close()
+
+    return records_count, duplicates_count
+
+
+def get_recording_statistics(recording_file):
+    """Collect statistics of the .snmprec file in one streaming pass
+
+    :param recording_file: binary file object
+    :return: dict with the OIDs count, file size, interfaces count (ifIndex entries) and OIDs count by the subtrees
+    """
+    oids_count = file_size = interfaces_count = 0
+    subtrees = collections.Counter()
+
+    for line in recording_file:
+        file_size += len(line)
+        if not line.strip() or line.startswith(b"#"):
+            continue
+
+        oid = line.split(b"|", 1)[0]
+        oids_count += 1
+        subtrees[get_subtree(oid)] += 1
+        if oid.startswith(IF_INDEX_OID):
+            interfaces_count += 1
+
+    return {
+        "oids_count": oids_count,
+        "file_size": file_size,
+        "interfaces_count": interfaces_count,
+        "subtrees": subtrees,
+    }
+
+
+def sort_uploaded_recording(uploaded_file):
+    """Validate and sort uploaded .snmprec file into the temporary file that is removed when it is closed
+
+    :param uploaded_file:
+    :return:
+    """
+    sorted_file = File(tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR), name=uploaded_file.name)
+    try:
+        uploaded_file.seek(0)
+        sort_recording_file(input_file=uploaded_file,
+                            output_file=sorted_file,
+                            chunk_size=settings.SNMPSIM_RECORDING_SORT_CHUNK_SIZE,
+                            max_errors=settings.SNMPSIM_RECORDING_MAX_ERRORS,
+                            temp_dir=settings.FILE_UPLOAD_TEMP_DIR)
+    except Exception:
+        sorted_file.close()
+        raise
+
+    sorted_file.seek(0)
+
+    return sorted_file
+
+
+def parse_overlay(overlay):
+    """Validate overlay records of the recording, they are in the .snmprec format too
+
+    :param overlay: text with the 'OID|TAG|VALUE' lines
+    :return: dict of OID key -> line, the last line of the duplicated OIDs is kept
+    :raises SnmprecError: with the malformed lines
+    """
+    records = {}
+    errors = []
+    for line_number, line in enumerate(overlay.encode().splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith(b"#"):
+            continue
+
+        try:
+            records[parse_line(line)] = line + b"\n"
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+
+    if errors:
+        raise SnmprecError(errors)
+
+    return records
+
+
+def apply_overlay(recording_file, overlay, output_file):
+    """Write records of the sorted .snmprec file replaced or extended by the overlay records, in the OID order
+
+    :param recording_file: binary file object
+    :param overlay: text with the 'OID|TAG|VALUE' lines
+    :param output_file: binary file object
+    :return:
+    """
+    overlay_records = sorted(parse_overlay(overlay).items())
+    index = 0
+    for line in recording_file:
+        if not line.strip() or line.startswith(b"#"):
+            continue
+
+        key = get_line_key(line)
+        while index < len(overlay_records) and overlay_records[index][0] < key:
+            output_file.write(overlay_records[index][1])
+            index += 1
+
+        if index < len(overlay_records) and overlay_records[index][0] == key:
+            output_file.write(overlay_records[index][1])
+            index += 1
+        else:
+            output_file.write(line.rstrip(b"\r\n") + b"\n")
+
+    output_file.writelines(line for key, line in overlay_records[index:])
+
+
+def find_ip_address_records(recording_file, ip_address):
+    """Find records with the IP address value, e.g. ipAdEntAddr of the device the recording was captured from
+
+    :param recording_file: binary file object
+    :param ip_address:
+    :return: list of (OID, type tag)
+    """
+    ip_address = ip_address.encode()
+    hex_ip_address = ipaddress.IPv4Address(ip_address.decode()).packed.hex().encode()
+    records = []
+    for line in recording_file:
+        parts = line.rstrip(b"\r\n").split(b"|", 2)
+        if len(parts) != 3 or line.startswith(b"#"):
+            continue
+
+        oid, type_tag, value = parts
+        if type_tag in OCTET_STRING_TAGS | {IP_ADDRESS_TAG} and value == ip_address:
+            records.append((oid.decode(), type_tag.decode()))
+        elif type_tag == IP_ADDRESS_TAG + b"x" and value.lower() == hex_ip_address:
+            records.append((oid.decode(), IP_ADDRESS_TAG.decode()))
+
+    return records
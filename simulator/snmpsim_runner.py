@@ -1,45 +1,437 @@
+import abc
+import collections
+import contextlib
+import datetime
+import fcntl
+import glob
+import grp
+import ipaddress
+import json
 import logging
 import os
+import pwd
+import re
+import shlex
 import shutil
 import subprocess
+import threading
+import time
 
 from django.conf import settings
 
+from . import network, profiling, readiness, snmprec
+
 
 logger = logging.getLogger(__name__)
 
 
-class SNMPSimOSCommandRunner:
-    def __init__(self):
-        logger.info(f"Creating directory '{settings.SNMPSIM_DAEMON_FOLDER}' for the snmpsim daemon...")
-        os.makedirs(settings.SNMPSIM_DAEMON_FOLDER, exist_ok=True)
-        shutil.chown(path=settings.SNMPSIM_DAEMON_FOLDER, user=settings.SNMPSIM_USER, group=settings.SNMPSIM_GROUP)
+class SNMPSimNotReadyError(Exception):
+    """snmpsim daemon was started, but doesn't answer on the endpoint in SNMPSIM_READINESS_TIMEOUT seconds"""
+
+
+class SNMPSimRunner(abc.ABC):
+    """Interface of the runners that start and stop snmpsim recordings, local one is selected by SNMPSIM_RUNNER"""
+
+    @abc.abstractmethod
+    def start(self, recording_file, ip_address, port, snmp_read_community, wait_ready=True, overlay="",
+              response_profile=None, resource_limits=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def wait_ready(self, ip_address, port, snmp_read_community):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set_response_profile(self, ip_address, port, response_profile):
+        raise NotImplementedError
+
+    def prepare_ip_address(self, ip_address):
+        """Only the local runners prepare IP addresses, for the on-demand listener
+
+        :param ip_address:
+        :return:
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stop(self, recording_file, ip_address, port, snmp_read_community, remove_sub_iface=False):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def remove_recording_file(self, recording_file):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_log(self, ip_address, port, lines):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_status(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_activity(self):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_traffic(self, bucket_size):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_usage(self, interval, ip_address=None, port=None):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stop_all(self):
+        raise NotImplementedError
+
+
+class SNMPSimOSCommandRunner(SNMPSimRunner):
+    ENDPOINTS_FOLDER = "endpoints"
+    # data file types snmpsim serves, the recording is linked into the endpoint folder as '<community>.<type>'
+    DATA_FILE_EXTENSIONS = (".snmprec", ".snmpwalk", ".sapwalk", ".dump", ".MVC")
+    LOGS_FOLDER = "logs"
+    PIDS_FOLDER = "pids"
+    IFACE_NAME_SIZE = 16
+    # snmpsim logs the recording (community) selected for each request on the 'info' log level
+    REQUEST_LOG_LINE_RE = re.compile(rb'^(?P<time>\S+) snmpsimd: Using .* community name "(?P<community>.*)" ?$')
+    REQUEST_LOG_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+    LOG_BLOCK_SIZE = 64 * 1024
+    # var-binds of each request and response are logged on the 'info' log level too, so requests are counted
+    # by the PDU type: NEXT flag is logged once for GETNEXT and for each repetition of GETBULK
+    REQUEST_VAR_BINDS_LOG_LINE_RE = re.compile(
+        rb'^\S+ snmpsimd: Request var-binds: (?P<var_binds>.*), flags: (?P<next>NEXT|EXACT), (?P<set>SET|GET) ?$')
+    RESPONSE_VAR_BINDS_LOG_LINE_RE = re.compile(rb'^\S+ snmpsimd: Response var-binds: ')
+    ERROR_LOG_LINE_RE = re.compile(rb'^\S+ snmpsimd: ERROR ')
+    VAR_BIND_OID_RE = re.compile(rb'(?:^|, )(?P<oid>[\d.]+)=<')
+    # noSuchObject and noSuchInstance values, endOfMibView ends each walk, so it isn't counted as the error
+    ERROR_VALUES = (b"=<No Such Object currently exists at this OID>",
+                    b"=<No Such Instance currently exists at this OID>")
+    # last request of the log is counted by the next call until its response is logged or it's older
+    TRAFFIC_RESPONSE_GRACE = 5
+    # snmpsim keeps the number of the rotated logs ('<log>.1' is the newest one)
+    LOG_BACKUP_COUNT = 30
+    # logs are identified by the inode and the beginning, as inodes of the removed logs are reused
+    LOG_HEAD_SIZE = 256
+    TRAFFIC_FOLDER = "traffic"
+    PROFILES_FOLDER = "profiles"
+    # responses of the endpoints with the response profile are delayed and dropped by the netem qdisc of their own
+    # class under the root HTB qdisc of the interface, class 1 is the default one of the other traffic
+    TRAFFIC_CLASS_RANGE = range(2, 0x10000)
+    # marks the root HTB qdisc added by the runner, so only it is removed
+    ROOT_QDISC_FILE = "root_qdisc"
+    # root qdisc of the interface that isn't configured (handle '0:') is the kernel default one
+    ROOT_QDISC_RE = re.compile(rb"^qdisc (?P<kind>\S+) (?P<handle>[0-9a-f]+:) root")
+    # IFF_LOOPBACK flag of the interface in /sys/class/net/<interface>/flags
+    LOOPBACK_IFACE_FLAG = 0x8
+    LIMITS_FOLDER = "limits"
+    # daemons with the resource limits run in the cgroups of their endpoints under this one
+    CGROUP_NAME = "snmpsim"
+    CGROUP_CONTROLLERS = ("cpu", "memory")
+
+    def __init__(self, daemon_folder=None):
+        """
+
+        :param daemon_folder: folder for the endpoints data, logs and PID files of the snmpsim daemons,
+            SNMPSIM_DAEMON_FOLDER by default
+        """
+        self._daemon_folder = daemon_folder or settings.SNMPSIM_DAEMON_FOLDER
+        self._shaping_lock = threading.Lock()
+
+        for folder in (self._daemon_folder,
+                       os.path.join(self._daemon_folder, self.LOGS_FOLDER),
+                       os.path.join(self._daemon_folder, self.PIDS_FOLDER),
+                       os.path.join(self._daemon_folder, self.TRAFFIC_FOLDER),
+                       os.path.join(self._daemon_folder, self.PROFILES_FOLDER),
+                       os.path.join(self._daemon_folder, self.LIMITS_FOLDER)):
+            logger.info(f"Creating directory '{folder}' for the snmpsim daemon...")
+            os.makedirs(folder, exist_ok=True)
+            self._chown(folder)
+
+        self._enable_secondary_addresses_promotion()
+
+    def _get_endpoint_key(self, ip_address, port):
+        """Get name of the files and directories of the IP:port endpoint, e.g. '10.0.0.5_161' or 'fd00-73--5_161'
+
+        Colons of the IPv6 address are replaced, as snmpsim splits the log file option by them
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return f"{ip_address.replace(':', '-')}_{port}"
+
+    def _parse_endpoint_key(self, endpoint_key):
+        """
+
+        :param endpoint_key:
+        :return: (IP, port) of the endpoint
+        """
+        ip_address, port = endpoint_key.rsplit("_", 1)
+        return ip_address.replace("-", ":"), int(port)
+
+    def _get_endpoint_dir(self, ip_address, port):
+        """Get data directory of the snmpsim daemon that serves given IP:port endpoint
+
+        Each recording on the endpoint is linked into this directory as '<community>.<ext>',
+        so snmpsim selects the recording by the SNMP community name of the request
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.ENDPOINTS_FOLDER,
+                            self._get_endpoint_key(ip_address=ip_address, port=port))
+
+    def _get_endpoint_log_file(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.LOGS_FOLDER,
+                            f"{self._get_endpoint_key(ip_address=ip_address, port=port)}.log")
+
+    def _get_endpoint_pid_file(self, ip_address, port):
+        """
 
-    def _prepare_start_command(self, recording_file, ip_address, port, snmp_read_community):
+        :param ip_address:
+        :param port:
+        :return:
         """
+        return os.path.join(self._daemon_folder, self.PIDS_FOLDER,
+                            f"{self._get_endpoint_key(ip_address=ip_address, port=port)}.pid")
+
+    def _get_endpoint_traffic_position_file(self, ip_address, port):
+        """Get file with the position in the endpoint log the traffic was counted up to
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.TRAFFIC_FOLDER,
+                            f"{self._get_endpoint_key(ip_address=ip_address, port=port)}.json")
+
+    def _get_endpoint_profile_file(self, ip_address, port):
+        """Get file with the response profile of the endpoint and its traffic class
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.PROFILES_FOLDER,
+                            f"{self._get_endpoint_key(ip_address=ip_address, port=port)}.json")
+
+    def _read_endpoint_profile(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return: response profile of the endpoint, empty if it isn't set
+        """
+        try:
+            with open(self._get_endpoint_profile_file(ip_address=ip_address, port=port)) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _lock_profiles(self):
+        """Serialize changes of the profiles and shaping of the endpoints
+
+        Traffic classes are allocated by the profiles of all endpoints, which are started concurrently
+        by the threads of this runner and by the other processes of the host (e.g. the on-demand listener),
+        so they are locked by the runner and by the lock file of the profiles folder
+
+        :return:
+        """
+        lock_path = os.path.join(self._daemon_folder, self.PROFILES_FOLDER, ".lock")
+        with self._shaping_lock, open(lock_path, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def _write_endpoint_profile(self, ip_address, port, response_profile):
+        """Save response profile of the endpoint, its traffic class is kept
+
+        :param ip_address:
+        :param port:
+        :param response_profile:
+        :return: previous response profile of the endpoint
+        """
+        with self._lock_profiles():
+            old_profile = self._read_endpoint_profile(ip_address=ip_address, port=port)
+            with open(self._get_endpoint_profile_file(ip_address=ip_address, port=port), "w") as file:
+                json.dump({**(response_profile or {}), "traffic_class": old_profile.get("traffic_class")}, file)
+
+        return old_profile
+
+    def _get_endpoint_limits_file(self, ip_address, port):
+        """Get file with the resource limits of the endpoint, they are applied on each start of its daemon
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.LIMITS_FOLDER,
+                            f"{self._get_endpoint_key(ip_address=ip_address, port=port)}.json")
+
+    def _read_endpoint_limits(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return: resource limits of the endpoint, empty if they aren't set
+        """
+        try:
+            with open(self._get_endpoint_limits_file(ip_address=ip_address, port=port)) as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_endpoint_limits(self, ip_address, port, resource_limits):
+        """
+
+        :param ip_address:
+        :param port:
+        :param resource_limits:
+        :return:
+        """
+        with open(self._get_endpoint_limits_file(ip_address=ip_address, port=port), "w") as file:
+            json.dump(resource_limits or {}, file)
+
+    def _get_endpoint_communities(self, ip_address, port):
+        """Get SNMP communities of all recordings linked into the endpoint data directory
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        endpoint_dir = self._get_endpoint_dir(ip_address=ip_address, port=port)
+        try:
+            return [os.path.splitext(file_name)[0] for file_name in os.listdir(endpoint_dir)]
+        except FileNotFoundError:
+            return []
+
+    def _link_recording_file(self, recording_file, ip_address, port, snmp_read_community, overlay=""):
+        """Link recording file into the endpoint data directory
+
+        Recording with the overlay is written there merged with its overlay records instead,
+        so the shared file is never changed
 
         :param recording_file:
         :param ip_address:
         :param port:
         :param snmp_read_community:
+        :param overlay:
         :return:
         """
+        endpoint_dir = self._get_endpoint_dir(ip_address=ip_address, port=port)
+        os.makedirs(endpoint_dir, exist_ok=True)
+        self._chown(endpoint_dir)
+
+        self._unlink_recording_file(ip_address=ip_address, port=port, snmp_read_community=snmp_read_community)
+        link_path = os.path.join(endpoint_dir, f"{snmp_read_community}{os.path.splitext(recording_file)[1]}")
+        if not overlay:
+            os.symlink(recording_file, link_path)
+            return
+
+        with open(recording_file, "rb") as input_file, open(link_path, "wb") as output_file:
+            snmprec.apply_overlay(recording_file=input_file, overlay=overlay, output_file=output_file)
+        self._chown(link_path)
+
+    def _unlink_recording_file(self, ip_address, port, snmp_read_community):
+        """
+
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :return:
+        """
+        endpoint_dir = self._get_endpoint_dir(ip_address=ip_address, port=port)
+        # community can contain dots, so the other communities can't be matched by the '<community>.*' pattern
+        for extension in self.DATA_FILE_EXTENSIONS:
+            try:
+                os.unlink(os.path.join(endpoint_dir, f"{snmp_read_community}{extension}"))
+            except FileNotFoundError:
+                pass
+
+    def _get_agent_endpoint_option(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        if ipaddress.ip_address(ip_address).version == 6:
+            return f"--agent-udpv6-endpoint=[{ip_address}]:{port}"
+
+        return f"--agent-udpv4-endpoint={ip_address}:{port}"
+
+    def _get_process_options(self):
+        """Get options with the user and group snmpsim daemon drops its privileges to
+
+        :return:
+        """
+        return [f"--process-user={settings.SNMPSIM_USER}",
+                f"--process-group={settings.SNMPSIM_GROUP}"]
+
+    def _prepare_start_command(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        max_var_binds = self._read_endpoint_profile(ip_address=ip_address, port=port).get("max_var_binds")
         return [settings.SNMPSIM_SCRIPT_PATH,
-                f"--process-user={settings.SNMPSIM_USER}",
-                f"--process-group={settings.SNMPSIM_GROUP}",
-                f"--data-dir={os.path.dirname(recording_file)}",
-                f"--agent-udpv4-endpoint={ip_address}:{port}",
+                *self._get_process_options(),
+                f"--data-dir={self._get_endpoint_dir(ip_address=ip_address, port=port)}",
+                self._get_agent_endpoint_option(ip_address=ip_address, port=port),
                 f"--v2c-arch",
-                f"--v2c-community={snmp_read_community}",
+                *([f"--max-varbinds={max_var_binds}"] if max_var_binds else []),
+                f"--logging-method=file:{self._get_endpoint_log_file(ip_address=ip_address, port=port)}"
+                f":{settings.SNMPSIM_DAEMON_LOG_MAX_SIZE}",
+                f"--log-level={settings.SNMPSIM_DAEMON_LOG_LEVEL}",
+                f"--pid-file={self._get_endpoint_pid_file(ip_address=ip_address, port=port)}",
                 f"--daemonize"]
 
     def _generate_sub_interface_name(self, ip_address):
+        """Generate label of the sub interface from the unique number of the IP address in the configured networks
+
+        :param ip_address:
+        :return: label or None if it can't be assigned (IPv6 address, address outside of the networks, too long name)
+        """
+        ip_address_index = network.get_ip_address_index(ip_address)
+        if ip_address_index is None:
+            return
+
+        sub_interface_name = f"{settings.SNMPSIM_IFACE_NAME}:{ip_address_index}"
+        if len(sub_interface_name) < self.IFACE_NAME_SIZE:
+            return sub_interface_name
+
+    def _get_interface_address(self, ip_address):
         """
 
         :param ip_address:
         :return:
         """
-        return f"{settings.SNMPSIM_IFACE_NAME}:{ip_address.split('.')[-1]}"
+        return f"{ip_address}/{network.get_ip_address_prefix_length(ip_address)}"
+
+    def _enable_secondary_addresses_promotion(self):
+        """Keep other addresses of the network on the interface when its primary address is removed
+
+        :return:
+        """
+        try:
+            output = subprocess.check_output(["sysctl",
+                                              "-w",
+                                              f"net.ipv4.conf.{settings.SNMPSIM_IFACE_NAME}.promote_secondaries=1"],
+                                             stderr=subprocess.STDOUT)
+            logger.info(f"Command output: {output}")
+        except (OSError, subprocess.CalledProcessError):
+            logger.warning(f"Failed to enable promotion of the secondary addresses on the interface "
+                           f"'{settings.SNMPSIM_IFACE_NAME}'", exc_info=True)
 
     def _create_sub_interface(self, ip_address):
         """
@@ -48,12 +440,29 @@ class SNMPSimOSCommandRunner:
         :return:
         """
         logger.info(f"Creating interface for the IP '{ip_address}' ...")
-        output = subprocess.check_output(["ifconfig",
-                                          self._generate_sub_interface_name(ip_address),
-                                          f"{ip_address}/24"])
+        command = ["ip", "address", "replace", self._get_interface_address(ip_address),
+                   "dev", settings.SNMPSIM_IFACE_NAME]
+
+        if ipaddress.ip_address(ip_address).version == 6:
+            # skip Duplicate Address Detection, otherwise the address can't be bound while it is tentative
+            command.append("nodad")
+        else:
+            sub_interface_name = self._generate_sub_interface_name(ip_address)
+            if sub_interface_name is not None:
+                command.extend(["label", sub_interface_name])
+
+        output = subprocess.check_output(command)
 
         logger.info(f"Command output: {output}")
 
+    def prepare_ip_address(self, ip_address):
+        """Make the IP address local, so endpoints on it can be bound before the recording is started
+
+        :param ip_address:
+        :return:
+        """
+        self._create_sub_interface(ip_address)
+
     def _remove_sub_interface(self, ip_address):
         """
 
@@ -62,44 +471,562 @@ class SNMPSimOSCommandRunner:
         """
         logger.info(f"Removing interface for the IP '{ip_address}' ...")
         try:
-            output = subprocess.check_output(["ifconfig",
-                                              self._generate_sub_interface_name(ip_address),
-                                              "down"],
+            output = subprocess.check_output(["ip",
+                                              "address",
+                                              "del",
+                                              self._get_interface_address(ip_address),
+                                              "dev",
+                                              settings.SNMPSIM_IFACE_NAME],
                                              stderr=subprocess.STDOUT)
             logger.info(f"Command output: {output}")
         except subprocess.CalledProcessError:
             logger.info(f"Failed to remove interface for IP '{ip_address}'", exc_info=True)
 
-    def _chown_recording_file(self, recording_file):
+    def _run_tc(self, *args, check=True):
         """
 
-        :param recording_file:
+        :param args: arguments of the 'tc' command
+        :param check: raise error if the command failed
         :return:
         """
-        shutil.chown(path=recording_file, user=settings.SNMPSIM_USER, group=settings.SNMPSIM_GROUP)
+        try:
+            output = subprocess.check_output(["tc", *args], stderr=subprocess.STDOUT)
+            logger.info(f"Command output: {output}")
+        except subprocess.CalledProcessError as e:
+            if check:
+                raise
+            logger.info(f"Command 'tc {' '.join(args)}' failed: {e.output}")
 
-    def start(self, recording_file, ip_address, port, snmp_read_community):
+    def _get_root_qdisc_file(self):
         """
 
-        :param recording_file:
+        :return:
+        """
+        return os.path.join(self._daemon_folder, self.PROFILES_FOLDER, self.ROOT_QDISC_FILE)
+
+    def _is_loopback_interface(self):
+        """
+
+        :return: True if SNMPSIM_IFACE_NAME is the loopback interface
+        """
+        try:
+            with open(f"/sys/class/net/{settings.SNMPSIM_IFACE_NAME}/flags") as file:
+                return bool(int(file.read(), 16) & self.LOOPBACK_IFACE_FLAG)
+        except (OSError, ValueError):
+            return settings.SNMPSIM_IFACE_NAME == "lo"
+
+    def _get_root_qdisc(self):
+        """
+
+        :return: (kind, handle) of the root qdisc of the interface or None
+        """
+        output = subprocess.check_output(["tc", "qdisc", "show", "dev", settings.SNMPSIM_IFACE_NAME, "root"])
+        match = self.ROOT_QDISC_RE.match(output)
+        if match is None:
+            return None
+
+        return match.group("kind").decode(), match.group("handle").decode()
+
+    def _add_root_qdisc(self):
+        """Add HTB qdisc the traffic classes of the endpoints are attached to, if the interface doesn't have it yet
+
+        Root qdisc configured on the interface by the operator isn't replaced, unless
+        SNMPSIM_SHAPING_REPLACE_ROOT_QDISC allows it. Loopback interface isn't shaped, unless
+        SNMPSIM_SHAPING_ALLOW_LOOPBACK allows it, as all local connections of the host would pass the HTB qdisc
+
+        :return:
+        :raises ValueError: if the interface has the other root qdisc or it's the loopback one
+        """
+        if not settings.SNMPSIM_SHAPING_ALLOW_LOOPBACK and self._is_loopback_interface():
+            raise ValueError(f"Interface '{settings.SNMPSIM_IFACE_NAME}' is the loopback one, responses can't be "
+                             f"shaped unless SNMPSIM_SHAPING_ALLOW_LOOPBACK is enabled")
+
+        root_qdisc = self._get_root_qdisc()
+        if root_qdisc == ("htb", "1:") and os.path.exists(self._get_root_qdisc_file()):
+            return
+
+        if root_qdisc is not None and root_qdisc[1] != "0:" and not settings.SNMPSIM_SHAPING_REPLACE_ROOT_QDISC:
+            raise ValueError(f"Interface '{settings.SNMPSIM_IFACE_NAME}' has the root qdisc '{' '.join(root_qdisc)}', "
+                             f"responses can't be shaped unless SNMPSIM_SHAPING_REPLACE_ROOT_QDISC is enabled")
+
+        # marker is written first, so the qdisc is removed with the last endpoint even if it's added partially
+        with open(self._get_root_qdisc_file(), "w"):
+            pass
+
+        logger.info(f"Adding HTB qdisc to the interface '{settings.SNMPSIM_IFACE_NAME}' ...")
+        self._run_tc("qdisc", "replace", "dev", settings.SNMPSIM_IFACE_NAME, "root", "handle", "1:", "htb",
+                     "default", "1")
+        self._run_tc("class", "replace", "dev", settings.SNMPSIM_IFACE_NAME, "parent", "1:", "classid", "1:1", "htb",
+                     "rate", settings.SNMPSIM_SHAPING_RATE)
+
+    def _get_used_traffic_classes(self):
+        """
+
+        :return: set of the traffic classes of the endpoints
+        """
+        used_classes = set()
+        for profile_file in glob.glob(os.path.join(self._daemon_folder, self.PROFILES_FOLDER, "*.json")):
+            try:
+                with open(profile_file) as file:
+                    used_classes.add(json.load(file).get("traffic_class"))
+            except (FileNotFoundError, ValueError):
+                continue
+
+        used_classes.discard(None)
+        return used_classes
+
+    def _allocate_traffic_class(self):
+        """
+
+        :return: traffic class that isn't used by the other endpoints
+        """
+        used_classes = self._get_used_traffic_classes()
+        for traffic_class in self.TRAFFIC_CLASS_RANGE:
+            if traffic_class not in used_classes:
+                return traffic_class
+
+        raise ValueError("All traffic classes of the interface are used")
+
+    def _add_endpoint_shaping(self, ip_address, port, traffic_class, response_profile):
+        """Delay and drop responses of the endpoint with the netem qdisc of its traffic class, responses are
+        matched by the source IP and port, so requests to the endpoint aren't affected
+
         :param ip_address:
         :param port:
-        :param snmp_read_community:
+        :param traffic_class:
+        :param response_profile:
         :return:
         """
-        self._create_sub_interface(ip_address)
-        self._chown_recording_file(recording_file)
+        class_id = f"1:{traffic_class:x}"
+        netem_options = ["limit", str(settings.SNMPSIM_SHAPING_QUEUE_LIMIT),
+                         "delay", f"{response_profile.get('response_delay') or 0}ms"]
+        if response_profile.get("response_jitter"):
+            netem_options.append(f"{response_profile['response_jitter']}ms")
+            # jitter is uniform without the distribution table
+            if response_profile.get("jitter_distribution", "uniform") != "uniform":
+                netem_options.extend(["distribution", response_profile["jitter_distribution"]])
+        if response_profile.get("drop_rate"):
+            netem_options.extend(["loss", f"{response_profile['drop_rate']}%"])
 
-        logger.info(f"Starting snmpsim recording '{recording_file}' on {ip_address}:{port} ...")
-        output = subprocess.check_output(self._prepare_start_command(recording_file=recording_file,
-                                                                     ip_address=ip_address,
-                                                                     port=port,
-                                                                     snmp_read_community=snmp_read_community))
+        protocol, match, prefix_length = (("ipv6", "ip6", 128) if ipaddress.ip_address(ip_address).version == 6
+                                          else ("ip", "ip", 32))
+
+        self._add_root_qdisc()
+        self._run_tc("class", "replace", "dev", settings.SNMPSIM_IFACE_NAME, "parent", "1:", "classid", class_id,
+                     "htb", "rate", settings.SNMPSIM_SHAPING_RATE)
+        self._run_tc("qdisc", "replace", "dev", settings.SNMPSIM_IFACE_NAME, "parent", class_id,
+                     "handle", f"{traffic_class:x}:", "netem", *netem_options)
+        # filter priority is the traffic class, so the filter is replaced and removed with it
+        self._run_tc("filter", "del", "dev", settings.SNMPSIM_IFACE_NAME, "parent", "1:", "prio", str(traffic_class),
+                     check=False)
+        self._run_tc("filter", "add", "dev", settings.SNMPSIM_IFACE_NAME, "parent", "1:", "protocol", protocol,
+                     "prio", str(traffic_class), "u32", "match", match, "src", f"{ip_address}/{prefix_length}",
+                     "match", match, "sport", str(port), "0xffff", "flowid", class_id)
+
+    def _remove_endpoint_filter(self, traffic_class):
+        """Pass responses of the endpoint through the default class, its own class is kept
+
+        :param traffic_class:
+        :return:
+        """
+        self._run_tc("filter", "del", "dev", settings.SNMPSIM_IFACE_NAME, "parent", "1:", "prio", str(traffic_class),
+                     check=False)
+
+    def _remove_endpoint_shaping(self, traffic_class):
+        """
+
+        :param traffic_class:
+        :return:
+        """
+        self._remove_endpoint_filter(traffic_class)
+        self._run_tc("class", "del", "dev", settings.SNMPSIM_IFACE_NAME, "classid", f"1:{traffic_class:x}",
+                     check=False)
+
+        # interface traffic isn't passed through the HTB qdisc when no endpoint is shaped,
+        # only the qdisc added by the runner is removed
+        if not self._get_used_traffic_classes() - {traffic_class} and os.path.exists(self._get_root_qdisc_file()):
+            if self._get_root_qdisc() == ("htb", "1:"):
+                logger.info(f"Removing HTB qdisc from the interface '{settings.SNMPSIM_IFACE_NAME}' ...")
+                self._run_tc("qdisc", "del", "dev", settings.SNMPSIM_IFACE_NAME, "root", check=False)
+            os.remove(self._get_root_qdisc_file())
+
+    def _shape_endpoint_traffic(self, ip_address, port):
+        """Apply delay, jitter and drops of the endpoint response profile to its traffic class
+
+        Class is allocated for the endpoint with the profile and released when the profile doesn't
+        delay or drop responses
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        with self._lock_profiles():
+            response_profile = self._read_endpoint_profile(ip_address=ip_address, port=port)
+            traffic_class = response_profile.get("traffic_class")
+            if any(response_profile.get(field) for field in ("response_delay", "response_jitter", "drop_rate")):
+                if traffic_class is None:
+                    # class is saved before it's added, so it's removed with the endpoint even if it's added partially
+                    traffic_class = self._allocate_traffic_class()
+                    with open(self._get_endpoint_profile_file(ip_address=ip_address, port=port), "w") as file:
+                        json.dump({**response_profile, "traffic_class": traffic_class}, file)
+
+                self._add_endpoint_shaping(ip_address=ip_address,
+                                           port=port,
+                                           traffic_class=traffic_class,
+                                           response_profile=response_profile)
+            elif traffic_class is not None:
+                self._remove_endpoint_shaping(traffic_class)
+                with open(self._get_endpoint_profile_file(ip_address=ip_address, port=port), "w") as file:
+                    json.dump({**response_profile, "traffic_class": None}, file)
+
+    def _remove_endpoint_profile(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        with self._lock_profiles():
+            traffic_class = self._read_endpoint_profile(ip_address=ip_address, port=port).get("traffic_class")
+            if traffic_class is not None:
+                self._remove_endpoint_shaping(traffic_class)
+
+            try:
+                os.remove(self._get_endpoint_profile_file(ip_address=ip_address, port=port))
+            except FileNotFoundError:
+                pass
+
+    def _get_cgroup_version(self):
+        """
+
+        :return: 2 for the unified hierarchy, 1 for the separate 'cpu' and 'memory' hierarchies or None if cgroups
+            aren't used
+        """
+        if not settings.SNMPSIM_CGROUP_FOLDER:
+            return None
+
+        if os.path.exists(os.path.join(settings.SNMPSIM_CGROUP_FOLDER, "cgroup.controllers")):
+            return 2
+
+        if all(os.path.isdir(os.path.join(settings.SNMPSIM_CGROUP_FOLDER, controller))
+               for controller in self.CGROUP_CONTROLLERS):
+            return 1
+
+        return None
+
+    def _get_endpoint_cgroup_dirs(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return: dict of the controller -> cgroup directory of the endpoint, empty if cgroups aren't used
+        """
+        cgroup_version = self._get_cgroup_version()
+        if cgroup_version == 2:
+            cgroup_dir = os.path.join(settings.SNMPSIM_CGROUP_FOLDER, self.CGROUP_NAME,
+                                      self._get_endpoint_key(ip_address=ip_address, port=port))
+            return {controller: cgroup_dir for controller in self.CGROUP_CONTROLLERS}
+
+        if cgroup_version == 1:
+            return {controller: os.path.join(settings.SNMPSIM_CGROUP_FOLDER, controller, self.CGROUP_NAME,
+                                             self._get_endpoint_key(ip_address=ip_address, port=port))
+                    for controller in self.CGROUP_CONTROLLERS}
+
+        return {}
+
+    def _write_cgroup_file(self, cgroup_dir, file_name, value):
+        """
+
+        :param cgroup_dir:
+        :param file_name:
+        :param value:
+        :return:
+        """
+        with open(os.path.join(cgroup_dir, file_name), "w") as file:
+            file.write(str(value))
+
+    def _create_endpoint_cgroup(self, ip_address, port, cpu_limit, memory_limit):
+        """Create cgroup of the endpoint or update limits of the existing one
+
+        :param ip_address:
+        :param port:
+        :param cpu_limit: share of one CPU (%) or None
+        :param memory_limit: megabytes or None
+        :return: cgroup.procs files of the cgroup the daemon is added to
+        """
+        period = settings.SNMPSIM_CPU_LIMIT_PERIOD
+        cpu_quota = cpu_limit * period // 100 if cpu_limit else None
+        memory_bytes = memory_limit * 1024 * 1024 if memory_limit else None
+
+        cgroup_dirs = self._get_endpoint_cgroup_dirs(ip_address=ip_address, port=port)
+        if self._get_cgroup_version() == 2:
+            cgroup_dir = cgroup_dirs["cpu"]
+            os.makedirs(os.path.dirname(cgroup_dir), exist_ok=True)
+            # controllers are enabled for the cgroups of the endpoints by their parent
+            self._write_cgroup_file(os.path.dirname(cgroup_dir), "cgroup.subtree_control",
+                                    " ".join(f"+{controller}" for controller in self.CGROUP_CONTROLLERS))
+            os.makedirs(cgroup_dir, exist_ok=True)
+            self._write_cgroup_file(cgroup_dir, "cpu.max", f"{cpu_quota or 'max'} {period}")
+            self._write_cgroup_file(cgroup_dir, "memory.max", memory_bytes or "max")
+        else:
+            for cgroup_dir in cgroup_dirs.values():
+                os.makedirs(cgroup_dir, exist_ok=True)
+            self._write_cgroup_file(cgroup_dirs["cpu"], "cpu.cfs_period_us", period)
+            self._write_cgroup_file(cgroup_dirs["cpu"], "cpu.cfs_quota_us", cpu_quota or -1)
+            self._write_cgroup_file(cgroup_dirs["memory"], "memory.limit_in_bytes", memory_bytes or -1)
+
+        return [os.path.join(cgroup_dir, "cgroup.procs") for cgroup_dir in sorted(set(cgroup_dirs.values()))]
+
+    def _remove_endpoint_cgroup(self, ip_address, port):
+        """Remove cgroup of the endpoint, its daemon must be stopped
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        for cgroup_dir in set(self._get_endpoint_cgroup_dirs(ip_address=ip_address, port=port).values()):
+            try:
+                os.rmdir(cgroup_dir)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning(f"Failed to remove cgroup '{cgroup_dir}' of {ip_address}:{port}", exc_info=True)
+
+    def _prepare_limits_command(self, ip_address, port):
+        """Get command the snmpsim daemon is started with to apply resource limits of the endpoint
+
+        Daemon is added to the cgroup of the endpoint by the shell it is executed from, so all its memory is counted
+        and the limits are inherited by the daemonized process. Without cgroups memory is capped by the address space
+        rlimit and CPU isn't limited
+
+        :param ip_address:
+        :param port:
+        :return: command prefix, empty if the endpoint doesn't have the limits
+        """
+        resource_limits = self._read_endpoint_limits(ip_address=ip_address, port=port)
+        cpu_limit = resource_limits.get("cpu_limit")
+        memory_limit = resource_limits.get("memory_limit")
+        if not cpu_limit and not memory_limit:
+            self._remove_endpoint_cgroup(ip_address=ip_address, port=port)
+            return []
+
+        if self._get_cgroup_version() is not None:
+            procs_files = self._create_endpoint_cgroup(ip_address=ip_address,
+                                                       port=port,
+                                                       cpu_limit=cpu_limit,
+                                                       memory_limit=memory_limit)
+            script = "".join(f"echo $$ > {shlex.quote(procs_file)} && " for procs_file in procs_files)
+            return ["sh", "-c", f'{script}exec "$@"', "sh"]
+
+        if cpu_limit:
+            logger.warning(f"CPU usage of the snmpsim daemon on {ip_address}:{port} isn't limited, "
+                           f"it can be limited only by cgroups")
+        if not memory_limit:
+            return []
+
+        return ["prlimit", f"--as={memory_limit * 1024 * 1024}", "--"]
+
+    def _remove_endpoint_limits(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        self._remove_endpoint_cgroup(ip_address=ip_address, port=port)
+        try:
+            os.remove(self._get_endpoint_limits_file(ip_address=ip_address, port=port))
+        except FileNotFoundError:
+            pass
+
+    def _chown(self, path):
+        """Give the file to the user snmpsim daemons are running under
+
+        :param path:
+        :return:
+        """
+        shutil.chown(path=path, user=settings.SNMPSIM_USER, group=settings.SNMPSIM_GROUP)
+
+    def _start_endpoint(self, ip_address, port):
+        """Start snmpsim daemon that serves all recordings linked into the endpoint data directory
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        logger.info(f"Starting snmpsim daemon on {ip_address}:{port} for the communities: "
+                    f"{self._get_endpoint_communities(ip_address=ip_address, port=port)} ...")
+        output = subprocess.check_output([*self._prepare_limits_command(ip_address=ip_address, port=port),
+                                          *self._prepare_start_command(ip_address=ip_address, port=port)],
+                                         stderr=subprocess.STDOUT)
 
         logger.info(f"Command output: {output}")
 
-    def stop(self, recording_file, ip_address, port, snmp_read_community, remove_sub_iface=False):
+    def _stop_endpoint(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return:
+        """
+        logger.info(f"Stopping snmpsim daemon on {ip_address}:{port} ...")
+        endpoint_pattern = re.escape(self._get_agent_endpoint_option(ip_address=ip_address, port=port))
+        process_pattern = f"{re.escape(settings.SNMPSIM_SCRIPT_PATH)} .*{endpoint_pattern}( |$)"
+        if subprocess.call(["pkill", "-f", process_pattern]) != 0:
+            return
+
+        # the new daemon can't bind the endpoint and must not be taken for ready while the old one is exiting
+        deadline = time.monotonic() + settings.SNMPSIM_READINESS_TIMEOUT
+        while subprocess.call(["pgrep", "-f", process_pattern], stdout=subprocess.DEVNULL) == 0:
+            if time.monotonic() >= deadline:
+                logger.warning(f"snmpsim daemon on {ip_address}:{port} is still running after it was stopped")
+                return
+
+            time.sleep(settings.SNMPSIM_READINESS_INTERVAL)
+
+    def _is_endpoint_ready(self, ip_address, port, snmp_read_community):
+        """
+
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :return:
+        """
+        if settings.SNMPSIM_READINESS_PROBE == "socket":
+            return readiness.is_udp_socket_bound(ip_address=ip_address, port=port)
+
+        return readiness.is_snmp_agent_ready(ip_address=ip_address,
+                                             port=port,
+                                             snmp_read_community=snmp_read_community,
+                                             timeout=settings.SNMPSIM_READINESS_INTERVAL)
+
+    def wait_ready(self, ip_address, port, snmp_read_community):
+        """Wait until snmpsim daemon answers on the endpoint, SNMPSIM_READINESS_PROBE selects how it is checked:
+        'snmp' sends GET requests with the community, 'socket' looks for the bound socket in the /proc/net/udp
+
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :return: seconds the daemon was waited for or None if it isn't ready in SNMPSIM_READINESS_TIMEOUT seconds
         """
+        start_time = time.monotonic()
+        deadline = start_time + settings.SNMPSIM_READINESS_TIMEOUT
+        with profiling.profile_operation("runner.wait_ready", endpoint=f"{ip_address}:{port}"):
+            while not self._is_endpoint_ready(ip_address=ip_address,
+                                              port=port,
+                                              snmp_read_community=snmp_read_community):
+                if time.monotonic() >= deadline:
+                    logger.warning(f"snmpsim daemon on {ip_address}:{port} is not ready "
+                                   f"in {settings.SNMPSIM_READINESS_TIMEOUT} seconds")
+                    return
+
+                time.sleep(settings.SNMPSIM_READINESS_INTERVAL)
+
+        return time.monotonic() - start_time
+
+    def start(self, recording_file, ip_address, port, snmp_read_community, wait_ready=True, overlay="",
+              response_profile=None, resource_limits=None):
+        """Start recording on the IP:port endpoint, selected by the given SNMP community
+
+        snmpsim indexes data files only on startup, so daemon that already serves other
+        recordings on the same endpoint will be restarted
+
+        :param recording_file:
+        :param ip_address:
+        :param port:
+        :param snmp_read_community:
+        :param wait_ready: wait until the daemon answers, unless SNMPSIM_READINESS_PROBE is disabled
+        :param overlay: records that replace or extend the ones of the recording file
+        :param response_profile: delay, jitter, drops and GETBULK truncation of the responses, it is shared
+            by all recordings of the endpoint
+        :param resource_limits: CPU share (%) and memory cap (MB) of the daemon, they are shared by all recordings
+            of the endpoint too
+        :return: seconds from the start until the daemon is ready or None if it wasn't waited for
+        :raises SNMPSimNotReadyError: if the daemon isn't ready, the recording is stopped then, its log is kept
+        """
+        start_time = time.monotonic()
+        endpoint = f"{ip_address}:{port}"
+        with profiling.profile_operation("runner.create_sub_interface", endpoint=endpoint):
+            self._create_sub_interface(ip_address)
+        with profiling.profile_operation("runner.chown", endpoint=endpoint, recording_file=recording_file):
+            self._chown(recording_file)
+
+        logger.info(f"Starting snmpsim recording '{recording_file}' on {ip_address}:{port} "
+                    f"with community '{snmp_read_community}' ...")
+        with profiling.profile_operation("runner.link_recording_file", endpoint=endpoint,
+                                         recording_file=recording_file):
+            self._link_recording_file(recording_file=recording_file,
+                                      ip_address=ip_address,
+                                      port=port,
+                                      snmp_read_community=snmp_read_community,
+                                      overlay=overlay)
+        old_profile = self._write_endpoint_profile(ip_address=ip_address, port=port,
+                                                   response_profile=response_profile)
+        self._write_endpoint_limits(ip_address=ip_address, port=port, resource_limits=resource_limits)
+        # responses of the restarted daemon aren't shaped until it is ready, so the readiness probes aren't delayed
+        if old_profile.get("traffic_class") is not None:
+            with self._lock_profiles():
+                self._remove_endpoint_filter(old_profile["traffic_class"])
+        with profiling.profile_operation("runner.stop_endpoint", endpoint=endpoint):
+            self._stop_endpoint(ip_address=ip_address, port=port)
+        with profiling.profile_operation("runner.start_endpoint", endpoint=endpoint):
+            self._start_endpoint(ip_address=ip_address, port=port)
+
+        time_to_ready = None
+        is_ready = True
+        if wait_ready and settings.SNMPSIM_READINESS_PROBE:
+            is_ready = self.wait_ready(ip_address=ip_address, port=port,
+                                       snmp_read_community=snmp_read_community) is not None
+            time_to_ready = time.monotonic() - start_time
+
+        # responses are shaped after the readiness probes, so they aren't delayed or dropped
+        try:
+            with profiling.profile_operation("runner.shape_traffic", endpoint=endpoint):
+                self._shape_endpoint_traffic(ip_address=ip_address, port=port)
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            logger.exception(f"Failed to apply response profile of {endpoint}, responses aren't delayed "
+                             f"and dropped due to:")
+
+        # responses of the other recordings of the endpoint are shaped again, even if this one isn't ready
+        if not is_ready:
+            self.stop(recording_file=recording_file,
+                      ip_address=ip_address,
+                      port=port,
+                      snmp_read_community=snmp_read_community)
+            raise SNMPSimNotReadyError(f"Recording '{recording_file}' with community '{snmp_read_community}' "
+                                       f"doesn't answer on {endpoint} in {settings.SNMPSIM_READINESS_TIMEOUT} seconds")
+
+        return time_to_ready
+
+    def set_response_profile(self, ip_address, port, response_profile):
+        """Change response profile of the running endpoint
+
+        Delay, jitter and drops are changed in place, snmpsim reads the maximal number of var-binds only
+        on startup, so the daemon is restarted if it is changed
+
+        :param ip_address:
+        :param port:
+        :param response_profile:
+        :return:
+        """
+        endpoint = f"{ip_address}:{port}"
+        logger.info(f"Setting response profile {response_profile} of {endpoint} ...")
+        old_profile = self._write_endpoint_profile(ip_address=ip_address, port=port,
+                                                   response_profile=response_profile)
+        if (old_profile.get("max_var_binds") != (response_profile or {}).get("max_var_binds") and
+                self._get_endpoint_communities(ip_address=ip_address, port=port)):
+            with profiling.profile_operation("runner.stop_endpoint", endpoint=endpoint):
+                self._stop_endpoint(ip_address=ip_address, port=port)
+            with profiling.profile_operation("runner.start_endpoint", endpoint=endpoint):
+                self._start_endpoint(ip_address=ip_address, port=port)
+
+        with profiling.profile_operation("runner.shape_traffic", endpoint=endpoint):
+            self._shape_endpoint_traffic(ip_address=ip_address, port=port)
+
+    def stop(self, recording_file, ip_address, port, snmp_read_community, remove_sub_iface=False):
+        """Stop recording on the IP:port endpoint
+
+        Daemon will be restarted if other recordings are still served on the same endpoint
 
         :param recording_file:
         :param ip_address:
@@ -108,16 +1035,488 @@ class SNMPSimOSCommandRunner:
         :param remove_sub_iface:
         :return:
         """
-        logger.info(f"Stopping snmpsim recording '{recording_file}' on {ip_address}:{port} ...")
-        start_command = self._prepare_start_command(recording_file=recording_file,
-                                                    ip_address=ip_address,
-                                                    port=port,
-                                                    snmp_read_community=snmp_read_community)
-        start_command = " ".join(start_command)
-        os.system(f"pkill -f '{start_command}'")
+        logger.info(f"Stopping snmpsim recording '{recording_file}' on {ip_address}:{port} "
+                    f"with community '{snmp_read_community}' ...")
+        endpoint = f"{ip_address}:{port}"
+        self._unlink_recording_file(ip_address=ip_address, port=port, snmp_read_community=snmp_read_community)
+        with profiling.profile_operation("runner.stop_endpoint", endpoint=endpoint):
+            self._stop_endpoint(ip_address=ip_address, port=port)
+
+        if self._get_endpoint_communities(ip_address=ip_address, port=port):
+            with profiling.profile_operation("runner.start_endpoint", endpoint=endpoint):
+                self._start_endpoint(ip_address=ip_address, port=port)
+            return
 
+        self._remove_endpoint_profile(ip_address=ip_address, port=port)
+        self._remove_endpoint_limits(ip_address=ip_address, port=port)
         if remove_sub_iface:
-            self._remove_sub_interface(ip_address)
+            with profiling.profile_operation("runner.remove_sub_interface", endpoint=endpoint):
+                self._remove_sub_interface(ip_address)
+
+    def remove_recording_file(self, recording_file):
+        """Recording file of the local host is removed with its last Recording, daemons only link it
+
+        :param recording_file:
+        :return:
+        """
+
+    def get_log(self, ip_address, port, lines):
+        """Get last lines of the log of the snmpsim daemon that serves given IP:port endpoint
+
+        :param ip_address:
+        :param port:
+        :param lines:
+        :return:
+        """
+        try:
+            with open(self._get_endpoint_log_file(ip_address=ip_address, port=port), errors="replace") as file:
+                return list(collections.deque(file, maxlen=lines))
+        except FileNotFoundError:
+            return []
+
+    def get_status(self):
+        """Get endpoints served by the snmpsim daemons and SNMP communities of their recordings
+
+        :return:
+        """
+        try:
+            endpoint_dirs = os.listdir(os.path.join(self._daemon_folder, self.ENDPOINTS_FOLDER))
+        except FileNotFoundError:
+            endpoint_dirs = []
+
+        endpoints = []
+        for endpoint_dir in endpoint_dirs:
+            ip_address, port = self._parse_endpoint_key(endpoint_dir)
+            communities = self._get_endpoint_communities(ip_address=ip_address, port=port)
+            if communities:
+                endpoints.append({"ip_address": ip_address, "port": int(port), "communities": communities})
+
+        return {"endpoints": endpoints}
+
+    def _parse_log_time(self, value):
+        """Parse time of the log line, snmpsim logs the local time
+
+        :param value: e.g. b'2019-10-01T12:00:00.15'
+        :return: POSIX timestamp
+        :raises ValueError:
+        """
+        return datetime.datetime.strptime(value.decode(), self.REQUEST_LOG_TIME_FORMAT).astimezone().timestamp()
+
+    def _get_log_start_time(self, file):
+        """
+
+        :param file: binary log file
+        :return: POSIX timestamp of the first log line or None if the log is empty
+        """
+        file.seek(0)
+        for line in file:
+            try:
+                return self._parse_log_time(line.split(b" ", 1)[0])
+            except ValueError:
+                continue
+
+    def _find_log_activity(self, file, communities, activity):
+        """Find the last requests of the communities, log is read backwards by blocks until all of them are found
+
+        :param file: binary log file
+        :param communities:
+        :param activity: dict of community -> POSIX timestamp of its last request, found requests are added to it
+        :return:
+        """
+        position = file.seek(0, os.SEEK_END)
+        incomplete_line = b""
+        while position > 0 and len(activity) < len(communities):
+            block_size = min(self.LOG_BLOCK_SIZE, position)
+            position -= block_size
+            file.seek(position)
+            lines = (file.read(block_size) + incomplete_line).split(b"\n")
+            # first line of the block is completed by the previous one
+            incomplete_line = lines.pop(0) if position > 0 else b""
+
+            for line in reversed(lines):
+                match = self.REQUEST_LOG_LINE_RE.match(line)
+                if not match:
+                    continue
+
+                community = match.group("community").decode(errors="replace")
+                if community not in communities or community in activity:
+                    continue
+
+                try:
+                    activity[community] = self._parse_log_time(match.group("time"))
+                except ValueError:
+                    continue
+
+    def _get_endpoint_activity(self, ip_address, port, communities):
+        """Get time of the last request to each community from the logs of the snmpsim daemon
+
+        Logs are read from the newest one backwards until the requests of all communities are found, so usually
+        only the last block of the current log is read
+
+        :param ip_address:
+        :param port:
+        :param communities:
+        :return: (dict of community -> POSIX timestamp of its last request, communities without requests are missed,
+            POSIX timestamp of the first line of the oldest log read or None), requests of the missed communities
+            before that time aren't known
+        """
+        activity = {}
+        logged_since = None
+        log_file = self._get_endpoint_log_file(ip_address=ip_address, port=port)
+        for log_path in [log_file, *(f"{log_file}.{index}" for index in range(1, self.LOG_BACKUP_COUNT + 1))]:
+            if len(activity) == len(communities):
+                break
+
+            try:
+                file = open(log_path, "rb")
+            except FileNotFoundError:
+                break
+
+            with file:
+                self._find_log_activity(file=file, communities=communities, activity=activity)
+                logged_since = self._get_log_start_time(file) or logged_since
+
+        return activity, logged_since
+
+    def get_activity(self):
+        """Get time of the last SNMP request to each recording served by the snmpsim daemons
+
+        Requests are found in the daemon logs, so they are not known if SNMPSIM_DAEMON_LOG_LEVEL is 'error'
+        or they were rotated out of the logs, 'logged_since' is the time the logs begin at
+
+        :return:
+        """
+        recordings = []
+        for endpoint in self.get_status()["endpoints"]:
+            activity, logged_since = self._get_endpoint_activity(ip_address=endpoint["ip_address"],
+                                                                 port=endpoint["port"],
+                                                                 communities=endpoint["communities"])
+            recordings.extend({"ip_address": endpoint["ip_address"],
+                               "port": endpoint["port"],
+                               "snmp_read_community": community,
+                               "last_activity": activity.get(community),
+                               "logged_since": logged_since} for community in endpoint["communities"])
+
+        return {"recordings": recordings}
+
+    def _parse_requests(self, data):
+        """Parse requests from the lines of the snmpsim daemon log
+
+        :param data: complete log lines
+        :return: list of (offset of the request in the data, request), request is the dict with the time, community,
+            PDU type, OIDs of the var-binds, whether it was answered and whether it has the error
+        """
+        requests = []
+        request = None
+        offset = 0
+        for line in data.splitlines(keepends=True):
+            line_offset = offset
+            offset += len(line)
+
+            match = self.REQUEST_LOG_LINE_RE.match(line.rstrip(b"\r\n"))
+            if match:
+                try:
+                    request_time = self._parse_log_time(match.group("time"))
+                except ValueError:
+                    request = None
+                    continue
+
+                request = {"time": request_time,
+                           "community": match.group("community").decode(errors="replace"),
+                           "pdu_type": None,
+                           "oids": [],
+                           "is_answered": False,
+                           "is_error": False}
+                requests.append((line_offset, request))
+                continue
+
+            if request is None:
+                continue
+
+            match = self.REQUEST_VAR_BINDS_LOG_LINE_RE.match(line.rstrip(b"\r\n"))
+            if match:
+                request["oids"].extend(self.VAR_BIND_OID_RE.findall(match.group("var_binds")))
+                if match.group("set") == b"SET":
+                    request["pdu_type"] = "set"
+                elif match.group("next") == b"EXACT":
+                    request["pdu_type"] = "get"
+                elif request["pdu_type"] is None:
+                    request["pdu_type"] = "getnext"
+                else:
+                    request["pdu_type"] = "getbulk"
+            elif self.RESPONSE_VAR_BINDS_LOG_LINE_RE.match(line):
+                request["is_answered"] = True
+                if any(value in line for value in self.ERROR_VALUES):
+                    request["is_error"] = True
+            elif self.ERROR_LOG_LINE_RE.match(line) and not request["is_answered"]:
+                request["is_error"] = True
+
+        return requests
+
+    def _read_endpoint_log(self, ip_address, port):
+        """Read the endpoint log since the position of the previous call
+
+        Logs rotated since the previous call are read first, from the one the position is in to the newest.
+        If that log was already removed by the rotation, requests logged between are lost
+
+        :param ip_address:
+        :param port:
+        :return: tuple of the complete log lines, ID and offset of the log they were read up to and size
+            of the rotated logs part at the beginning of the lines
+        """
+        log_file = self._get_endpoint_log_file(ip_address=ip_address, port=port)
+        try:
+            with open(self._get_endpoint_traffic_position_file(ip_address=ip_address, port=port)) as file:
+                position = json.load(file)
+        except (FileNotFoundError, ValueError):
+            position = {"log_id": None, "offset": 0}
+
+        data = b""
+        with open(log_file, "rb") as file:
+            log_id = self._get_log_id(file)
+            offset = position["offset"]
+            if not self._is_same_log(log_id, position.get("log_id")):
+                offset = 0
+                if position.get("log_id") is not None:
+                    data = self._read_rotated_logs(log_file=log_file, position=position, current_log_id=log_id)
+            elif os.fstat(file.fileno()).st_size < offset:
+                offset = 0
+
+            file.seek(offset)
+            new_data = file.read()
+
+        # incomplete last line is read by the next call
+        new_data = new_data[:new_data.rfind(b"\n") + 1]
+
+        return data + new_data, log_id, offset + len(new_data), len(data)
+
+    def _get_log_id(self, file):
+        """
+
+        :param file: binary log file
+        :return: inode and beginning of the log, they are kept while the log is renamed by the rotation
+        """
+        return [os.fstat(file.fileno()).st_ino, os.pread(file.fileno(), self.LOG_HEAD_SIZE, 0).hex()]
+
+    def _is_same_log(self, log_id, previous_log_id):
+        """
+
+        :param log_id:
+        :param previous_log_id: ID of the log taken earlier, beginning of the log grows until it is written
+        :return:
+        """
+        if previous_log_id is None:
+            return False
+
+        inode, head = log_id
+        previous_inode, previous_head = previous_log_id
+        return inode == previous_inode and head.startswith(previous_head)
+
+    def _read_rotated_logs(self, log_file, position, current_log_id):
+        """Read rotated logs from the position up to the newest one, logs are found by their IDs,
+        as they are renamed by each rotation
+
+        :param log_file:
+        :param position: ID and offset of the log the previous call read up to
+        :param current_log_id: ID of the current log, it can be renamed since it was opened
+        :return: complete log lines
+        """
+        rotated_files = []
+        try:
+            for index in range(1, self.LOG_BACKUP_COUNT + 1):
+                try:
+                    rotated_file = open(f"{log_file}.{index}", "rb")
+                except FileNotFoundError:
+                    break
+
+                rotated_log_id = self._get_log_id(rotated_file)
+                if self._is_same_log(rotated_log_id, current_log_id):
+                    rotated_file.close()
+                    continue
+
+                rotated_files.append(rotated_file)
+                if self._is_same_log(rotated_log_id, position["log_id"]):
+                    break
+
+            if not rotated_files or not self._is_same_log(self._get_log_id(rotated_files[-1]), position["log_id"]):
+                logger.warning(f"Requests logged into {log_file} since the previous traffic collection are lost "
+                               f"partially, the log was rotated more than {len(rotated_files)} times since")
+
+            data = b""
+            for rotated_file in reversed(rotated_files):
+                if self._is_same_log(self._get_log_id(rotated_file), position["log_id"]):
+                    rotated_file.seek(position["offset"])
+                part = rotated_file.read()
+                data += part if not part or part.endswith(b"\n") else part + b"\n"
+
+            return data
+        finally:
+            for rotated_file in rotated_files:
+                rotated_file.close()
+
+    def _get_endpoint_traffic(self, ip_address, port, bucket_size):
+        """Count requests logged by the snmpsim daemon since the previous call by the communities and time buckets
+
+        Only the new part of the log is read, its position is kept in the TRAFFIC_FOLDER, so each request
+        is counted once
+
+        :param ip_address:
+        :param port:
+        :param bucket_size: seconds
+        :return: dict of community -> dict of the bucket start POSIX timestamp -> bucket counters
+        """
+        try:
+            data, log_id, end_offset, rotated_size = self._read_endpoint_log(ip_address=ip_address, port=port)
+        except FileNotFoundError:
+            return {}
+
+        requests = self._parse_requests(data)
+        if requests:
+            request_offset, request = requests[-1]
+            if (not request["is_answered"] and request["time"] > time.time() - self.TRAFFIC_RESPONSE_GRACE and
+                    request_offset >= rotated_size):
+                requests.pop()
+                end_offset -= len(data) - request_offset
+
+        traffic = collections.defaultdict(dict)
+        for _, request in requests:
+            bucket_start = request["time"] - request["time"] % bucket_size
+            bucket = traffic[request["community"]].setdefault(bucket_start, {"requests": collections.Counter(),
+                                                                             "errors": 0,
+                                                                             "timeouts": 0,
+                                                                             "subtrees": collections.Counter()})
+            if request["pdu_type"] is not None:
+                bucket["requests"][request["pdu_type"]] += 1
+            bucket["errors"] += request["is_error"]
+            bucket["timeouts"] += not request["is_answered"]
+            bucket["subtrees"].update(snmprec.get_subtree(oid) for oid in request["oids"])
+
+        with open(self._get_endpoint_traffic_position_file(ip_address=ip_address, port=port), "w") as file:
+            json.dump({"log_id": log_id, "offset": end_offset}, file)
+
+        return traffic
+
+    def get_traffic(self, bucket_size):
+        """Get SNMP requests to each recording logged by the snmpsim daemons since the previous call
+
+        Requests are counted by the PDU type within the time buckets with the number of the errors (noSuchObject and
+        noSuchInstance responses), timeouts (requests without response) and var-binds by the subtrees. They are
+        found in the daemon logs, so they are not counted if SNMPSIM_DAEMON_LOG_LEVEL is 'error'.
+        GETBULK with one repetition and without non-repeaters is counted as GETNEXT
+
+        :param bucket_size: seconds
+        :return:
+        """
+        recordings = []
+        for log_file in glob.glob(os.path.join(self._daemon_folder, self.LOGS_FOLDER, "*.log")):
+            ip_address, port = self._parse_endpoint_key(os.path.basename(log_file)[:-len(".log")])
+            traffic = self._get_endpoint_traffic(ip_address=ip_address, port=port, bucket_size=bucket_size)
+            recordings.extend({"ip_address": ip_address,
+                               "port": int(port),
+                               "snmp_read_community": community,
+                               "buckets": [{"start": bucket_start, **bucket}
+                                           for bucket_start, bucket in buckets.items()]}
+                              for community, buckets in traffic.items())
+
+        return {"recordings": recordings}
+
+    def _read_endpoint_pid(self, ip_address, port):
+        """
+
+        :param ip_address:
+        :param port:
+        :return: PID of the snmpsim daemon or None if it wasn't started
+        """
+        try:
+            with open(self._get_endpoint_pid_file(ip_address=ip_address, port=port)) as file:
+                return int(file.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _read_process_cpu_time(self, pid):
+        """
+
+        :param pid:
+        :return: user and system CPU time of the process (seconds)
+        """
+        with open(f"/proc/{pid}/stat") as file:
+            # command name in the parentheses can contain spaces, utime and stime are the 14th and 15th fields
+            fields = file.read().rsplit(")", 1)[1].split()
+
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+    def _read_endpoint_memory_usage(self, ip_address, port, pid):
+        """Get memory of the snmpsim daemon counted by its cgroup, which is limited, or its resident memory
+
+        :param ip_address:
+        :param port:
+        :param pid:
+        :return: bytes
+        """
+        memory_dir = self._get_endpoint_cgroup_dirs(ip_address=ip_address, port=port).get("memory")
+        if memory_dir:
+            for file_name in ("memory.current", "memory.usage_in_bytes"):
+                try:
+                    with open(os.path.join(memory_dir, file_name)) as file:
+                        return int(file.read())
+                except FileNotFoundError:
+                    continue
+
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+
+    def get_usage(self, interval, ip_address=None, port=None):
+        """Get CPU and memory usage of the snmpsim daemons against their resource limits
+
+        CPU usage is the share of one CPU (%) the daemon used within the interval, memory is in bytes.
+        Usage of the daemon that isn't running is None
+
+        :param interval: seconds
+        :param ip_address: only the daemon of the IP:port endpoint is sampled if it's given
+        :param port:
+        :return:
+        """
+        endpoints = [endpoint for endpoint in self.get_status()["endpoints"]
+                     if ip_address is None or (endpoint["ip_address"] == ip_address and endpoint["port"] == port)]
+        cpu_times = {}
+        for endpoint in endpoints:
+            pid = self._read_endpoint_pid(ip_address=endpoint["ip_address"], port=endpoint["port"])
+            try:
+                cpu_times[pid] = self._read_process_cpu_time(pid)
+            except (FileNotFoundError, TypeError):
+                continue
+
+        # daemons are measured within the same interval
+        if cpu_times:
+            time.sleep(interval)
+
+        usage = []
+        for endpoint in endpoints:
+            resource_limits = self._read_endpoint_limits(ip_address=endpoint["ip_address"], port=endpoint["port"])
+            endpoint_usage = {
+                **endpoint,
+                "cpu_usage": None,
+                "cpu_limit": resource_limits.get("cpu_limit"),
+                "memory_usage": None,
+                "memory_limit": (resource_limits["memory_limit"] * 1024 * 1024
+                                 if resource_limits.get("memory_limit") else None),
+            }
+            pid = self._read_endpoint_pid(ip_address=endpoint["ip_address"], port=endpoint["port"])
+            if pid in cpu_times:
+                try:
+                    endpoint_usage["cpu_usage"] = round(
+                        (self._read_process_cpu_time(pid) - cpu_times[pid]) / interval * 100, 1)
+                    endpoint_usage["memory_usage"] = self._read_endpoint_memory_usage(ip_address=endpoint["ip_address"],
+                                                                                      port=endpoint["port"],
+                                                                                      pid=pid)
+                except FileNotFoundError:
+                    pass
+
+            usage.append(endpoint_usage)
+
+        return {"endpoints": usage}
 
     def stop_all(self):
         """
@@ -125,4 +1524,84 @@ class SNMPSimOSCommandRunner:
         :return:
         """
         logger.info(f"Stopping all snmpsim recordings ...")
-        os.system(f"pkill -f '{settings.SNMPSIM_SCRIPT_PATH}'")
+        # stop only daemons of this folder, other agents can run their daemons on the same host
+        for endpoint in self.get_status()["endpoints"]:
+            self._stop_endpoint(ip_address=endpoint["ip_address"], port=endpoint["port"])
+            self._remove_endpoint_profile(ip_address=endpoint["ip_address"], port=endpoint["port"])
+            self._remove_endpoint_limits(ip_address=endpoint["ip_address"], port=endpoint["port"])
+        shutil.rmtree(os.path.join(self._daemon_folder, self.ENDPOINTS_FOLDER), ignore_errors=True)
+
+
+class SNMPSimLoopbackRunner(SNMPSimOSCommandRunner):
+    """Runner for the unprivileged user: recordings are served on the loopback addresses (127.0.0.0/8, ::1)
+
+    Loopback addresses don't need to be added to the interface and daemons run under the current user,
+    so interfaces and file owners are never changed. Ports below 1024 still require root privileges,
+    so recordings on them are refused unless it runs as root
+    """
+    PRIVILEGED_PORTS_END = 1024
+
+    def start(self, recording_file, ip_address, port, snmp_read_community, wait_ready=True, overlay="",
+              response_profile=None, resource_limits=None):
+        self._check_port(port)
+        return super().start(recording_file=recording_file,
+                             ip_address=ip_address,
+                             port=port,
+                             snmp_read_community=snmp_read_community,
+                             wait_ready=wait_ready,
+                             overlay=overlay,
+                             response_profile=response_profile,
+                             resource_limits=resource_limits)
+
+    def _check_loopback_address(self, ip_address):
+        """
+
+        :param ip_address:
+        :return:
+        """
+        if not ipaddress.ip_address(ip_address).is_loopback:
+            raise ValueError(f"Recording IP '{ip_address}' is not a loopback address, "
+                             f"it can't be served by the {type(self).__name__}")
+
+    def _check_port(self, port):
+        """
+
+        :param port:
+        :return:
+        """
+        if port < self.PRIVILEGED_PORTS_END and os.geteuid() != 0:
+            raise ValueError(f"Recording port {port} is below {self.PRIVILEGED_PORTS_END}, it can be bound only "
+                             f"by root, so it can't be served by the {type(self).__name__}")
+
+    def _get_process_options(self):
+        """
+
+        :return:
+        """
+        return [f"--process-user={pwd.getpwuid(os.getuid()).pw_name}",
+                f"--process-group={grp.getgrgid(os.getgid()).gr_name}"]
+
+    def _enable_secondary_addresses_promotion(self):
+        pass
+
+    def _create_sub_interface(self, ip_address):
+        self._check_loopback_address(ip_address)
+
+    def _remove_sub_interface(self, ip_address):
+        pass
+
+    def _shape_endpoint_traffic(self, ip_address, port):
+        response_profile = self._read_endpoint_profile(ip_address=ip_address, port=port)
+        if any(response_profile.get(field) for field in ("response_delay", "response_jitter", "drop_rate")):
+            logger.warning(f"Delay, jitter and drops of the responses on {ip_address}:{port} aren't applied, "
+                           f"traffic of the interface can be shaped only by root")
+
+    def _remove_endpoint_shaping(self, traffic_class):
+        pass
+
+    def _get_cgroup_version(self):
+        # cgroups can be created only by root, so memory is capped by the rlimit
+        return None
+
+    def _chown(self, path):
+        pass
@@ -0,0 +1,117 @@
+"""Startup time of the WSGI workers and management commands
+
+Each measurement runs in the fresh interpreter ('python -m simulator.startup'), so only the standard library
+is imported before the clock starts and nothing is cached by the previous runs
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def _measure_wsgi(path):
+    """Import WSGI application and handle the first request the way the worker does
+
+    :param path: path of the first request, e.g. '/login/'
+    :return: dict of the phase -> seconds
+    """
+    start_time = time.perf_counter()
+    from quali.wsgi import application
+    import_time = time.perf_counter()
+
+    from wsgiref.util import setup_testing_defaults
+    environ = {"PATH_INFO": path, "HTTP_HOST": "localhost"}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    first_request_time = time.perf_counter()
+
+    return {
+        "status": statuses[0],
+        "import": import_time - start_time,
+        "first_request": first_request_time - import_time,
+        "total": first_request_time - start_time,
+    }
+
+
+def _measure_command(name):
+    """Set up Django and load the management command, then run the system checks every command runs on start
+
+    :param name: management command name
+    :return: dict of the phase -> seconds
+    """
+    start_time = time.perf_counter()
+    import django
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "quali.settings")
+    django.setup()
+    setup_time = time.perf_counter()
+
+    from django.core.management import get_commands, load_command_class
+    load_command_class(get_commands()[name], name)
+    command_time = time.perf_counter()
+
+    from django.core import checks
+    checks.run_checks()
+    checks_time = time.perf_counter()
+
+    return {
+        "setup": setup_time - start_time,
+        "command": command_time - setup_time,
+        "checks": checks_time - command_time,
+        "total": checks_time - start_time,
+    }
+
+
+def _run_measurement(base_dir, *args):
+    """
+
+    :param base_dir: project folder the measurement runs in
+    :param args: 'wsgi' and the path or 'command' and the name
+    :return: dict of the phase -> seconds, 'process' is the wall time of the whole interpreter
+    """
+    start_time = time.perf_counter()
+    output = subprocess.check_output([sys.executable, "-m", __name__, *args], cwd=base_dir)
+    process_time = time.perf_counter() - start_time
+
+    # result is the last line, the application can log to the stdout too
+    result = json.loads(output.splitlines()[-1])
+    if result.get("status", "").startswith("5"):
+        raise ValueError(f"First request to the WSGI application failed with '{result['status']}'")
+
+    return {**result, "process": process_time}
+
+
+def benchmark_startup(base_dir, wsgi_path="/login/", commands=(), repeat=5):
+    """Measure startup of the WSGI worker and management commands the number of times
+
+    :param base_dir: project folder
+    :param wsgi_path: path of the first request to the WSGI application
+    :param commands: names of the management commands
+    :param repeat:
+    :return: dict of the scenario -> phase -> {'min', 'median', 'max'} seconds
+    """
+    scenarios = {f"wsgi {wsgi_path}": ("wsgi", wsgi_path)}
+    scenarios.update({f"command {name}": ("command", name) for name in commands})
+
+    results = {}
+    for scenario, args in scenarios.items():
+        runs = [_run_measurement(base_dir, *args) for _ in range(repeat)]
+        results[scenario] = {phase: {"min": min(run[phase] for run in runs),
+                                     "median": statistics.median(run[phase] for run in runs),
+                                     "max": max(run[phase] for run in runs)}
+                             for phase in runs[0] if phase != "status"}
+
+    return results
+
+
+if __name__ == "__main__":
+    scenario, argument = sys.argv[1:3]
+    measure = {"wsgi": _measure_wsgi, "command": _measure_command}[scenario]
+    print(json.dumps(measure(argument)))
@@ -1,3 +1,901 @@
-from django.test import TestCase
+import os
+import shutil
+import socket
+import datetime
+import io
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import network, search
+from .agent import SNMPSimAgentServer
+from .capture import fail_interrupted_captures, run_pending_captures, start_recording_capture
+from .idle import reap_idle_recordings
+from .models import Node, Recording, RecordingCapture, RecordingTraffic
+from .nodes import get_snmpsim_runner, run_per_node, start_per_node, stop_per_node
+from .on_demand import SNMPSimOnDemandListener, is_endpoint_handover_supported
+from .snmprec import SnmprecError, parse_line, sort_recording_file, sort_uploaded_recording
+from .snmpsim_runner import SNMPSimLoopbackRunner, SNMPSimNotReadyError, SNMPSimOSCommandRunner
+from .traffic import collect_traffic
+
+
+RECORDING_CONTENT = b"1.3.6.1.2.1.1.1.0|4|Test device\n1.3.6.1.2.1.1.5.0|4|test\n"
+
+
+class SNMPSimAgentTests(TestCase):
+    """Recordings of two nodes, each one is served by its own agent with the loopback runner"""
+    AGENTS_COUNT = 2
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(self.folder, "media"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.agents = []
+        self.recordings = []
+        for index in range(1, self.AGENTS_COUNT + 1):
+            agent = SNMPSimAgentServer(server_address=("127.0.0.1", 0),
+                                       runner=SNMPSimLoopbackRunner(
+                                           daemon_folder=os.path.join(self.folder, f"node{index}")),
+                                       recordings_folder=os.path.join(self.folder, f"node{index}", "recordings"),
+                                       token="")
+            threading.Thread(target=agent.serve_forever, daemon=True).start()
+            self.addCleanup(agent.server_close)
+            self.addCleanup(agent.shutdown)
+            self.addCleanup(agent.runner.stop_all)
+            self.agents.append(agent)
+
+            node = Node.objects.create(name=f"node{index}", url=f"http://127.0.0.1:{agent.server_address[1]}")
+            self.recordings.append(Recording.objects.create(name=f"recording{index}",
+                                                            ip_address=f"127.0.0.{100 + index}",
+                                                            port=16100 + index,
+                                                            snmp_read_community=f"community{index}",
+                                                            recording_file=ContentFile(RECORDING_CONTENT,
+                                                                                       name="test.snmprec"),
+                                                            node=node))
+
+    def _get_uploaded_files(self, agent):
+        """
+
+        :param agent:
+        :return: names of the recording files uploaded to the agent
+        """
+        return [file_name for _, _, file_names in os.walk(agent.recordings_folder) for file_name in file_names]
+
+    def test_start_status_stop(self):
+        results = start_per_node(self.recordings)
+        self.assertEqual([(recording, None) for recording in self.recordings],
+                         sorted([(recording, error) for recording, error, _ in results],
+                                key=lambda result: result[0].pk))
+        self.assertTrue(all(time_to_ready is not None for _, _, time_to_ready in results))
+
+        statuses = {}
+        results = run_per_node(self.recordings,
+                               lambda runner, recording: statuses.update({recording.pk: runner.get_status()}))
+        self.assertTrue(all(error is None for _, error in results))
+        for recording in self.recordings:
+            self.assertEqual([{"ip_address": recording.ip_address,
+                               "port": recording.port,
+                               "communities": [recording.snmp_read_community]}],
+                             statuses[recording.pk]["endpoints"])
+
+        for recording in self.recordings:
+            usage = get_snmpsim_runner(recording.node).get_usage(interval=0.1,
+                                                                 ip_address=recording.ip_address,
+                                                                 port=recording.port)
+            self.assertEqual([(recording.ip_address, recording.port)],
+                             [(endpoint["ip_address"], endpoint["port"]) for endpoint in usage["endpoints"]])
+            self.assertIsNotNone(usage["endpoints"][0]["memory_usage"])
+
+        results = stop_per_node(self.recordings)
+        self.assertTrue(all(error is None for _, error in results))
+        for recording in self.recordings:
+            self.assertEqual({"endpoints": []}, get_snmpsim_runner(recording.node).get_status())
+
+    @override_settings(SNMPSIM_READINESS_TIMEOUT=0.5)
+    def test_recordings_that_arent_ready_are_stopped(self):
+        with mock.patch.object(SNMPSimLoopbackRunner, "_is_endpoint_ready", return_value=False):
+            results = start_per_node(self.recordings)
+
+        self.assertTrue(all(isinstance(error, SNMPSimNotReadyError) for _, error, _ in results))
+        for recording in self.recordings:
+            self.assertEqual({"endpoints": []}, get_snmpsim_runner(recording.node).get_status())
+
+    def test_delete_removes_uploaded_file(self):
+        start_per_node(self.recordings)
+        stop_per_node(self.recordings)
+        self.assertEqual(["test.snmprec"], self._get_uploaded_files(self.agents[0]))
+
+        self.recordings[0].delete()
+
+        self.assertEqual([], self._get_uploaded_files(self.agents[0]))
+        self.assertEqual(["test.snmprec"], self._get_uploaded_files(self.agents[1]))
+
+    def test_agent_without_token_not_on_loopback(self):
+        with self.assertRaises(ValueError):
+            SNMPSimAgentServer(server_address=("0.0.0.0", 0),
+                               runner=self.agents[0].runner,
+                               recordings_folder=self.agents[0].recordings_folder,
+                               token="")
+
+        agent = SNMPSimAgentServer(server_address=("0.0.0.0", 0),
+                                   runner=self.agents[0].runner,
+                                   recordings_folder=self.agents[0].recordings_folder,
+                                   token="secret")
+        agent.server_close()
+
+
+class SNMPSimLoopbackRunnerTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.runner = SNMPSimLoopbackRunner(daemon_folder=self.folder)
+
+    def test_privileged_port_is_refused_for_unprivileged_user(self):
+        recording_file = os.path.join(self.folder, "test.snmprec")
+        with open(recording_file, "wb") as file:
+            file.write(RECORDING_CONTENT)
+
+        with mock.patch("simulator.snmpsim_runner.os.geteuid", return_value=1000), \
+                self.assertRaisesRegex(ValueError, "port 161"):
+            self.runner.start(recording_file=recording_file,
+                              ip_address="127.0.0.101",
+                              port=161,
+                              snmp_read_community="public")
+
+        self.assertEqual({"endpoints": []}, self.runner.get_status())
+
+    @override_settings(SNMPSIM_READINESS_TIMEOUT=0.5)
+    def test_recording_that_isnt_ready_is_stopped(self):
+        recording_file = os.path.join(self.folder, "test.snmprec")
+        with open(recording_file, "wb") as file:
+            file.write(RECORDING_CONTENT)
+
+        with mock.patch.object(self.runner, "_is_endpoint_ready", return_value=False), \
+                self.assertRaises(SNMPSimNotReadyError):
+            self.runner.start(recording_file=recording_file,
+                              ip_address="127.0.0.101",
+                              port=16101,
+                              snmp_read_community="public")
+
+        self.assertEqual({"endpoints": []}, self.runner.get_status())
+        self.assertIsNone(self.runner._read_endpoint_pid(ip_address="127.0.0.101", port=16101))
+        self.assertTrue(os.path.exists(self.runner._get_endpoint_log_file(ip_address="127.0.0.101", port=16101)))
+
+
+class CloneRecordingTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(self.folder, "media"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recording = Recording.objects.create(name="recording",
+                                                  ip_address="127.0.0.101",
+                                                  recording_file=ContentFile(RECORDING_CONTENT, name="test.snmprec"))
+        self.runner = SNMPSimLoopbackRunner(daemon_folder=os.path.join(self.folder, "daemon"))
+
+    def _link_recording_file(self, recording):
+        """
+
+        :param recording:
+        :return: path of the recording file in the endpoint folder
+        """
+        self.runner._link_recording_file(recording_file=recording.recording_file.path,
+                                         ip_address=recording.ip_address,
+                                         port=recording.port,
+                                         snmp_read_community=recording.snmp_read_community,
+                                         overlay=recording.overlay)
+        return os.path.join(self.runner._get_endpoint_dir(ip_address=recording.ip_address, port=recording.port),
+                            f"{recording.snmp_read_community}.snmprec")
+
+    def test_clone_shares_file(self):
+        clones = Recording.objects.clone(source=self.recording, count=2)
+
+        self.assertEqual(["recording-1", "recording-2"], [clone.name for clone in clones])
+        self.assertEqual(2, len({clone.ip_address for clone in clones} - {self.recording.ip_address}))
+        for clone in clones:
+            self.assertEqual(self.recording.recording_file.name, clone.recording_file.name)
+            self.assertEqual("", clone.overlay)
+            self.assertEqual(self.recording.recording_file.path, os.readlink(self._link_recording_file(clone)))
+
+    def test_clone_with_sys_name(self):
+        clone, = Recording.objects.clone(source=self.recording, count=1, set_sys_name=True)
+
+        link_path = self._link_recording_file(clone)
+        self.assertFalse(os.path.islink(link_path))
+        with open(link_path, "rb") as file:
+            self.assertEqual(b"1.3.6.1.2.1.1.1.0|4|Test device\n1.3.6.1.2.1.1.5.0|4|recording-1\n", file.read())
+
+
+class SNMPSimOnDemandListenerTests(SimpleTestCase):
+    FORWARD_TIMEOUT = 3
+    REQUESTS_COUNT = 20
+    DAEMON_START_DELAY = 0.5
+
+    def _bind_reusable_socket(self, address):
+        """
+
+        :param address:
+        :return:
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(address)
+        return sock
+
+    def _run_echo_daemon(self, endpoint):
+        """Bind the endpoint after the delay, as the started daemon does, and answer each request with itself
+
+        :param endpoint:
+        :return:
+        """
+        time.sleep(self.DAEMON_START_DELAY)
+        daemon_socket = self._bind_reusable_socket(endpoint)
+        daemon_socket.settimeout(self.FORWARD_TIMEOUT)
+        try:
+            while True:
+                request, client_address = daemon_socket.recvfrom(1024)
+                daemon_socket.sendto(request, client_address)
+        except OSError:
+            pass
+
+    def test_endpoint_handover_is_supported(self):
+        self.assertTrue(is_endpoint_handover_supported())
+
+    def test_burst_is_forwarded_within_one_timeout(self):
+        listener_socket = self._bind_reusable_socket(("127.0.0.1", 0))
+        endpoint = listener_socket.getsockname()
+        clients = []
+        for index in range(self.REQUESTS_COUNT):
+            client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.addCleanup(client_socket.close)
+            client_socket.settimeout(self.FORWARD_TIMEOUT)
+            client_socket.sendto(f"request {index}".encode(), endpoint)
+            clients.append(client_socket)
+
+        requests = [listener_socket.recvfrom(1024) for _ in clients]
+        threading.Thread(target=self._run_echo_daemon, args=(endpoint,), daemon=True).start()
+
+        listener = SNMPSimOnDemandListener(runner=None, forward_timeout=self.FORWARD_TIMEOUT)
+        self.addCleanup(listener.close)
+        start_time = time.monotonic()
+        listener._forward_requests(endpoint, listener_socket, requests)
+
+        self.assertLess(time.monotonic() - start_time, self.FORWARD_TIMEOUT)
+        for index, client_socket in enumerate(clients):
+            response, server_address = client_socket.recvfrom(1024)
+            self.assertEqual(f"request {index}".encode(), response)
+            self.assertEqual(endpoint, server_address)
+
+
+class ReapIdleRecordingsTests(TestCase):
+    TTL = 3600
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.folder)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.failing_node = Node.objects.create(name="failing", url="http://127.0.0.1:1")
+        self.node = Node.objects.create(name="node", url="http://127.0.0.1:2")
+        self.runners = {self.failing_node: mock.Mock(**{"get_activity.side_effect": ConnectionError}),
+                        self.node: mock.Mock(**{"get_activity.return_value": {"recordings": []}})}
+        for patcher in (mock.patch("simulator.idle.get_snmpsim_runner", side_effect=self.runners.get),
+                        mock.patch("simulator.idle.stop_per_node",
+                                   side_effect=lambda recordings: [(recording, None) for recording in recordings])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _create_recording(self, index, node, last_activity_at):
+        """
+
+        :param index:
+        :param node:
+        :param last_activity_at:
+        :return:
+        """
+        recording = Recording.objects.create(name=f"recording{index}",
+                                             ip_address=f"127.0.0.{100 + index}",
+                                             is_running=True,
+                                             recording_file=ContentFile(RECORDING_CONTENT, name="test.snmprec"),
+                                             node=node)
+        Recording.objects.filter(pk=recording.pk).update(last_activity_at=last_activity_at)
+        return recording
+
+    def _set_activity(self, recording, last_activity, logged_since):
+        """
+
+        :param recording:
+        :param last_activity:
+        :param logged_since:
+        :return:
+        """
+        self.runners[recording.node].get_activity.return_value["recordings"].append({
+            "ip_address": recording.ip_address,
+            "port": recording.port,
+            "snmp_read_community": recording.snmp_read_community,
+            "last_activity": last_activity,
+            "logged_since": logged_since,
+        })
+
+    def test_reap(self):
+        idle_since = timezone.now() - datetime.timedelta(seconds=2 * self.TTL)
+        unknown_recording = self._create_recording(1, self.failing_node, last_activity_at=None)
+        unknown_idle_recording = self._create_recording(2, self.failing_node, last_activity_at=idle_since)
+        new_recording = self._create_recording(3, self.node, last_activity_at=None)
+        self._set_activity(new_recording, last_activity=None, logged_since=time.time())
+        idle_recording = self._create_recording(4, self.node, last_activity_at=idle_since)
+        self._set_activity(idle_recording, last_activity=idle_since.timestamp(), logged_since=0)
+        active_recording = self._create_recording(5, self.node, last_activity_at=idle_since)
+        self._set_activity(active_recording, last_activity=time.time(), logged_since=0)
+        rotated_recording = self._create_recording(6, self.node, last_activity_at=idle_since)
+        self._set_activity(rotated_recording, last_activity=None, logged_since=time.time())
+
+        status_version = Recording.objects.get_status_version()
+
+        self.assertEqual([idle_recording], reap_idle_recordings(ttl=self.TTL))
+
+        running_recordings = Recording.objects.filter(is_running=True)
+        self.assertEqual({unknown_recording, unknown_idle_recording, new_recording, active_recording,
+                          rotated_recording}, set(running_recordings))
+        self.assertIsNone(running_recordings.get(pk=unknown_recording.pk).last_activity_at)
+        self.assertIsNotNone(running_recordings.get(pk=new_recording.pk).last_activity_at)
+        self.assertTrue(Recording.objects.get(pk=idle_recording.pk).is_idle_stopped)
+        # only the stopped recording is changed for the changelist live update, not the activity of the others
+        self.assertEqual([idle_recording.pk], list(Recording.objects.changed_since(status_version)
+                                                   .values_list("pk", flat=True)))
+
+
+class SortRecordingFileTests(SimpleTestCase):
+    UNSORTED_CONTENT = (b"# comment\n"
+                        b"1.3.6.1.10.0|2|10\n"
+                        b"1.3.6.1.2.1|4|first\n"
+                        b"\n"
+                        b"1.3.6.1.2|4x|6869\n"
+                        b"1.3.6.1.2.1|4|second\r\n"
+                        b"1.3.6.1.9|64|10.0.0.1\n"
+                        b"1.3.6.1.2.10|2:numeric|min=1,max=2\n")
+    SORTED_CONTENT = (b"1.3.6.1.2|4x|6869\n"
+                      b"1.3.6.1.2.1|4|second\n"
+                      b"1.3.6.1.2.10|2:numeric|min=1,max=2\n"
+                      b"1.3.6.1.9|64|10.0.0.1\n"
+                      b"1.3.6.1.10.0|2|10\n")
+    MALFORMED_CONTENT = (b"1.3.6.1.2.1.1.1.0|4|Test device\n"
+                         b"1.3.6.1.2.1.1.2.0|6\n"
+                         b"\n"
+                         b"1.3.6.1.2.1.1.3.0|67|-1\n"
+                         b"1.3.6.1.2.1.1.4.0|4|contact\n"
+                         b"1.3.6.1.2.1.1.05.0|4|name\n"
+                         b"1.3.6.1.2.1.1.6.0|99|location\n")
+
+    def _sort(self, content, chunk_size=1024, max_errors=10):
+        """
+
+        :param content:
+        :param chunk_size:
+        :param max_errors:
+        :return: (sorted content, number of written records, number of dropped duplicates)
+        """
+        output_file = io.BytesIO()
+        records_count, duplicates_count = sort_recording_file(input_file=io.BytesIO(content),
+                                                              output_file=output_file,
+                                                              chunk_size=chunk_size,
+                                                              max_errors=max_errors)
+        return output_file.getvalue(), records_count, duplicates_count
+
+    def test_numeric_order_across_chunks(self):
+        for chunk_size in (1, 40, 1024):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual((self.SORTED_CONTENT, 5, 1), self._sort(self.UNSORTED_CONTENT, chunk_size=chunk_size))
+
+    def test_malformed_lines_are_reported_with_line_numbers(self):
+        with self.assertRaises(SnmprecError) as context:
+            self._sort(self.MALFORMED_CONTENT)
+
+        self.assertEqual([2, 4, 6, 7], [line_number for line_number, _ in context.exception.errors])
+        self.assertIn("Line 4: value -1 is out of range of the type '67'", str(context.exception))
+
+    def test_validation_stops_after_max_errors(self):
+        with self.assertRaises(SnmprecError) as context:
+            self._sort(self.MALFORMED_CONTENT, max_errors=2)
+
+        self.assertEqual([2, 4], [line_number for line_number, _ in context.exception.errors])
+
+    def test_parse_line(self):
+        self.assertLess(parse_line(b"1.3.6.1.2|4|"), parse_line(b"1.3.6.1.10|4|"))
+        for line in (b"1.3.6.1|4", b"1.3.6.1.|4|x", b"1.3.6.1.4294967296|4|x", b"1.3.6.1|4x|abc", b"1.3.6.1|64|1.2.3",
+                     b"1.3.6.1|5|x", b"1.3.6.1|2|2147483648"):
+            with self.subTest(line=line), self.assertRaises(ValueError):
+                parse_line(line)
+
+    @override_settings(SNMPSIM_RECORDING_SORT_CHUNK_SIZE=1, SNMPSIM_RECORDING_MAX_ERRORS=1)
+    def test_sort_uploaded_recording(self):
+        sorted_file = sort_uploaded_recording(SimpleUploadedFile("test.snmprec", self.UNSORTED_CONTENT))
+        with sorted_file:
+            self.assertEqual("test.snmprec", sorted_file.name)
+            self.assertEqual(self.SORTED_CONTENT, sorted_file.read())
+
+        with self.assertRaises(SnmprecError) as context:
+            sort_uploaded_recording(SimpleUploadedFile("test.snmprec", self.MALFORMED_CONTENT))
+        self.assertEqual([2], [line_number for line_number, _ in context.exception.errors])
+
+
+class SNMPSimTrafficTests(TestCase):
+    """Requests counted from the logs in the format of the snmpsim daemon"""
+    BUCKET_SIZE = 60
+    IP_ADDRESS = "127.0.0.101"
+    PORT = 16101
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=os.path.join(self.folder, "media"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.runner = SNMPSimLoopbackRunner(daemon_folder=os.path.join(self.folder, "daemon"))
+        self.log_file = self.runner._get_endpoint_log_file(ip_address=self.IP_ADDRESS, port=self.PORT)
+        self.bucket_start = time.time() // self.BUCKET_SIZE * self.BUCKET_SIZE - 10 * self.BUCKET_SIZE
+
+    def _format_request(self, offset, var_binds, flags="EXACT", response=None, community="public"):
+        """
+
+        :param offset: seconds since the bucket start
+        :param var_binds: OIDs of the request var-binds, each one is logged as a GETBULK repetition
+        :param flags: NEXT or EXACT
+        :param response: values of the response var-binds, the request isn't answered if not set
+        :param community:
+        :return: log lines of the request
+        """
+        log_time = datetime.datetime.fromtimestamp(self.bucket_start + offset).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-4]
+        lines = [f"{log_time} snmpsimd: Using /recordings/test.snmprec controller selected by candidate "
+                 f"b'{community}'; transport ID 1.3.6.1.6.1.1.0, source address 127.0.0.1, "
+                 f"community name \"{community}\" \n"]
+        for index, oid in enumerate(var_binds):
+            lines.append(f"{log_time} snmpsimd: Request var-binds: {oid}=<>, flags: {flags}, GET \n")
+            if response is not None:
+                lines.append(f"{log_time} snmpsimd: Response var-binds: {oid}=<{response[index]}> \n")
+
+        return "".join(lines).encode()
+
+    def _write_log(self, *requests, mode="ab"):
+        """
+
+        :param requests: log lines of the requests
+        :param mode:
+        :return:
+        """
+        with open(self.log_file, mode) as file:
+            file.writelines(requests)
+
+    def _rotate_log(self, *requests):
+        """Rename the logs as the snmpsim daemon does and write the requests into the new log
+
+        :param requests:
+        :return:
+        """
+        for index in range(self.runner.LOG_BACKUP_COUNT - 1, 0, -1):
+            if os.path.exists(f"{self.log_file}.{index}"):
+                os.rename(f"{self.log_file}.{index}", f"{self.log_file}.{index + 1}")
+        os.rename(self.log_file, f"{self.log_file}.1")
+        self._write_log(*requests, mode="wb")
+
+    def test_requests_are_counted_by_pdu_type(self):
+        self._write_log(self._format_request(1, ["1.3.6.1.2.1.1.1.0"], response=["Test device"]),
+                        self._format_request(2, ["1.3.6.1.2.1.2.2.1.1", "1.3.6.1.2.1.2.2.1.1.1",
+                                                 "1.3.6.1.2.1.2.2.1.1.2"], flags="NEXT", response=["1", "2", "3"]),
+                        self._format_request(3, ["1.3.6.1.4.1.9.1.0"],
+                                             response=["No Such Instance currently exists at this OID"]),
+                        self._format_request(4, ["1.3.6.1.2.1.1.3.0"]),
+                        self._format_request(5, ["1.3.6.1.2.1.1.5.0"], flags="NEXT", response=["test"],
+                                             community="other"))
+
+        traffic = self.runner.get_traffic(bucket_size=self.BUCKET_SIZE)
+
+        self.assertEqual([
+            {"ip_address": self.IP_ADDRESS, "port": self.PORT, "snmp_read_community": "public",
+             "buckets": [{"start": self.bucket_start,
+                          "requests": {"get": 3, "getbulk": 1},
+                          "errors": 1,
+                          "timeouts": 1,
+                          "subtrees": {"1.3.6.1.2.1.1": 2, "1.3.6.1.2.1.2": 3, "1.3.6.1.4.1.9": 1}}]},
+            {"ip_address": self.IP_ADDRESS, "port": self.PORT, "snmp_read_community": "other",
+             "buckets": [{"start": self.bucket_start,
+                          "requests": {"getnext": 1},
+                          "errors": 0,
+                          "timeouts": 0,
+                          "subtrees": {"1.3.6.1.2.1.1": 1}}]},
+        ], traffic["recordings"])
+        self.assertEqual({"recordings": []}, self.runner.get_traffic(bucket_size=self.BUCKET_SIZE))
+
+    def test_unanswered_last_request_waits_for_response(self):
+        self.bucket_start = time.time()
+        self._write_log(self._format_request(0, ["1.3.6.1.2.1.1.1.0"]))
+        self.assertEqual({"recordings": []}, self.runner.get_traffic(bucket_size=self.BUCKET_SIZE))
+
+        response = self._format_request(0, ["1.3.6.1.2.1.1.1.0"], response=["Test device"]).splitlines(True)[-1]
+        self._write_log(response)
+        traffic = self.runner.get_traffic(bucket_size=self.BUCKET_SIZE)
+        self.assertEqual([{"get": 1}], [bucket["requests"]
+                                        for recording in traffic["recordings"] for bucket in recording["buckets"]])
+        self.assertEqual([0], [bucket["timeouts"]
+                               for recording in traffic["recordings"] for bucket in recording["buckets"]])
+
+    def test_rotated_logs_are_read_since_previous_collection(self):
+        recording = Recording.objects.create(name="recording",
+                                             ip_address=self.IP_ADDRESS,
+                                             port=self.PORT,
+                                             recording_file=ContentFile(RECORDING_CONTENT, name="test.snmprec"))
+        get_request = self._format_request(1, ["1.3.6.1.2.1.1.1.0"], response=["Test device"])
+        with mock.patch("simulator.traffic.get_snmpsim_runner", return_value=self.runner):
+            self._write_log(get_request)
+            self.assertEqual({recording: 1}, collect_traffic(bucket_size=self.BUCKET_SIZE))
+
+            self._write_log(get_request, get_request)
+            self._rotate_log(self._format_request(2, ["1.3.6.1.2.1.1.2.0"], response=["1.3.6.1.4.1.9"]))
+            self.assertEqual({recording: 3}, collect_traffic(bucket_size=self.BUCKET_SIZE))
+
+            self._write_log(get_request)
+            self._rotate_log(self._format_request(3, ["1.3.6.1.2.1.1.3.0"], response=["1"]))
+            self._rotate_log(self._format_request(4, ["1.3.6.1.2.1.1.4.0"], response=["contact"]))
+            self._write_log(get_request)
+            self.assertEqual({recording: 4}, collect_traffic(bucket_size=self.BUCKET_SIZE))
+
+            self.assertEqual({}, collect_traffic(bucket_size=self.BUCKET_SIZE))
+
+        self.assertEqual([8], list(RecordingTraffic.objects.filter(recording=recording).values_list("get_requests",
+                                                                                                      flat=True)))
+
+
+@override_settings(SNMPSIM_NETWORK=["10.0.0.0/30", "fd00:73::/126", "10.0.1.0/29"])
+class NetworkTests(SimpleTestCase):
+    def setUp(self):
+        network.get_snmpsim_networks.cache_clear()
+        self.addCleanup(network.get_snmpsim_networks.cache_clear)
+
+    def test_ip_address_index_is_unique_across_networks(self):
+        ip_addresses = ["10.0.0.0", "10.0.0.1", "10.0.0.2", "10.0.0.3",
+                        *(f"10.0.1.{host}" for host in range(8))]
+        indexes = [network.get_ip_address_index(ip_address) for ip_address in ip_addresses]
+
+        self.assertEqual(list(range(12)), indexes)
+
+        daemon_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, daemon_folder, ignore_errors=True)
+        runner = SNMPSimLoopbackRunner(daemon_folder=daemon_folder)
+        with override_settings(SNMPSIM_IFACE_NAME="eth1"):
+            self.assertEqual(["eth1:1", "eth1:5", None],
+                             [runner._generate_sub_interface_name(ip_address)
+                              for ip_address in ("10.0.0.1", "10.0.1.1", "fd00:73::1")])
+
+    def test_ip_address_index_of_ipv6_and_outside_addresses(self):
+        for ip_address in ("fd00:73::1", "fd00:74::1", "10.0.2.1"):
+            with self.subTest(ip_address=ip_address):
+                self.assertIsNone(network.get_ip_address_index(ip_address))
+
+    def test_free_ip_addresses_skip_used_network_and_broadcast_addresses(self):
+        self.assertEqual(["10.0.0.2", "fd00:73::2", "fd00:73::3", "10.0.1.1", "10.0.1.3"],
+                         network.get_free_ip_addresses(used_ip_addresses=["10.0.0.1", "fd00:73:0::1", "10.0.1.2"],
+                                                       limit=5))
+        self.assertEqual(["10.0.1.4", "10.0.1.5", "10.0.1.6"],
+                         network.get_free_ip_addresses(used_ip_addresses=["10.0.0.2", "10.0.1.1", "10.0.1.3"],
+                                                       limit=100)[-3:])
+
+    def test_ip_address_prefix_length(self):
+        self.assertEqual(30, network.get_ip_address_prefix_length("10.0.0.1"))
+        self.assertEqual(126, network.get_ip_address_prefix_length("fd00:73::1"))
+        self.assertEqual(32, network.get_ip_address_prefix_length("10.0.2.1"))
+
+
+class SearchRecordingsTests(TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.folder)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.recording = Recording.objects.create(name="recording",
+                                                  ip_address="127.0.0.101",
+                                                  recording_file=ContentFile(RECORDING_CONTENT, name="test.snmprec"))
+        self.clone, = Recording.objects.clone(source=self.recording, count=1)
+        self.other_recording = Recording.objects.create(
+            name="other",
+            ip_address="127.0.0.102",
+            recording_file=ContentFile(b"1.3.6.1.2.1.1.1.0|4x|4f7468657220646576696365\n"
+                                       b"1.3.6.1.4.1.9.9.46.1.3.1.1.18.1.1|2|1\n", name="other.snmprec"))
+
+    def _get_content_rows_count(self):
+        """
+
+        :return:
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {search.CONTENT_TABLE}")
+            return cursor.fetchone()[0]
+
+    def test_find_by_subtree(self):
+        all_recordings = {self.recording.pk, self.clone.pk, self.other_recording.pk}
+        self.assertEqual(all_recordings, search.find_recordings(oid="1.3.6.1.2.1.1"))
+        self.assertEqual(all_recordings, search.find_recordings(oid=".1.3.6.1.2.1.1.1.0"))
+        self.assertEqual({self.recording.pk, self.clone.pk}, search.find_recordings(oid="1.3.6.1.2.1.1.5"))
+        self.assertEqual({self.other_recording.pk}, search.find_recordings(oid="1.3.6.1.4.1.9"))
+        self.assertEqual({self.other_recording.pk}, search.find_recordings(oid="1.3.6.1.4.1.9.9.46.1"))
+        self.assertEqual(set(), search.find_recordings(oid="1.3.6.1.2.1.1.5.1"))
+
+    def test_find_by_value(self):
+        self.assertEqual({self.recording.pk, self.clone.pk}, search.find_recordings(value="test device"))
+        self.assertEqual({self.other_recording.pk}, search.find_recordings(value="Other device"))
+        self.assertEqual({self.other_recording.pk}, search.find_recordings(oid="1.3.6.1.2.1.1.1.0", value="other"))
+        self.assertEqual(set(), search.find_recordings(oid="1.3.6.1.2.1.1.5.0", value="device"))
+        self.assertEqual(set(), search.find_recordings())
+
+    def test_delete_clone_of_shared_file(self):
+        self.assertEqual(4, self._get_content_rows_count())
+
+        self.recording.delete()
+
+        self.assertEqual(4, self._get_content_rows_count())
+        self.assertEqual({self.clone.pk}, search.find_recordings(oid="1.3.6.1.2.1.1.5.0"))
+        self.assertEqual({self.clone.pk}, search.find_recordings(value="test device"))
+        self.assertTrue(os.path.exists(self.clone.recording_file.path))
+
+        self.clone.delete()
+
+        self.assertEqual(2, self._get_content_rows_count())
+        self.assertEqual(set(), search.find_recordings(value="test device"))
+        self.assertFalse(os.path.exists(self.clone.recording_file.path))
+
+
+class RecordingStatisticsTests(TestCase):
+    CONTENT = (b"1.3.6.1.2.1.2.2.1.2.2|4|eth1\n"
+               b"1.3.6.1.2.1.1.1.0|4|Test device\n"
+               b"1.3.6.1.2.1.2.2.1.1.1|2|1\n"
+               b"1.3.6.1.2.1.2.2.1.1.2|2|2\n"
+               b"1.3.6.1.2.1.2.2.1.2.1|4|eth0\n"
+               b"1.3.6.1.4.1.9.2.1.1.0|4|cisco\n")
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.folder)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_superuser(username="admin", email="admin@example.com", password="admin")
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def _upload_recording(self, name, ip_address, content):
+        """
+
+        :param name:
+        :param ip_address:
+        :param content:
+        :return: recording data of the API response
+        """
+        result = self.api_client.post("/simulator/api/recordings/",
+                                      {"name": name,
+                                       "ip_address": ip_address,
+                                       "recording_file": SimpleUploadedFile(f"{name}.snmprec", content)},
+                                      format="multipart")
+        self.assertEqual(201, result.status_code, result.data)
+        return result.data
+
+    def test_statistics_of_uploaded_recording(self):
+        data = self._upload_recording(name="recording", ip_address="127.0.0.101", content=self.CONTENT)
+
+        self.assertEqual(6, data["oids_count"])
+        self.assertEqual(len(self.CONTENT), data["file_size"])
+        self.assertEqual(2, data["interfaces_count"])
+        self.assertEqual({"1.3.6.1.2.1.1": 1, "1.3.6.1.2.1.2": 4, "1.3.6.1.4.1.9": 1},
+                         {subtree["oid"]: subtree["oids_count"] for subtree in data["subtrees"]})
+
+        recording = Recording.objects.get(pk=data["id"])
+        self.assertEqual(6, recording.oids_count)
+        with open(recording.recording_file.path, "rb") as file:
+            self.assertEqual(b"1.3.6.1.2.1.1.1.0|4|Test device\n", file.readline())
+
+    def test_filter_by_oids_count(self):
+        small = self._upload_recording(name="small", ip_address="127.0.0.101", content=RECORDING_CONTENT)
+        large = self._upload_recording(name="large", ip_address="127.0.0.102",
+                                       content=b"".join(f"1.3.6.1.2.1.2.2.1.1.{index}|2|{index}\n".encode()
+                                                        for index in range(1, 1001)))
+
+        for params, expected in (({"min_oids": 3}, [large]),
+                                 ({"max_oids": 999}, [small]),
+                                 ({"min_oids": 2, "max_interfaces": 0}, [small]),
+                                 ({"min_interfaces": 1000, "subtree": "1.3.6.1.2.1.2"}, [large])):
+            with self.subTest(params=params):
+                result = self.api_client.get("/simulator/api/recordings/", params)
+                self.assertEqual([recording["id"] for recording in expected],
+                                 [recording["id"] for recording in result.data])
+
+        result = self.api_client.get("/simulator/api/recordings/", {"min_oids": "many"})
+        self.assertEqual(400, result.status_code)
+
+        self.client.force_login(self.user)
+        for oids, expected in (("lt1k", [small]), ("1k-10k", [large]), ("10k-100k", [])):
+            with self.subTest(oids=oids):
+                result = self.client.get(reverse("admin:simulator_recording_changelist"), {"oids": oids})
+                self.assertEqual([recording["id"] for recording in expected],
+                                 [recording.pk for recording in result.context["cl"].queryset])
+
+
+@override_settings(SNMPSIM_CAPTURE_WORKERS=3, SNMPSIM_CAPTURE_INITIAL_REPETITIONS=2)
+class RecordingCaptureTests(TestCase):
+    def setUp(self):
+        from pysnmp.proto import rfc1902
+
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.folder)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.mib = [((1, 3, 6, 1, 2, 1, 1, 1, 0), rfc1902.OctetString(b"Test device")),
+                    ((1, 3, 6, 1, 2, 1, 1, 5, 0), rfc1902.OctetString(b"test")),
+                    ((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 1), rfc1902.Integer32(1)),
+                    ((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 2), rfc1902.Integer32(2)),
+                    ((1, 3, 6, 1, 2, 1, 2, 2, 1, 1, 10), rfc1902.Integer32(10)),
+                    ((1, 3, 6, 1, 2, 1, 2, 2, 1, 6, 1), rfc1902.OctetString(b"\x00\x1a\x2b\x3c\x4d\x5e")),
+                    ((1, 3, 6, 1, 2, 1, 99), rfc1902.Gauge32(99)),
+                    ((1, 3, 6, 1, 4, 1, 9, 2, 1, 0), rfc1902.OctetString(b"cisco")),
+                    ((1, 3, 6, 1, 4, 1, 9, 2, 2, 0), rfc1902.IpAddress("10.0.0.1")),
+                    ((1, 3, 6, 1, 6, 3, 1, 1, 6, 1, 0), rfc1902.Integer32(5))]
+        self.content = (b"1.3.6.1.2.1.1.1.0|4|Test device\n"
+                        b"1.3.6.1.2.1.1.5.0|4|test\n"
+                        b"1.3.6.1.2.1.2.2.1.1.1|2|1\n"
+                        b"1.3.6.1.2.1.2.2.1.1.2|2|2\n"
+                        b"1.3.6.1.2.1.2.2.1.1.10|2|10\n"
+                        b"1.3.6.1.2.1.2.2.1.6.1|4x|001a2b3c4d5e\n"
+                        b"1.3.6.1.2.1.99|66|99\n"
+                        b"1.3.6.1.4.1.9.2.1.0|4|cisco\n"
+                        b"1.3.6.1.4.1.9.2.2.0|64|10.0.0.1\n"
+                        b"1.3.6.1.6.3.1.1.6.1.0|2|5\n")
+        patcher = mock.patch("simulator.snmp_recorder.SNMPRecorder._get_bulk", autospec=True,
+                             side_effect=self._get_bulk)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get_bulk(self, recorder, snmp_engine, oid, max_repetitions):
+        """Answer GETBULK request of the recorder from the MIB of the device
+
+        :param recorder:
+        :param snmp_engine:
+        :param oid:
+        :param max_repetitions:
+        :return:
+        """
+        return [(name, value) for name, value in self.mib if name > tuple(oid)][:max_repetitions]
+
+    def _capture(self, device_ip_address="127.0.0.201"):
+        """
+
+        :param device_ip_address:
+        :return:
+        """
+        return start_recording_capture(name="captured",
+                                       device_ip_address=device_ip_address,
+                                       device_port=161,
+                                       device_snmp_read_community="public",
+                                       ip_address="127.0.0.101",
+                                       port=161,
+                                       snmp_read_community="public")
+
+    def test_tree_is_split_into_subtrees(self):
+        from .snmp_recorder import SNMPRecorder
+
+        recorder = SNMPRecorder(ip_address="127.0.0.201", snmp_read_community="public", port=161, logger=mock.Mock())
+        subtrees = recorder._discover_subtrees(snmp_engine=None, oid=(), depth=7)
+
+        self.assertEqual([((1, 3, 6, 1, 2, 1, 1), None),
+                          ((1, 3, 6, 1, 2, 1, 2), None),
+                          ((1, 3, 6, 1, 2, 1, 99), self.mib[6][1]),
+                          ((1, 3, 6, 1, 4, 1, 9), None),
+                          ((1, 3, 6, 1, 6, 3, 1), None)], subtrees)
+
+    def test_capture_concatenates_subtrees_in_oid_order(self):
+        capture = self._capture()
+
+        self.assertEqual([capture], run_pending_captures())
+
+        capture.refresh_from_db()
+        self.assertEqual(("done", ""), (capture.status, capture.error))
+        self.assertEqual(10, capture.recording.oids_count)
+        self.assertEqual("Test device", capture.recording.sys_description)
+        with open(capture.recording.recording_file.path, "rb") as file:
+            self.assertEqual(self.content, file.read())
+        self.assertEqual([], run_pending_captures())
+
+    def test_failed_capture_keeps_error(self):
+        from pyasn1.type import univ
+
+        self.mib[2:2] = [((1, 3, 6, 1, 2, 1, 2, 1, 0), univ.Null())]
+        capture = self._capture()
+
+        run_pending_captures()
+
+        capture.refresh_from_db()
+        self.assertEqual("failed", capture.status)
+        self.assertIn("Unsupported type", capture.error)
+        self.assertIsNone(capture.recording)
+        self.assertFalse(os.path.exists(os.path.dirname(os.path.join(self.folder, capture.recording_file))))
+        self.assertFalse(Recording.objects.exists())
+
+    def test_interrupted_capture_is_failed(self):
+        capture = self._capture()
+        partial_file = os.path.join(self.folder, "recordings", "partial", "127.0.0.201.capture.snmprec")
+        os.makedirs(os.path.dirname(partial_file))
+        open(partial_file, "w").close()
+        RecordingCapture.objects.filter(pk=capture.pk).update(status="running",
+                                                              recording_file="recordings/partial/"
+                                                                             "127.0.0.201.capture.snmprec")
+
+        self.assertEqual([capture], fail_interrupted_captures())
+
+        capture.refresh_from_db()
+        self.assertEqual("failed", capture.status)
+        self.assertTrue(capture.error)
+        self.assertFalse(os.path.exists(os.path.dirname(partial_file)))
+        self.assertEqual([], run_pending_captures())
+
+    def test_capture_is_queued_by_api(self):
+        api_client = APIClient()
+        api_client.force_authenticate(User.objects.create_superuser(username="admin", email="admin@example.com",
+                                                                    password="admin"))
+        result = api_client.post("/simulator/api/recordings/capture/", {"name": "captured",
+                                                                        "ip_address": "127.0.0.101",
+                                                                        "device_ip_address": "127.0.0.201"})
+        self.assertEqual(202, result.status_code, result.data)
+        self.assertEqual("pending", result.data["status"])
+
+        run_pending_captures()
+
+        result = api_client.get(f"/simulator/api/captures/{result.data['id']}/")
+        self.assertEqual("done", result.data["status"])
+        self.assertEqual(Recording.objects.get().pk, result.data["recording"])
+
+
+@override_settings(SNMPSIM_IFACE_NAME="lo")
+class TrafficShapingTests(SimpleTestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder, ignore_errors=True)
+        self.runner = SNMPSimOSCommandRunner(daemon_folder=self.folder)
+        for patcher in (mock.patch.object(self.runner, "_run_tc"),
+                        mock.patch.object(self.runner, "_get_root_qdisc", return_value=("noqueue", "0:"))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_loopback_interface_isnt_shaped(self):
+        with self.assertRaisesRegex(ValueError, "SNMPSIM_SHAPING_ALLOW_LOOPBACK"):
+            self.runner._add_root_qdisc()
+
+        self.runner._run_tc.assert_not_called()
+        self.assertFalse(os.path.exists(self.runner._get_root_qdisc_file()))
+
+    @override_settings(SNMPSIM_SHAPING_ALLOW_LOOPBACK=True)
+    def test_loopback_interface_is_shaped_if_allowed(self):
+        self.runner._add_root_qdisc()
+
+        self.assertEqual(("qdisc", "replace", "dev", "lo", "root", "handle", "1:", "htb", "default", "1"),
+                         self.runner._run_tc.call_args_list[0][0])
+        self.assertTrue(os.path.exists(self.runner._get_root_qdisc_file()))
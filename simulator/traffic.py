@@ -0,0 +1,135 @@
+import concurrent.futures
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Recording, RecordingTraffic, RecordingTrafficSubtree
+from .nodes import get_snmpsim_runner
+
+
+logger = logging.getLogger(__name__)
+
+# PDU types counted by the runners -> RecordingTraffic fields
+REQUEST_FIELDS = {
+    "get": "get_requests",
+    "getnext": "get_next_requests",
+    "getbulk": "get_bulk_requests",
+    "set": "set_requests",
+}
+
+
+def _get_node_traffic(node, bucket_size):
+    """
+
+    :param node: node or None for the local host
+    :param bucket_size:
+    :return: list of the recordings traffic
+    """
+    try:
+        return get_snmpsim_runner(node).get_traffic(bucket_size=bucket_size)["recordings"]
+    except Exception:
+        logger.exception(f"Failed to get traffic of the recordings on the node '{node or 'local host'}' due to:")
+        return []
+
+
+def _add_bucket(recording_id, bucket):
+    """Add counters of the bucket to the stored one, buckets are collected from the daemon logs in parts
+
+    :param recording_id:
+    :param bucket:
+    :return:
+    """
+    started_at = datetime.datetime.fromtimestamp(bucket["start"], tz=datetime.timezone.utc)
+    with transaction.atomic():
+        traffic, _ = RecordingTraffic.objects.get_or_create(recording_id=recording_id, started_at=started_at)
+        counters = {field: F(field) + bucket["requests"][pdu_type]
+                    for pdu_type, field in REQUEST_FIELDS.items() if bucket["requests"].get(pdu_type)}
+        RecordingTraffic.objects.filter(pk=traffic.pk).update(errors=F("errors") + bucket["errors"],
+                                                              timeouts=F("timeouts") + bucket["timeouts"],
+                                                              **counters)
+
+        for oid, var_binds_count in bucket["subtrees"].items():
+            subtree, _ = RecordingTrafficSubtree.objects.get_or_create(traffic=traffic, oid=oid)
+            RecordingTrafficSubtree.objects.filter(pk=subtree.pk).update(
+                var_binds_count=F("var_binds_count") + var_binds_count)
+
+
+def collect_traffic(bucket_size=None):
+    """Collect SNMP requests of the recordings from their snmpsim daemons into the time buckets
+
+    Daemons count each request once, so only one collector should run
+
+    :param bucket_size: seconds, SNMPSIM_TRAFFIC_BUCKET_SIZE by default
+    :return: dict of the recording -> number of the collected requests
+    """
+    bucket_size = bucket_size or settings.SNMPSIM_TRAFFIC_BUCKET_SIZE
+    recordings = list(Recording.objects.select_related("node"))
+    nodes = {recording.node_id: recording.node for recording in recordings}
+    if not nodes:
+        return {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(nodes)) as executor:
+        traffic = dict(zip(nodes, executor.map(lambda node: _get_node_traffic(node, bucket_size), nodes.values())))
+
+    recordings = {(recording.node_id, recording.ip_address, recording.port, recording.snmp_read_community): recording
+                  for recording in recordings}
+    requests_counts = {}
+    for node_id, node_traffic in traffic.items():
+        for recording_traffic in node_traffic:
+            recording = recordings.get((node_id,
+                                        recording_traffic["ip_address"],
+                                        int(recording_traffic["port"]),
+                                        recording_traffic["snmp_read_community"]))
+            if recording is None:
+                continue
+
+            for bucket in recording_traffic["buckets"]:
+                _add_bucket(recording.pk, bucket)
+                requests_counts[recording] = requests_counts.get(recording, 0) + sum(bucket["requests"].values())
+
+    return requests_counts
+
+
+def delete_old_traffic(retention=None):
+    """
+
+    :param retention: seconds the traffic buckets are kept for, SNMPSIM_TRAFFIC_RETENTION by default
+    :return: number of the deleted buckets
+    """
+    retention = retention or settings.SNMPSIM_TRAFFIC_RETENTION
+    deleted, _ = RecordingTraffic.objects.filter(
+        started_at__lt=timezone.now() - datetime.timedelta(seconds=retention)).delete()
+
+    return deleted
+
+
+def get_traffic_summary(recording, period=None):
+    """Summarize traffic of the recording within the last period
+
+    :param recording:
+    :param period: seconds, SNMPSIM_TRAFFIC_SUMMARY_PERIOD by default
+    :return: dict with the requests and requests per second by the PDU type, errors, timeouts and top subtrees
+        by the number of the requested var-binds
+    """
+    period = period or settings.SNMPSIM_TRAFFIC_SUMMARY_PERIOD
+    buckets = recording.traffic.filter(started_at__gte=timezone.now() - datetime.timedelta(seconds=period))
+    totals = buckets.aggregate(**{field: Sum(field) for field in (*REQUEST_FIELDS.values(), "errors", "timeouts")})
+    requests = {pdu_type: totals[field] or 0 for pdu_type, field in REQUEST_FIELDS.items()}
+    requests["total"] = sum(requests.values())
+    top_subtrees = (RecordingTrafficSubtree.objects.filter(traffic__in=buckets)
+                    .values("oid")
+                    .annotate(var_binds_count=Sum("var_binds_count"))
+                    .order_by("-var_binds_count")[:settings.SNMPSIM_TRAFFIC_TOP_SUBTREES])
+
+    return {
+        "period": period,
+        "requests": requests,
+        "requests_per_second": {pdu_type: round(count / period, 3) for pdu_type, count in requests.items()},
+        "errors": totals["errors"] or 0,
+        "timeouts": totals["timeouts"] or 0,
+        "top_subtrees": list(top_subtrees),
+    }
@@ -1,11 +1,13 @@
 from django.urls import path, include
 
 from rest_framework import routers
-from .api import RecordingViewSet
+from .api import NodeViewSet, RecordingCaptureViewSet, RecordingViewSet
 
 # Routers provide an easy way of automatically determining the URL conf.
 router = routers.DefaultRouter()
 router.register(r'recordings', RecordingViewSet)
+router.register(r'nodes', NodeViewSet)
+router.register(r'captures', RecordingCaptureViewSet)
 
 # Wire up our API using automatic URL routing.
 # Additionally, we include login URLs for the browsable API.
@@ -0,0 +1,136 @@
+/*
+ * Updates state of the recordings on the changelist in place:
+ * long-polls the status feed for the rows changed since the last known version,
+ * rows of the deleted recordings are removed
+ * and runs start/stop buttons and bulk start/stop actions without reloading the page.
+ */
+(function () {
+    "use strict";
+
+    var script = document.currentScript;
+    var statusUrl = script.dataset.statusUrl;
+    var statusVersion = script.dataset.statusVersion;
+    var ajaxActions = ["start_recordings", "stop_recordings"];
+    var ajaxHeaders = {"X-Requested-With": "XMLHttpRequest"};
+
+    function getRow(recordingId) {
+        var checkbox = document.querySelector('#result_list input.action-select[value="' + recordingId + '"]');
+        return checkbox ? checkbox.closest("tr") : null;
+    }
+
+    function getShownIds() {
+        return Array.prototype.map.call(document.querySelectorAll("#result_list input.action-select"),
+            function (checkbox) {
+                return checkbox.value;
+            });
+    }
+
+    function removeDeletedRows(shownIds, existingIds) {
+        shownIds.forEach(function (recordingId) {
+            var row = getRow(recordingId);
+            if (row && existingIds.indexOf(Number(recordingId)) === -1) {
+                row.parentNode.removeChild(row);
+            }
+        });
+    }
+
+    function updateRows(recordings) {
+        recordings.forEach(function (recording) {
+            var row = getRow(recording.id);
+            if (!row) {
+                return;
+            }
+            row.querySelector(".field-is_running").innerHTML = recording.is_running_html;
+            row.querySelector(".field-recording_actions").innerHTML = recording.actions_html;
+        });
+    }
+
+    function showMessage(message, level) {
+        var messageList = document.querySelector("ul.messagelist");
+        if (!messageList) {
+            messageList = document.createElement("ul");
+            messageList.className = "messagelist";
+            var content = document.getElementById("content");
+            content.parentNode.insertBefore(messageList, content);
+        }
+        var item = document.createElement("li");
+        item.className = level;
+        item.textContent = message;
+        messageList.appendChild(item);
+    }
+
+    function handleActionResponse(response) {
+        if (!response.ok) {
+            throw new Error(response.statusText);
+        }
+        return response.json().then(function (data) {
+            showMessage(data.message, data.level);
+        });
+    }
+
+    function handleActionError() {
+        showMessage("Failed to run the action. Please reload the page", "error");
+    }
+
+    function pollStatus() {
+        var shownIds = getShownIds();
+        fetch(statusUrl + "?since=" + statusVersion + "&ids=" + shownIds.join(","),
+              {credentials: "same-origin", headers: ajaxHeaders})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(function (data) {
+                statusVersion = data.version;
+                removeDeletedRows(shownIds, data.existing_ids);
+                updateRows(data.recordings);
+                setTimeout(pollStatus, 0);
+            })
+            .catch(function () {
+                setTimeout(pollStatus, 5000);
+            });
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        var resultList = document.getElementById("result_list");
+        if (resultList) {
+            resultList.addEventListener("click", function (event) {
+                var button = event.target.closest("a.recording-action");
+                if (!button) {
+                    return;
+                }
+                event.preventDefault();
+                fetch(button.href, {credentials: "same-origin", headers: ajaxHeaders})
+                    .then(handleActionResponse)
+                    .catch(handleActionError);
+            });
+        }
+
+        var changelistForm = document.getElementById("changelist-form");
+        if (changelistForm) {
+            changelistForm.addEventListener("submit", function (event) {
+                var action = changelistForm.querySelector('select[name="action"]');
+                if (!action || ajaxActions.indexOf(action.value) === -1 ||
+                        !changelistForm.querySelector("input.action-select:checked")) {
+                    return;
+                }
+                event.preventDefault();
+                var formData = new FormData(changelistForm);
+                // admin runs the action only when it is submitted with the "Go" button
+                formData.append("index", "0");
+                fetch(window.location.href, {
+                    method: "POST",
+                    credentials: "same-origin",
+                    headers: ajaxHeaders,
+                    body: formData
+                })
+                    .then(handleActionResponse)
+                    .catch(handleActionError);
+            });
+        }
+
+        pollStatus();
+    });
+})();